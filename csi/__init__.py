@@ -1,4 +1,13 @@
 from .configuration import JsonSerializable, ConfigurationManager
-from .experiment import RunStatus, Run, Experiment, Repository
+from .experiment import (
+    RunStatus,
+    Run,
+    Experiment,
+    ExperimentScheduler,
+    Repository,
+    Telemetry,
+    WorkQueue,
+    phase,
+)
 from .safety import SafetyCondition, UnsafeControlAction, Hazard
 from .transform import json_get, json_transform, json_remove
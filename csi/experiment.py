@@ -1,17 +1,34 @@
+import concurrent.futures
 import contextlib
+import contextvars
 import datetime
 import enum
+import functools
+import hashlib
+import importlib
+import itertools
 import json
 import os
 import pathlib
 import pickle
 import random
+import socket
+import sqlite3
+import sys
+import threading
+import time
 import traceback
 import typing
 import uuid
+import weakref
 
 import csi.configuration
 
+try:
+    import resource
+except ImportError:
+    resource = None
+
 
 class RunStatus(enum.Enum):
     """Status and result of an experiment run"""
@@ -22,6 +39,318 @@ class RunStatus(enum.Enum):
     FAILED = 3
 
 
+def _percentile(values: typing.Sequence[float], q: float) -> float:
+    """Percentile of the values, interpolated between the closest ranks"""
+    values = sorted(values)
+    rank = (len(values) - 1) * q / 100
+    lower = int(rank)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (rank - lower)
+
+
+def _class_name(cls: type) -> str:
+    return "{}:{}".format(cls.__module__, cls.__qualname__)
+
+
+class Catalogue:
+    """Index of the experiments and runs of a repository, in a SQLite database.
+
+    The catalogue is updated as experiments and runs record their metadata, so
+    that runs can be listed and filtered by status without loading them.
+    """
+
+    filename = "catalogue.sqlite"
+
+    schema = """
+        CREATE TABLE IF NOT EXISTS experiments (
+            uuid TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            class TEXT NOT NULL,
+            configuration TEXT
+        );
+        CREATE TABLE IF NOT EXISTS runs (
+            uuid TEXT PRIMARY KEY,
+            experiment TEXT NOT NULL REFERENCES experiments (uuid),
+            status TEXT NOT NULL,
+            time_start TEXT,
+            time_complete TEXT
+        );
+        CREATE INDEX IF NOT EXISTS runs_status ON runs (status, experiment);
+        CREATE INDEX IF NOT EXISTS runs_experiment ON runs (experiment);
+    """
+
+    def __init__(self, root):
+        self.path = pathlib.Path(root) / self.filename
+        self._local = threading.local()
+
+    @staticmethod
+    def of(root) -> "Catalogue":
+        """Catalogue of the repository, sharing its connections between users"""
+        return _shared_catalogue(pathlib.Path(root).absolute())
+
+    @property
+    def exists(self) -> bool:
+        return self.path.exists()
+
+    def _connect(self) -> sqlite3.Connection:
+        """Connection of the current thread, reopened if the catalogue was removed"""
+        connection = getattr(self._local, "connection", None)
+        if connection is not None and self._local.pid != os.getpid():
+            # Connections are not shared with forked processes
+            connection = None
+        if connection is not None and not self.path.exists():
+            connection.close()
+            connection = None
+        if connection is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            connection = sqlite3.connect(str(self.path), timeout=60)
+            connection.executescript(self.schema)
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+            self._local.depth = 0
+        return connection
+
+    @contextlib.contextmanager
+    def transaction(self) -> typing.Iterator[sqlite3.Connection]:
+        """Connection to the catalogue, committed on success.
+
+        Nested transactions are committed with the outermost one.
+        """
+        connection = self._connect()
+        if self._local.depth:
+            yield connection
+            return
+        self._local.depth = 1
+        try:
+            with connection:
+                yield connection
+        finally:
+            self._local.depth = 0
+
+    def record_experiment(self, experiment: "Experiment", configuration=None):
+        """Record the experiment, and the digest of its configuration"""
+        with self.transaction() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO experiments VALUES (?, ?, ?, ?)",
+                (
+                    str(experiment.uuid),
+                    experiment.path.name,
+                    _class_name(type(experiment)),
+                    configuration,
+                ),
+            )
+
+    def record_run(self, run: "Run"):
+        """Record the current status of the run"""
+        with self.transaction() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO runs VALUES (?, ?, ?, ?, ?)",
+                (
+                    str(run.uuid),
+                    str(run.experiment.uuid),
+                    run.status.name,
+                    run.time_start,
+                    run.time_complete,
+                ),
+            )
+
+    def experiments(self, cls: typing.Optional[str] = None) -> typing.List[str]:
+        """Directory names of the experiments, optionally of the specified class"""
+        query = "SELECT name FROM experiments"
+        parameters: typing.Tuple = ()
+        if cls is not None:
+            query += " WHERE class = ?"
+            parameters = (cls,)
+        with self.transaction() as connection:
+            return [
+                n for (n,) in connection.execute(query + " ORDER BY name", parameters)
+            ]
+
+    def runs(
+        self, status: typing.Optional[RunStatus] = None
+    ) -> typing.List[typing.Tuple[str, int]]:
+        """Experiment directory names and uuids of the runs, with the status"""
+        query = "SELECT e.name, r.uuid FROM runs r JOIN experiments e ON r.experiment = e.uuid"
+        parameters: typing.Tuple = ()
+        if status is not None:
+            query += " WHERE r.status = ?"
+            parameters = (status.name,)
+        with self.transaction() as connection:
+            rows = connection.execute(query + " ORDER BY e.name", parameters)
+            return [(n, int(u)) for n, u in rows]
+
+    def status(self) -> typing.Dict[RunStatus, int]:
+        """Number of runs with each status"""
+        with self.transaction() as connection:
+            rows = connection.execute(
+                "SELECT status, COUNT(*) FROM runs GROUP BY status"
+            )
+            counts = {RunStatus[s]: c for s, c in rows}
+        return {s: counts.get(s, 0) for s in RunStatus}
+
+
+@functools.lru_cache(maxsize=16)
+def _shared_catalogue(path: pathlib.Path) -> Catalogue:
+    return Catalogue(path)
+
+
+def configuration_digest(configuration) -> str:
+    """Digest of the configuration, independent of its encoding layout"""
+    encoded = json.loads(csi.configuration.ConfigurationManager().encode(configuration))
+    canonical = json.dumps(encoded, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+class ResultCache:
+    """Results of experiments, by digest of their configuration, in a SQLite file.
+
+    Results are Json-serializable values. The least recently used results are
+    evicted beyond max_entries, and results older than max_age seconds are
+    discarded.
+    """
+
+    filename = "results.sqlite"
+
+    def __init__(
+        self,
+        root,
+        max_entries: typing.Optional[int] = None,
+        max_age: typing.Optional[float] = None,
+    ):
+        self.path = pathlib.Path(root) / self.filename
+        self.max_entries = max_entries
+        self.max_age = max_age
+
+    @contextlib.contextmanager
+    def transaction(self) -> typing.Iterator[sqlite3.Connection]:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        connection = sqlite3.connect(str(self.path), timeout=60)
+        try:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS results "
+                "(key TEXT PRIMARY KEY, value TEXT, created REAL, accessed REAL)"
+            )
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+    def get(self, key: str) -> typing.Optional[typing.Any]:
+        """Retrieve the result recorded for the key, None if missing or expired"""
+        now = time.time()
+        with self.transaction() as connection:
+            row = connection.execute(
+                "SELECT value, created FROM results WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            value, created = row
+            if self.max_age is not None and now - created > self.max_age:
+                connection.execute("DELETE FROM results WHERE key = ?", (key,))
+                return None
+            connection.execute(
+                "UPDATE results SET accessed = ? WHERE key = ?", (now, key)
+            )
+        return json.loads(value)
+
+    def put(self, key: str, value: typing.Any) -> None:
+        """Record the result for the key, evicting results as configured"""
+        now = time.time()
+        with self.transaction() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), now, now),
+            )
+            if self.max_age is not None:
+                connection.execute(
+                    "DELETE FROM results WHERE created < ?", (now - self.max_age,)
+                )
+            if self.max_entries is not None:
+                connection.execute(
+                    "DELETE FROM results WHERE key NOT IN "
+                    "(SELECT key FROM results ORDER BY accessed DESC LIMIT ?)",
+                    (self.max_entries,),
+                )
+
+    def __contains__(self, key: str) -> bool:
+        return self.get(key) is not None
+
+    def __len__(self) -> int:
+        with self.transaction() as connection:
+            return connection.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    def clear(self) -> None:
+        with self.transaction() as connection:
+            connection.execute("DELETE FROM results")
+
+
+def _process_peak_memory() -> typing.Optional[int]:
+    """Peak resident memory over the process lifetime, in bytes, if available"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Reported in bytes on macOS, in kilobytes on Linux and BSD
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class Telemetry:
+    """Durations of the nested phases of a run, and the process peak memory.
+
+    Phases are identified by their path, the names of the enclosing phases and
+    their own separated by '/'. Durations of repeated phases are summed.
+
+    The peak memory is the one of the process up to the end of the run, a run
+    following others in the same process reports their peak if it is larger.
+    """
+
+    def __init__(self):
+        self.phases: typing.Dict[str, float] = {}
+        self.process_peak_memory: typing.Optional[int] = None
+        self._stack: typing.List[str] = []
+
+    @contextlib.contextmanager
+    def phase(self, name: str) -> typing.Iterator[None]:
+        """Record the duration of the enclosed phase"""
+        self._stack.append(name)
+        path = "/".join(self._stack)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._stack.pop()
+            self.phases[path] = self.phases.get(path, 0.0) + (
+                time.perf_counter() - start
+            )
+            self.process_peak_memory = _process_peak_memory()
+
+    def to_json(self):
+        return {
+            "phases": dict(self.phases),
+            "process_peak_memory": self.process_peak_memory,
+        }
+
+    @classmethod
+    def from_json(cls, obj) -> "Telemetry":
+        telemetry = cls()
+        telemetry.phases.update(obj.get("phases", {}))
+        telemetry.process_peak_memory = obj.get("process_peak_memory")
+        return telemetry
+
+
+# Telemetry of the run being executed
+_TELEMETRY: contextvars.ContextVar[typing.Optional[Telemetry]] = contextvars.ContextVar(
+    "telemetry", default=None
+)
+
+
+def phase(name: str) -> typing.ContextManager[None]:
+    """Record the duration of a phase of the current run, if any"""
+    telemetry = _TELEMETRY.get()
+    if telemetry is None:
+        return contextlib.nullcontext()
+    return telemetry.phase(name)
+
+
 class Run:
     """Experiment run record and output folder."""
 
@@ -32,12 +361,18 @@ class Run:
         self.status = RunStatus.PENDING
         self.time_start = None
         self.time_complete = None
+        self.telemetry = Telemetry()
 
     @classmethod
-    def load(cls, path) -> "Run":
-        """Load run record from local directory."""
+    def load(cls, path, experiment=None) -> "Run":
+        """Load run record from local directory.
+
+        The experiment is loaded once, and shared by the runs loaded from it,
+        unless specified.
+        """
         path = pathlib.Path(path)
-        experiment = Experiment.load(path.parent.parent)
+        if experiment is None:
+            experiment = _open_experiment(path.parent.parent)
         run = Run(experiment)
         run.uuid = int(path.stem)
         # Load metadata
@@ -46,6 +381,7 @@ class Run:
         run.status = RunStatus[metadata["status"]]
         run.time_start = metadata["time"]["start"]
         run.time_complete = metadata["time"]["complete"]
+        run.telemetry = Telemetry.from_json(metadata.get("telemetry", {}))
         return run
 
     @property
@@ -53,6 +389,7 @@ class Run:
         return {
             "status": self.status.name,
             "time": {"start": self.time_start, "complete": self.time_complete},
+            "telemetry": self.telemetry.to_json(),
         }
 
     @property
@@ -74,6 +411,7 @@ class Run:
         """Update metadata record on disk"""
         with (self.path / "metadata.json").open("w") as metadata_file:
             json.dump(self.metadata, metadata_file)
+        self.experiment.catalogue.record_run(self)
 
     def execute(self):
         """Run attached experiment tracking run status and log."""
@@ -90,8 +428,13 @@ class Run:
                     )
                     self.status = RunStatus.RUNNING
                     self.update_metadata()
-                    # Run experiment
-                    self.experiment.execute()
+                    # Run experiment, recording the phases it declares
+                    token = _TELEMETRY.set(self.telemetry)
+                    try:
+                        with self.telemetry.phase("execute"):
+                            self.experiment.execute()
+                    finally:
+                        _TELEMETRY.reset(token)
                     # Update status
                     self.status = RunStatus.COMPLETE
                 except Exception as _:
@@ -125,21 +468,50 @@ class Experiment:
                 experiment.root = path.parent
         return experiment
 
+    @staticmethod
+    def open(path) -> typing.Union["Experiment", "ExperimentProxy"]:
+        """Open experiment record from local directory, loaded on first use.
+
+        Records without manifest are loaded immediately.
+        """
+        path = pathlib.Path(path)
+        if not (path / "manifest.json").exists():
+            return Experiment.load(path)
+        with (path / "manifest.json").open() as manifest_file:
+            return ExperimentProxy(path, json.load(manifest_file))
+
     @property
     def path(self):
         return pathlib.Path(self.root) / "{}-{}".format(type(self).__name__, self.uuid)
 
+    @property
+    def catalogue(self) -> Catalogue:
+        return Catalogue.of(self.root)
+
     def prepare_path(self):
         """Create experiment root directories and metadata files"""
         # Create directory
         (self.path / "runs").mkdir(parents=True, exist_ok=True)
         # Save configuration
+        configuration_path = self.path / "configuration.json"
         csi.configuration.ConfigurationManager().save(
-            self.configuration, self.path / "configuration.json"
+            self.configuration, configuration_path
         )
         # Save experiment object
         with (self.path / "experiment.pkl").open("wb") as pickle_file:
             pickle.dump(self, pickle_file)
+        # Save manifest, identifying the experiment without loading it
+        digest = configuration_digest(self.configuration)
+        with (self.path / "manifest.json").open("w") as manifest_file:
+            json.dump(
+                {
+                    "class": _class_name(type(self)),
+                    "uuid": str(self.uuid),
+                    "configuration": digest,
+                },
+                manifest_file,
+            )
+        self.catalogue.record_experiment(self, digest)
 
     def run(self, retries: int = 1) -> None:
         """Attempt to run the experiment recording run results"""
@@ -158,21 +530,154 @@ class Experiment:
     @property
     def runs(self) -> typing.Iterator[Run]:
         for i in (self.path / "runs").iterdir():
-            run = Run.load(i)
+            run = Run.load(i, self)
             yield run
 
 
+class ExperimentProxy:
+    """Experiment record identified by its manifest, loaded on first use.
+
+    The uuid, paths and runs of the experiment are available from its manifest,
+    other fields load the experiment record. Proxies are not experiment
+    instances, use `resolve` to obtain the experiment itself.
+    """
+
+    def __init__(self, path: pathlib.Path, manifest: typing.Dict[str, typing.Any]):
+        self._path = pathlib.Path(path)
+        self._manifest = manifest
+        self._experiment: typing.Optional[Experiment] = None
+
+    @property
+    def uuid(self) -> int:
+        return int(self._manifest["uuid"])
+
+    @property
+    def root(self) -> pathlib.Path:
+        return self._path.parent
+
+    @property
+    def path(self) -> pathlib.Path:
+        return self._path
+
+    @property
+    def configuration_digest(self) -> typing.Optional[str]:
+        return self._manifest["configuration"]
+
+    @property
+    def experiment_class(self) -> type:
+        """Class of the experiment, without loading the record"""
+        module, _, name = self._manifest["class"].partition(":")
+        return functools.reduce(
+            getattr, name.split("."), importlib.import_module(module)
+        )
+
+    catalogue = Experiment.catalogue
+    runs = Experiment.runs
+
+    def resolve(self) -> Experiment:
+        """Load the experiment record"""
+        if self._experiment is None:
+            self._experiment = Experiment.load(self._path)
+        return self._experiment
+
+    def __getattr__(self, name: str):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return getattr(self.resolve(), name)
+
+    def __reduce__(self):
+        return Experiment.open, (self._path,)
+
+
+# Experiments loaded by runs loaded without their experiment
+_OPENED: "weakref.WeakValueDictionary[pathlib.Path, Experiment]" = (
+    weakref.WeakValueDictionary()
+)
+
+
+def _open_experiment(path: pathlib.Path) -> Experiment:
+    path = pathlib.Path(path).absolute()
+    experiment = _OPENED.get(path)
+    if experiment is None:
+        experiment = Experiment.load(path)
+        _OPENED[path] = experiment
+    return experiment
+
+
 class Repository:
     """Record of an experiment set"""
 
     def __init__(self, path):
         self.path = pathlib.Path(path)
+        self._indexed = False
+
+    @property
+    def catalogue(self) -> Catalogue:
+        """Catalogue of the repository, indexing the records it misses.
+
+        Missing catalogues are rebuilt from the records of the repository. On
+        first use, experiments recorded without the catalogue are found by listing
+        the repository, indexed experiments and their runs are not visited.
+        """
+        catalogue = Catalogue.of(self.path)
+        if not self.path.exists():
+            return catalogue
+        if not catalogue.exists:
+            self.reindex()
+        elif not self._indexed:
+            names = {i.name for i in os.scandir(self.path) if i.is_dir()}
+            self.reindex(names.difference(catalogue.experiments()))
+        return catalogue
+
+    def reindex(self, names: typing.Optional[typing.Iterable[str]] = None) -> None:
+        """Index the experiments and runs missing from the catalogue.
+
+        Records written by other processes without the catalogue, or before it
+        existed, are loaded and indexed; indexed ones are not loaded again. Only
+        the named experiment directories are considered, if specified.
+        """
+        catalogue = Catalogue.of(self.path)
+        if names is None:
+            paths = list(self.path.iterdir())
+        else:
+            paths = [self.path / n for n in names]
+        with catalogue.transaction():
+            experiments = set(catalogue.experiments())
+            runs = set(catalogue.runs())
+            for i in paths:
+                if not (i / "experiment.pkl").exists():
+                    continue
+                missing = [
+                    r
+                    for r in (i / "runs").iterdir()
+                    if (i.name, int(r.name)) not in runs
+                    and (r / "metadata.json").exists()
+                ]
+                if i.name in experiments and not missing:
+                    continue
+                e = Experiment.load(i)
+                if i.name not in experiments:
+                    catalogue.record_experiment(
+                        e, configuration_digest(e.configuration)
+                    )
+                for r in missing:
+                    catalogue.record_run(Run.load(r, e))
+        self._indexed = True
 
     @property
     def experiments(self):
-        for i in self.path.iterdir():
-            if i.is_dir():
-                yield Experiment.load(i)
+        if not self.path.exists():
+            return
+        for name in self.catalogue.experiments():
+            yield Experiment.load(self.path / name)
+
+    @property
+    def manifests(self) -> typing.Iterator[typing.Union[Experiment, ExperimentProxy]]:
+        """Experiments opened from their manifest, loaded on first use"""
+        if not self.path.exists():
+            return
+        for name in self.catalogue.experiments():
+            yield Experiment.open(self.path / name)
 
     @property
     def runs(self):
@@ -182,10 +687,327 @@ class Repository:
 
     @property
     def completed_runs(self):
-        for e in self.experiments:
-            for r in e.runs:
-                if r.status == RunStatus.COMPLETE:
-                    yield e, r
+        if not self.path.exists():
+            return
+        experiments = {}
+        for name, uuid_ in self.catalogue.runs(RunStatus.COMPLETE):
+            if name not in experiments:
+                experiments[name] = Experiment.load(self.path / name)
+            e = experiments[name]
+            yield e, Run.load(e.path / "runs" / str(uuid_), e)
+
+    def queue(self, lease: float = 300.0, max_attempts: int = 1) -> "WorkQueue":
+        """Work queue shared by the workers of the repository"""
+        return WorkQueue(self.path, lease, max_attempts)
+
+    def results(
+        self,
+        max_entries: typing.Optional[int] = None,
+        max_age: typing.Optional[float] = None,
+    ) -> ResultCache:
+        """Cache of results shared by the experiments of the repository"""
+        return ResultCache(self.path, max_entries, max_age)
+
+    def status(self) -> typing.Dict[RunStatus, int]:
+        """Number of runs with each status"""
+        if not self.path.exists():
+            return {s: 0 for s in RunStatus}
+        return self.catalogue.status()
+
+    def telemetry(
+        self,
+        percentiles: typing.Sequence[float] = (50, 90, 99),
+        status: typing.Optional[RunStatus] = RunStatus.COMPLETE,
+    ) -> typing.Dict[str, typing.Dict[str, float]]:
+        """Percentiles of phase durations, and of process peak memory, over the runs"""
+        if not self.path.exists():
+            return {}
+        samples: typing.Dict[str, typing.List[float]] = {}
+        for name, uuid_ in self.catalogue.runs(status):
+            metadata_path = self.path / name / "runs" / str(uuid_) / "metadata.json"
+            with metadata_path.open() as metadata_file:
+                telemetry = json.load(metadata_file).get("telemetry", {})
+            for p, duration in telemetry.get("phases", {}).items():
+                samples.setdefault(p, []).append(duration)
+            memory = telemetry.get("process_peak_memory")
+            if memory is not None:
+                samples.setdefault("process_peak_memory", []).append(memory)
+        return {
+            p: {"count": len(v), **{f"p{q:g}": _percentile(v, q) for q in percentiles}}
+            for p, v in samples.items()
+        }
+
+
+def _attempt(run: Run) -> Run:
+    """Execute the run of a prepared experiment, in a worker process"""
+    try:
+        run.execute()
+    except Exception as _:
+        pass
+    return run
+
+
+class ExperimentScheduler:
+    """Run experiments concurrently, each run in a worker process.
+
+    Runs change the working directory and redirect outputs of their process,
+    workers thus execute a single run at a time. Failed runs are attempted
+    again, up to the number of retries, and the final run of each experiment
+    is reported as soon as it completes. Runs whose result could not be
+    retrieved are recorded as failed. A crashing worker breaks the pool, all
+    runs in progress are then recorded as failed and the pool replaced.
+    """
+
+    def __init__(self, workers: typing.Optional[int] = None, retries: int = 1):
+        self.workers = workers or os.cpu_count() or 1
+        self.retries = retries
+
+    @staticmethod
+    def _record_failure(run: Run) -> Run:
+        """Record the run as failed, with the exception being handled"""
+        run.status = RunStatus.FAILED
+        run.time_complete = datetime.datetime.now().strftime("%d/%m/%Y %H:%M:%S")
+        run.prepare_path()
+        with (run.path / "log").open("a") as log:
+            traceback.print_exc(file=log)
+        return run
+
+    def run(self, experiments: typing.Iterable[Experiment]) -> typing.Iterator[Run]:
+        """Run the experiments, yield the final run of each as it completes"""
+        experiments = iter(experiments)
+        pool = concurrent.futures.ProcessPoolExecutor(self.workers)
+        pending = {}
+
+        def submit(experiment, attempt):
+            nonlocal pool
+            if attempt == 1:
+                experiment.prepare_path()
+            run = Run(experiment)
+            try:
+                future = pool.submit(_attempt, run)
+            except concurrent.futures.BrokenExecutor:
+                # Replace the pool after a worker crashed
+                pool.shutdown(wait=False)
+                pool = concurrent.futures.ProcessPoolExecutor(self.workers)
+                future = pool.submit(_attempt, run)
+            pending[future] = (experiment, run, attempt)
+
+        try:
+            # Experiments are submitted as workers become available
+            for experiment in itertools.islice(experiments, self.workers):
+                submit(experiment, 1)
+            while pending:
+                done, _ = concurrent.futures.wait(
+                    pending, return_when=concurrent.futures.FIRST_COMPLETED
+                )
+                for future in done:
+                    experiment, run, attempt = pending.pop(future)
+                    try:
+                        run = future.result()
+                    except Exception as _:
+                        run = self._record_failure(run)
+                    if run.status != RunStatus.COMPLETE and attempt < self.retries:
+                        submit(experiment, attempt + 1)
+                        continue
+                    yield run
+                    for experiment in itertools.islice(experiments, 1):
+                        submit(experiment, 1)
+        finally:
+            pool.shutdown()
+
+
+class WorkState(enum.Enum):
+    """State of an experiment in a work queue"""
+
+    PENDING = 0
+    CLAIMED = 1
+    COMPLETE = 2
+    FAILED = 3
+
+
+class WorkQueue:
+    """Queue of experiments shared by workers, in a SQLite file of the repository.
+
+    Workers claim experiments for the duration of a lease, renewed with
+    heartbeats while they run. Experiments whose lease expired, e.g. as their
+    worker crashed, count as a failed attempt. Failed experiments are queued
+    again until max_attempts is reached.
+
+    Workers are not interrupted when their lease is lost, the experiment may
+    then run on several workers at once. Only the worker holding the claim
+    can record its outcome, others are told the claim was lost.
+    """
+
+    filename = "queue.sqlite"
+
+    def __init__(self, root, lease: float = 300.0, max_attempts: int = 1):
+        self.root = pathlib.Path(root).absolute()
+        self.path = self.root / self.filename
+        self.lease = lease
+        self.max_attempts = max_attempts
+
+    @contextlib.contextmanager
+    def transaction(self) -> typing.Iterator[sqlite3.Connection]:
+        """Connection to the queue, holding the write lock until committed"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        connection = sqlite3.connect(str(self.path), timeout=60, isolation_level=None)
+        try:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS queue ("
+                "uuid TEXT PRIMARY KEY, name TEXT NOT NULL, state TEXT NOT NULL, "
+                "worker TEXT, expires REAL, attempts INTEGER NOT NULL DEFAULT 0, "
+                "enqueued REAL NOT NULL)"
+            )
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                yield connection
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+            connection.execute("COMMIT")
+        finally:
+            connection.close()
+
+    @staticmethod
+    def worker_id() -> str:
+        return "{}-{}".format(socket.gethostname(), os.getpid())
+
+    def enqueue(self, experiment: Experiment) -> None:
+        """Record the experiment in the repository and add it to the queue"""
+        experiment.prepare_path()
+        with self.transaction() as connection:
+            connection.execute(
+                "INSERT OR IGNORE INTO queue (uuid, name, state, enqueued) "
+                "VALUES (?, ?, ?, ?)",
+                (
+                    str(experiment.uuid),
+                    experiment.path.name,
+                    WorkState.PENDING.name,
+                    time.time(),
+                ),
+            )
+
+    def claim(self, worker: typing.Optional[str] = None) -> typing.Optional[Experiment]:
+        """Claim the next pending experiment, None if the queue is empty"""
+        worker = worker or self.worker_id()
+        now = time.time()
+        with self.transaction() as connection:
+            # Recover experiments from workers which stopped renewing their lease
+            connection.execute(
+                "UPDATE queue SET state = CASE WHEN attempts < ? THEN ? ELSE ? END, "
+                "worker = NULL, expires = NULL WHERE state = ? AND expires < ?",
+                (
+                    self.max_attempts,
+                    WorkState.PENDING.name,
+                    WorkState.FAILED.name,
+                    WorkState.CLAIMED.name,
+                    now,
+                ),
+            )
+            row = connection.execute(
+                "SELECT uuid, name FROM queue WHERE state = ? "
+                "ORDER BY enqueued LIMIT 1",
+                (WorkState.PENDING.name,),
+            ).fetchone()
+            if row is None:
+                return None
+            connection.execute(
+                "UPDATE queue SET state = ?, worker = ?, expires = ?, "
+                "attempts = attempts + 1 WHERE uuid = ?",
+                (WorkState.CLAIMED.name, worker, now + self.lease, row[0]),
+            )
+        return Experiment.load(self.root / row[1])
+
+    def _update(self, experiment, worker, query, parameters) -> bool:
+        with self.transaction() as connection:
+            cursor = connection.execute(
+                query + " WHERE uuid = ? AND state = ? AND worker = ?",
+                parameters
+                + (
+                    str(experiment.uuid),
+                    WorkState.CLAIMED.name,
+                    worker or self.worker_id(),
+                ),
+            )
+            return cursor.rowcount > 0
+
+    def heartbeat(
+        self, experiment: Experiment, worker: typing.Optional[str] = None
+    ) -> bool:
+        """Renew the lease on the experiment, False if the claim was lost"""
+        return self._update(
+            experiment,
+            worker,
+            "UPDATE queue SET expires = ?",
+            (time.time() + self.lease,),
+        )
+
+    def complete(
+        self, experiment: Experiment, worker: typing.Optional[str] = None
+    ) -> bool:
+        """Mark the claimed experiment as complete, False if the claim was lost"""
+        return self._update(
+            experiment,
+            worker,
+            "UPDATE queue SET state = ?, expires = NULL",
+            (WorkState.COMPLETE.name,),
+        )
+
+    def fail(self, experiment: Experiment, worker: typing.Optional[str] = None) -> bool:
+        """Queue the claimed experiment again, or mark it as failed after its last attempt"""
+        return self._update(
+            experiment,
+            worker,
+            "UPDATE queue SET state = CASE WHEN attempts < ? THEN ? ELSE ? END, "
+            "worker = NULL, expires = NULL",
+            (self.max_attempts, WorkState.PENDING.name, WorkState.FAILED.name),
+        )
+
+    def status(self) -> typing.Dict[WorkState, int]:
+        """Number of experiments in each state"""
+        with self.transaction() as connection:
+            rows = connection.execute(
+                "SELECT state, COUNT(*) FROM queue GROUP BY state"
+            )
+            counts = {WorkState[s]: c for s, c in rows}
+        return {s: counts.get(s, 0) for s in WorkState}
+
+    def work(
+        self,
+        worker: typing.Optional[str] = None,
+        heartbeat: typing.Optional[float] = None,
+    ) -> typing.Iterator[Run]:
+        """Run claimed experiments until the queue is empty, yield each run.
+
+        The lease is renewed in the background, by default three times per lease.
+        Runs whose claim was lost meanwhile are yielded, but not recorded in the
+        queue.
+        """
+        worker = worker or self.worker_id()
+        interval = self.lease / 3 if heartbeat is None else heartbeat
+        while (experiment := self.claim(worker)) is not None:
+            stop = threading.Event()
+
+            def renew():
+                while not stop.wait(interval):
+                    if not self.heartbeat(experiment, worker):
+                        return
+
+            thread = threading.Thread(target=renew, daemon=True)
+            thread.start()
+            run = Run(experiment)
+            try:
+                run.execute()
+            except Exception as _:
+                pass
+            finally:
+                stop.set()
+                thread.join()
+            if run.status == RunStatus.COMPLETE:
+                self.complete(experiment, worker)
+            else:
+                self.fail(experiment, worker)
+            yield run
 
 
 class WorkingExperiment(Experiment):
@@ -1,5 +1,5 @@
 from .components import Context, Alias, Component
-from .coverage import EventCombinationsRegistry
+from .coverage import CoverageTracker, EventCombinationsRegistry, TWayCoverage
 from .domain import (
     Domain,
     domain_values,
@@ -10,3 +10,9 @@ from .domain import (
 )
 from .helpers import F, G, weak_until, implies, until
 from .monitoring import Trace, Monitor
+from .plan import EvaluationPlan
+from .reduction import Decimation, DecimationMode
+from .simplification import Simplification, simplify
+from .horizon import Horizon, horizon
+from .interning import NodeTable, intern
+from .sketch import DistinctStatesSketch, HyperLogLog
@@ -10,14 +10,30 @@ be built upon the distance between the operator and the welder, and the active
 status of the welder.
 """
 from __future__ import annotations
-from typing import Optional, Tuple, Union, Set, TypeVar, Type, overload
+import functools
+from types import MappingProxyType
+from typing import (
+    Any,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Tuple,
+    Union,
+    Set,
+    TypeVar,
+    Type,
+    overload,
+)
 
 import attr
-import lenses
 from mtfl import AtomicPred, And, G, WeakUntil, Implies, Neg, Next
 from mtfl.ast import Or, Lt, Eq
 
 from csi.situation.domain import Domain
+from csi.situation.interning import NODES
 
 PathType = Tuple[str, ...]
 
@@ -44,16 +60,82 @@ class _Atom(AtomicPred):
 Node = Union[_Atom, And, Or, Lt, Eq, G, WeakUntil, Implies, Neg, Next]
 
 
+class AtomIndex(Mapping[PathType, _Atom]):
+    """Immutable index of atoms, by path and by id"""
+
+    def __init__(self, atoms: Iterable[_Atom]):
+        self._paths: Dict[PathType, _Atom] = {a.path: a for a in atoms}
+        self._ids: Dict[str, _Atom] = {a.id: a for a in self._paths.values()}
+
+    def __getitem__(self, path: PathType) -> _Atom:
+        return self._paths[path]
+
+    def __iter__(self) -> Iterator[PathType]:
+        return iter(self._paths)
+
+    def __len__(self) -> int:
+        return len(self._paths)
+
+    @property
+    def ids(self) -> Mapping[str, _Atom]:
+        """Atoms indexed by id"""
+        return MappingProxyType(self._ids)
+
+    @property
+    def domains(self) -> Mapping[_Atom, Domain]:
+        """Domain of the atoms which define one"""
+        return MappingProxyType(
+            {a: a.domain for a in self._paths.values() if a.domain is not None}
+        )
+
+
+# Paths of the components reachable from each context class, relative to it
+_LAYOUTS: Dict[type, Tuple[PathType, ...]] = {}
+
+
+def _layout(context: type) -> Tuple[PathType, ...]:
+    """Collect the relative paths of the components declared in the context class"""
+    layout = _LAYOUTS.get(context)
+    if layout is None:
+        attributes: Dict[str, Any] = {}
+        for c in reversed(context.__mro__):
+            attributes.update(vars(c))
+        paths: List[PathType] = []
+        for name, value in attributes.items():
+            if isinstance(value, Component):
+                paths.append((name,))
+            elif isinstance(value, Context):
+                paths.extend((name,) + p for p in _layout(type(value)))
+        layout = _LAYOUTS[context] = tuple(paths)
+    return layout
+
+
 @attr.s(frozen=True, repr=True, eq=True, order=True, hash=True)
 class Context:
     """Acts as a namespace to organise atoms"""
 
     _name: str = attr.ib(factory=str)
     _path: PathType = attr.ib(factory=tuple)
+    # Contexts resolved as a descriptor, by path of the owner instance
+    _resolved: Dict[PathType, Context] = attr.ib(
+        factory=dict, init=False, repr=False, eq=False, order=False, hash=False
+    )
+    _index: Optional[AtomIndex] = attr.ib(
+        default=None, init=False, repr=False, eq=False, order=False, hash=False
+    )
 
     def __set_name__(self, owner: Type[Context], name: str) -> None:
         object.__setattr__(self, "_name", name)
 
+    def atoms(self) -> AtomIndex:
+        """Index the atoms reachable from the context, built on first use"""
+        if self._index is None:
+            index = AtomIndex(
+                functools.reduce(getattr, path, self) for path in _layout(type(self))
+            )
+            object.__setattr__(self, "_index", index)
+        return self._index
+
     @overload
     def __get__(self: C, instance: None, owner: None) -> C:
         ...
@@ -64,9 +146,11 @@ class Context:
         ...
 
     def __get__(self: C, instance: Context | None, owner: Type[Context] | None) -> C:
-        if instance is None:
-            return attr.evolve(self, path=(self._name,))
-        return attr.evolve(self, path=instance._path + (self._name,))
+        key = () if instance is None else instance._path
+        context = self._resolved.get(key)
+        if context is None:
+            context = self._resolved[key] = attr.evolve(self, path=key + (self._name,))
+        return context
 
 
 @attr.s(frozen=True, repr=True, eq=True, order=True, hash=True)
@@ -74,16 +158,19 @@ class Alias:
     """Defines a situation within a specific context"""
 
     condition: Node = attr.ib()
+    # Conditions resolved as a descriptor, by path of the owner instance
+    _resolved: Dict[PathType, Node] = attr.ib(
+        factory=dict, init=False, repr=False, eq=False, order=False, hash=False
+    )
 
     def __get__(self, instance: Context | None, owner: Type[Context] | None) -> Node:
-        path: PathType
-        if instance is None:
-            path = tuple()
-        else:
-            path = instance._path
-        atoms = set(lenses.bind(self.condition.walk()).Each().Instance(_Atom).collect())
-        v = {a.id: _Atom(path + a.path, a.domain) for a in atoms}
-        return self.condition[v]
+        path: PathType = () if instance is None else instance._path
+        condition = self._resolved.get(path)
+        if condition is None:
+            atoms = (a for a in NODES.atoms(self.condition) if isinstance(a, _Atom))
+            v = {a.id: _Atom(path + a.path, a.domain) for a in atoms}
+            condition = self._resolved[path] = NODES.intern(self.condition[v])
+        return condition
 
 
 @attr.s(frozen=True, repr=True, eq=True, order=True, hash=True)
@@ -92,6 +179,10 @@ class Component:
 
     domain: Optional[Domain] = attr.ib(default=None)
     _name: str = attr.ib(factory=str)
+    # Atoms resolved as a descriptor, by path of the owner instance
+    _resolved: Dict[PathType, _Atom] = attr.ib(
+        factory=dict, init=False, repr=False, eq=False, order=False, hash=False
+    )
 
     def __set_name__(self, owner: Type[Context], name: str) -> None:
         object.__setattr__(self, "_name", name)
@@ -105,6 +196,10 @@ class Component:
         ...
 
     def __get__(self, instance: Context | None, owner: Type[Context] | None) -> _Atom:
-        if instance is None:
-            return _Atom((self._name,), self.domain)
-        return _Atom(instance._path + (self._name,), self.domain)
+        key = () if instance is None else instance._path
+        atom = self._resolved.get(key)
+        if atom is None:
+            atom = self._resolved[key] = NODES.intern(
+                _Atom(key + (self._name,), self.domain)
+            )
+        return atom
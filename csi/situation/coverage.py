@@ -2,47 +2,327 @@
 Definition and calculation of coverage metrics and coverage-related helpers.
 
 """
-from collections import defaultdict
+from __future__ import annotations
+
+import functools
+import itertools
+import multiprocessing
+import os
+import pickle
+import random
+import uuid
+from bisect import bisect_right
+from collections import Counter, defaultdict
 from functools import reduce
 from operator import mul
-from typing import Dict, Any, Set, FrozenSet, Tuple
+from pathlib import Path
+from typing import (
+    Dict,
+    Any,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Set,
+    FrozenSet,
+    Tuple,
+    Union,
+)
 
-from traces import TimeSeries
+import attr
+import numpy as np
 
-from csi.situation.components import _Atom
+from csi.situation.components import Context, _Atom
 from csi.situation.domain import Domain
 from csi.situation.monitoring import Trace
+from csi.situation.storage import DEFAULT_CHUNK_SIZE
+
+# Largest state code handled with fixed size integers
+_MAX_FIXED_CODE = 2**62
+
+
+def _key_order(key: Any) -> str:
+    """Order keys by their identifier, atoms and other keys alike"""
+    return str(getattr(key, "id", key))
+
+
+@attr.s(frozen=True, auto_attribs=True, slots=True)
+class StateEncoding:
+    """Mixed-radix encoding of states as integers over the domains' bin indices.
+
+    Each key is assigned a digit, 0 when its value is None or out of domain,
+    and its bin index plus one otherwise.
+    """
+
+    keys: Tuple[Any, ...]
+    domains: Tuple[Domain, ...]
+    radices: Tuple[int, ...]
+    weights: Tuple[int, ...]
+
+    @classmethod
+    def of(cls, domain: Mapping[Any, Domain]) -> StateEncoding:
+        keys = tuple(sorted(domain, key=_key_order))
+        domains = tuple(domain[k] for k in keys)
+        radices = tuple(len(d) + 1 for d in domains)
+        weights = tuple(reduce(mul, radices[:i], 1) for i in range(len(radices)))
+        return cls(keys, domains, radices, weights)
+
+    def matches(self, domain: Mapping[Any, Domain]) -> bool:
+        """Check whether the encoding is defined over the specified domain"""
+        return len(domain) == len(self.keys) and all(
+            k in domain and domain[k] == d for k, d in zip(self.keys, self.domains)
+        )
+
+    @property
+    def size(self) -> int:
+        """Number of distinct codes"""
+        return reduce(mul, self.radices, 1)
+
+    @property
+    def _dtype(self):
+        return np.int64 if self.size <= _MAX_FIXED_CODE else object
+
+    def digit(self, i: int, v: Any) -> int:
+        """Digit of the value for the i-th key"""
+        if v is None:
+            return 0
+        index = self.domains[i].index(v)
+        return 0 if index is None else index + 1
+
+    def encode(self, state: Mapping[Any, Any]) -> int:
+        """Encode the state, missing keys being undefined"""
+        return sum(
+            self.digit(i, state.get(k)) * w
+            for i, (k, w) in enumerate(zip(self.keys, self.weights))
+        )
+
+    def decode(self, code: int) -> FrozenSet[Tuple[Any, Any]]:
+        """Decode the state as a set of key, value pairs"""
+        state = []
+        for k, d, r, w in zip(self.keys, self.domains, self.radices, self.weights):
+            digit = (code // w) % r
+            state.append((k, None if digit == 0 else d.from_index(digit - 1)))
+        return frozenset(state)
+
+    def digits(self, codes: Iterable[int]) -> np.ndarray:
+        """Decode the codes as an array of digits, one column per key"""
+        values = np.fromiter(codes, dtype=object).astype(self._dtype)
+        result = np.empty((len(values), len(self.keys)), dtype=self._dtype)
+        for i, (r, w) in enumerate(zip(self.radices, self.weights)):
+            result[:, i] = (values // w) % r
+        return result
+
+    def codes(self, digits: Sequence[np.ndarray], count: int) -> np.ndarray:
+        """Encode states from the digits of each key, in order"""
+        codes = np.zeros(count, dtype=self._dtype)
+        for column, w in zip(digits, self.weights):
+            codes += np.asarray(column).astype(self._dtype) * w
+        return codes
+
+    def combine(self, digits: Sequence[np.ndarray], count: int) -> Set[int]:
+        """Encode the set of states from the digits of each key"""
+        return set(self.codes(digits, count).tolist())
+
+    def translate(self, codes: Iterable[int], target: StateEncoding) -> Set[int]:
+        """Encode the set of states in the target encoding"""
+        return set(self.convert(codes, target).tolist())
+
+    def convert(self, codes: Iterable[int], target: StateEncoding) -> np.ndarray:
+        """Encode the states in the target encoding, in order.
+
+        Values are converted to the bins of the target domains, keys missing
+        from the states are undefined in the target.
+        """
+        digits = self.digits(codes)
+        positions = {k: i for i, k in enumerate(self.keys)}
+        columns = []
+        for j, (k, d) in enumerate(zip(target.keys, target.domains)):
+            i = positions.get(k)
+            if i is None:
+                columns.append(np.zeros(len(digits), dtype=np.int64))
+            elif d == self.domains[i]:
+                columns.append(digits[:, i])
+            else:
+                # Convert each distinct digit of a key at once
+                source = self.domains[i]
+                observed, inverse = np.unique(digits[:, i], return_inverse=True)
+                conversion = np.array(
+                    [
+                        0 if o == 0 else target.digit(j, source.from_index(o - 1))
+                        for o in observed
+                    ],
+                    dtype=np.int64,
+                )
+                columns.append(conversion[inverse.reshape(-1)])
+        return target.codes(columns, len(digits))
+
+    @property
+    def _rank_weights(self) -> Tuple[int, ...]:
+        bins = [r - 1 for r in self.radices]
+        return tuple(reduce(mul, bins[:i], 1) for i in range(len(bins)))
+
+    def ranks(self, codes: Iterable[int]) -> List[int]:
+        """Sorted ranks of the defined states among all states defined for each key"""
+        digits = self.digits(codes)
+        digits = digits[(digits != 0).all(axis=1)]
+        ranks = np.zeros(len(digits), dtype=self._dtype)
+        for i, w in enumerate(self._rank_weights):
+            ranks += (digits[:, i] - 1) * w
+        return sorted(ranks.tolist())
+
+    def unrank(self, rank: int) -> int:
+        """Code of the defined state with the specified rank"""
+        code = 0
+        for r, w, v in zip(self.radices, self.weights, self._rank_weights):
+            code += ((rank // v) % (r - 1) + 1) * w
+        return code
 
 
 # TODO Add method to Domain to register new atom, its domain, and default value
 # TODO Add parameters/configuration to clarify behaviour on out of domain value
 class EventCombinationsRegistry:
-    """Registry for covered system states, based on its combined components' values"""
+    """Registry for covered system states, based on its combined components' values
+
+    States are stored as integers encoding the bin of each component value in
+    its domain, values are thus recorded as the representative of their bin.
+    The time spent in each state, and the transitions between states, can be
+    recorded alongside them.
+    """
 
     domain: Dict[_Atom, Domain]
     default: Dict[_Atom, Any]
-    # TODO Rename to clarify field captures encountered values
-    combinations: Set[FrozenSet[Tuple[_Atom, Any]]]
+    # Encoded states, following the encoding of the registry domain
+    states: Set[int]
+    # Time spent in each encoded state
+    dwell: Dict[int, float]
+    # Number of changes between consecutive encoded states
+    transitions: Counter[Tuple[int, int]]
 
     def __init__(self):
         self.domain = {}
         self.default = defaultdict()
-        self.combinations = set()
-
-    #    def values_of(self, k):
-    #        yield from zip(itertools.repeat(k), self.domain[k].values)
-    #
-    #    def all_values(self) -> Iterable[FrozenSet[Tuple[str, Any]]]:
-    #        yield from map(
-    #            frozenset, itertools.product(*[self.values_of(k) for k in self.domain])
-    #        )
-    #
-    #    def missing_values(self):
-    #        yield from (x for x in self.all_values() if x not in self.combinations)
+        self.states = set()
+        self.dwell = defaultdict(float)
+        self.transitions = Counter()
+        self._encoding: Optional[StateEncoding] = None
+
+    @classmethod
+    def from_context(cls, context: Context) -> EventCombinationsRegistry:
+        """Create a registry over the atoms of the context which define a domain"""
+        registry = cls()
+        registry.domain.update(context.atoms().domains)
+        return registry
+
+    @property
+    def encoding(self) -> StateEncoding:
+        """Encoding of the states, updated with the registry domain"""
+        if self._encoding is None or not self._encoding.matches(self.domain):
+            encoding = StateEncoding.of(self.domain)
+            if self._encoding is not None and self.states:
+                self.states = self._encoding.translate(self.states, encoding)
+                self._add_statistics(self._encoding, self._pop_statistics(), encoding)
+            self._encoding = encoding
+        return self._encoding
+
+    def _pop_statistics(self):
+        statistics = self.dwell, self.transitions
+        self.dwell, self.transitions = defaultdict(float), Counter()
+        return statistics
+
+    def _add_statistics(self, source: StateEncoding, statistics, target: StateEncoding):
+        """Add dwell times and transitions, converted to the target encoding"""
+        dwell, transitions = statistics
+        if dwell:
+            states = source.convert(dwell, target).tolist()
+            for code, duration in zip(states, dwell.values()):
+                self.dwell[code] += duration
+        if transitions:
+            pairs = list(transitions)
+            origins = source.convert((a for a, _ in pairs), target).tolist()
+            targets = source.convert((b for _, b in pairs), target).tolist()
+            for a, b, p in zip(origins, targets, pairs):
+                if a != b:
+                    self.transitions[(a, b)] += transitions[p]
+
+    # TODO Rename to clarify field captures encountered values
+    @property
+    def combinations(self) -> Set[FrozenSet[Tuple[_Atom, Any]]]:
+        """Encountered states, as sets of component and value pairs"""
+        encoding = self.encoding
+        return {encoding.decode(c) for c in self.states}
+
+    @combinations.setter
+    def combinations(self, combinations: Iterable[FrozenSet[Tuple[_Atom, Any]]]):
+        encoding = self.encoding
+        self.states = {encoding.encode(dict(c)) for c in combinations}
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_encoding"] = self.encoding
+        return state
+
+    def __setstate__(self, state):
+        # Upgrade registries serialised with sets of combinations
+        combinations = state.pop("combinations", None)
+        state.setdefault("states", set())
+        state.setdefault("dwell", defaultdict(float))
+        state.setdefault("transitions", Counter())
+        state.setdefault("_encoding", None)
+        self.__dict__.update(state)
+        if combinations is not None:
+            self.combinations = combinations
+
+    def _missing_ranks(self, observed: List[int]) -> Iterator[int]:
+        start = 0
+        for rank in observed:
+            yield from range(start, rank)
+            start = rank + 1
+        yield from range(start, self.total)
+
+    def missing_values(
+        self, limit: Optional[int] = None
+    ) -> Iterator[FrozenSet[Tuple[_Atom, Any]]]:
+        """Enumerate the uncovered states lazily, in the order of their bins"""
+        encoding = self.encoding
+        ranks = self._missing_ranks(encoding.ranks(self.states))
+        for rank in itertools.islice(ranks, limit):
+            yield encoding.decode(encoding.unrank(rank))
+
+    def sample_missing(
+        self, k: int, rng: Optional[random.Random] = None
+    ) -> List[FrozenSet[Tuple[_Atom, Any]]]:
+        """Sample up to k distinct uncovered states uniformly"""
+        rng = random if rng is None else rng
+        encoding = self.encoding
+        observed = encoding.ranks(self.states)
+        # The j-th missing rank follows the observed ranks o_p with o_p - p <= j
+        offsets = [o - p for p, o in enumerate(observed)]
+        count = self.total - len(observed)
+        k = min(k, count)
+        if 2 * k >= count:
+            indices = rng.sample(range(count), k)
+        else:
+            # Draw missing indices one at a time, ranges may exceed native integers
+            selected = set()
+            while len(selected) < k:
+                selected.add(rng.randrange(count))
+            indices = list(selected)
+        return [
+            encoding.decode(encoding.unrank(j + bisect_right(offsets, j)))
+            for j in indices
+        ]
+
+    @property
+    def missing(self) -> int:
+        """Number of uncovered states"""
+        return self.total - self.covered
 
     @property
     def covered(self) -> int:
-        return sum(1 for c in self.combinations if all(v is not None for _, v in c))
+        digits = self.encoding.digits(self.states)
+        return int(np.count_nonzero((digits != 0).all(axis=1)))
 
     @property
     def total(self) -> int:
@@ -52,63 +332,464 @@ class EventCombinationsRegistry:
     def coverage(self) -> float:
         return float(self.covered) / self.total
 
-    def project(self, keys):
+    def copy(self) -> EventCombinationsRegistry:
+        """Copy the registry, sharing its domains"""
+        registry = EventCombinationsRegistry()
+        registry.domain |= self.domain
+        registry.default |= self.default
+        registry.states = set(self.states)
+        registry.dwell = defaultdict(float, self.dwell)
+        registry.transitions = Counter(self.transitions)
+        registry._encoding = self._encoding
+        return registry
+
+    def project(self, keys) -> RegistryView:
         """Reduce the registry to only include the specified keys."""
-        projection = EventCombinationsRegistry()
-        projection.domain |= {k: v for k, v in self.domain.items() if k in keys}
-        projection.default |= {k: v for k, v in self.default.items() if k in keys}
-        projection.combinations = {
-            frozenset((k, v) for k, v in c if k in keys) for c in self.combinations
-        }
-        return projection
+        return RegistryView(self, {k: v for k, v in self.domain.items() if k in keys})
+
+    def merge(
+        self, other: EventCombinationsRegistry, intersection: bool = False
+    ) -> EventCombinationsRegistry:
+        """Add the states covered by the other registry to this one.
 
-    def merge(self, other):
-        # TODO check domain and fill gaps
-        # TODO Create new registry containing merged domains/defaults/values
-        if self.domain == other.domain:
-            self.combinations.update(other.combinations)
+        Registries over different components are merged over the union of their
+        components, those missing from a registry being undefined (None), or
+        over their intersection. Shared components keep the domain of this
+        registry, values of the other are converted to its bins.
+        """
+        if intersection:
+            for k in [k for k in self.domain if k not in other.domain]:
+                del self.domain[k]
+                self.default.pop(k, None)
         else:
-            # TODO Get all values for the other, project into current
-            raise NotImplementedError()
+            for k, d in other.domain.items():
+                self.domain.setdefault(k, d)
+            for k, v in other.default.items():
+                self.default.setdefault(k, v)
+        encoding = self.encoding
+        if other.encoding == encoding:
+            self.states.update(other.states)
+        else:
+            self.states.update(other.encoding.translate(other.states, encoding))
+        statistics = other.dwell, other.transitions
+        self._add_statistics(other.encoding, statistics, encoding)
+        return self
 
     def record(self, values: Dict[_Atom, Any]):
         """Record the specified system state"""
-        entry = {(k, v) for k, v in values.items() if k in self.domain}
-        undefined = {(k, None) for k in self.domain if k not in values}
-        self.combinations.add(frozenset(entry | undefined))
+        encoding = self.encoding
+        self.states.add(encoding.encode(values))
 
-    def restrict(self, restrictions: Dict[_Atom, Domain]):
+    def restrict(self, restrictions: Dict[_Atom, Domain]) -> RegistryView:
         """Restrict domain of a specific variable"""
-        restriction = EventCombinationsRegistry()
-        restriction.domain |= {
-            k: restrictions.get(k, d) for k, d in self.domain.items()
-        }
-        restriction.default |= {k: v for k, v in self.default.items()}
-        restriction.combinations = {
-            frozenset((k, restrictions.get(k, self.domain[k]).value(v)) for k, v in c)
-            for c in self.combinations
-        }
-        return restriction
-
-    def register(self, trace: Trace):
-        """Record the consecutive states encountered in the trace"""
-        # FIXME Key sorting relies on id field being present, not the case for non Atom keys
-        event_keys = sorted(
-            self.domain,
-            key=lambda d: getattr(d, "id", (str(d),)),
+        return RegistryView(
+            self, {k: restrictions.get(k, d) for k, d in self.domain.items()}
+        )
+
+    def register(self, trace: Trace, statistics: bool = False):
+        """Record the consecutive states encountered in the trace.
+
+        With statistics, the time spent in each state and the transitions
+        between consecutive states are recorded as well. The last state of the
+        trace has no duration.
+        """
+        encoding = self.encoding
+        # Components without signal in the trace are undefined in all states
+        signals = {}
+        for i, e in enumerate(encoding.keys):
+            if e in trace.values:
+                signals[i] = e
+            elif getattr(e, "id", e) in trace.values:
+                signals[i] = getattr(e, "id", e)
+        events = trace.iter_merge(list(signals.values()))
+        previous: Optional[Tuple[Any, int]] = None
+        # States are encoded by chunks, each component at once
+        while chunk := list(itertools.islice(events, DEFAULT_CHUNK_SIZE)):
+            columns = [np.zeros(len(chunk), dtype=np.int64)] * len(encoding.keys)
+            for j, i in enumerate(signals):
+                d = encoding.domains[i]
+                columns[i] = d.values([v[j] for _, v in chunk], indices=True) + 1
+            codes = encoding.codes(columns, len(chunk))
+            self.states.update(codes.tolist())
+            if statistics:
+                times = [t for t, _ in chunk]
+                if previous is not None:
+                    times.insert(0, previous[0])
+                    codes = np.concatenate(([previous[1]], codes)).astype(codes.dtype)
+                self._record_statistics(times, codes)
+                previous = times[-1], codes[-1]
+
+    def _record_statistics(self, times: List[Any], codes: np.ndarray):
+        """Record the dwell times and transitions of consecutive states"""
+        durations = np.diff(np.asarray(times, dtype=float))
+        states, inverse = np.unique(codes[:-1], return_inverse=True)
+        totals = np.bincount(
+            inverse.reshape(-1), weights=durations, minlength=len(states)
+        )
+        for code, duration in zip(states.tolist(), totals.tolist()):
+            self.dwell[code] += duration
+        changes = codes[1:] != codes[:-1]
+        self.transitions.update(
+            zip(codes[:-1][changes].tolist(), codes[1:][changes].tolist())
+        )
+
+
+def _registry(state: Dict[str, Any]) -> EventCombinationsRegistry:
+    registry = EventCombinationsRegistry.__new__(EventCombinationsRegistry)
+    registry.__setstate__(state)
+    return registry
+
+
+class RegistryView(EventCombinationsRegistry):
+    """Registry over another domain, whose states are derived from a parent.
+
+    Coverage metrics are computed from the encoded states of the parent, the
+    states of the view are only built when first required, and do not reflect
+    later changes of the parent.
+    """
+
+    def __init__(self, parent: EventCombinationsRegistry, domain: Dict[_Atom, Domain]):
+        super().__init__()
+        self.parent = parent
+        self.domain |= domain
+        self.default |= {k: v for k, v in parent.default.items() if k in domain}
+        self._states: Optional[Set[int]] = None
+
+    @property
+    def encoding(self) -> StateEncoding:
+        """Encoding of the states, updated with the view domain"""
+        if self._states is None:
+            # States not yet built are derived from the parent in the new encoding
+            if self._encoding is None or not self._encoding.matches(self.domain):
+                self._encoding = StateEncoding.of(self.domain)
+        return super().encoding
+
+    def _codes(self) -> np.ndarray:
+        """Distinct encoded states of the parent, in the view encoding"""
+        return np.unique(
+            self.parent.encoding.convert(self.parent.states, self.encoding)
         )
-        events = TimeSeries.merge(
-            [trace.values[getattr(e, "id", e)] for e in event_keys]
+
+    @property
+    def states(self) -> Set[int]:
+        if self._states is None:
+            self._states = set(self._codes().tolist())
+        return self._states
+
+    @states.setter
+    def states(self, states: Set[int]):
+        self._states = states
+
+    @property
+    def covered(self) -> int:
+        if self._states is not None:
+            return super().covered
+        digits = self.encoding.digits(self._codes())
+        return int(np.count_nonzero((digits != 0).all(axis=1)))
+
+    def materialize(self) -> EventCombinationsRegistry:
+        """Independent registry with the states of the view"""
+        return self.copy()
+
+    def __reduce__(self):
+        # Views are serialised as independent registries
+        return _registry, (self.materialize().__getstate__(),)
+
+
+RegistrySource = Union[EventCombinationsRegistry, os.PathLike, str]
+
+
+def _load(source: RegistrySource) -> EventCombinationsRegistry:
+    if isinstance(source, EventCombinationsRegistry):
+        return source.copy()
+    with open(source, "rb") as registry_file:
+        return pickle.load(registry_file)
+
+
+def _merge_sources(
+    sources: Sequence[RegistrySource], intersection: bool = False
+) -> EventCombinationsRegistry:
+    registries = map(_load, sources)
+    merged = next(registries)
+    for registry in registries:
+        merged.merge(registry, intersection)
+    return merged
+
+
+def _merge_pair(
+    pair: Sequence[EventCombinationsRegistry], intersection: bool = False
+) -> EventCombinationsRegistry:
+    merged = pair[0]
+    for registry in pair[1:]:
+        merged.merge(registry, intersection)
+    return merged
+
+
+def merge_all(
+    registries: Iterable[RegistrySource],
+    workers: Optional[int] = None,
+    intersection: bool = False,
+) -> EventCombinationsRegistry:
+    """Merge registries, or the registries pickled in the specified files.
+
+    With multiple workers, each merges a share of the registries before the
+    partial results are reduced pairwise, in parallel. The inputs are left
+    unchanged.
+    """
+    sources = list(registries)
+    if not sources:
+        return EventCombinationsRegistry()
+    if workers is None or workers <= 1 or len(sources) == 1:
+        return _merge_sources(sources, intersection)
+    shares = [sources[i::workers] for i in range(min(workers, len(sources)))]
+    with multiprocessing.Pool(processes=len(shares)) as pool:
+        merged = pool.map(
+            functools.partial(_merge_sources, intersection=intersection), shares
         )
-        events.compact()
-        for _, v in events.items():
-            entry = set()
-            for (e, d), i in zip(
-                sorted(
-                    self.domain.items(),
-                    key=lambda d: getattr(d[0], "id", (str(d[0]),)),
-                ),
-                v,
-            ):
-                entry.add((e, d.value(i)))
-            self.combinations.add(frozenset(entry))
+        while len(merged) > 1:
+            pairs = [merged[i : i + 2] for i in range(0, len(merged), 2)]
+            merged = pool.map(
+                functools.partial(_merge_pair, intersection=intersection), pairs
+            )
+    return merged[0]
+
+
+class CoverageTracker:
+    """Coverage of the states encountered across runs, updated as runs complete.
+
+    The tracker accumulates the states of each run in a registry, over a fixed
+    domain, and maintains its coverage metrics as new states are recorded.
+
+    Checkpoints are a snapshot of the tracker and a journal of the states first
+    encountered in each later run, appended next to the snapshot.
+    """
+
+    def __init__(self, registry: EventCombinationsRegistry):
+        self.registry = registry
+        encoding = registry.encoding
+        self.runs: int = 0
+        # Number of states first encountered in the last run
+        self.new_states: int = 0
+        self.covered: int = 0
+        self.total: int = registry.total
+        self._bins = {
+            k: np.zeros(r - 1, dtype=bool)
+            for k, r in zip(encoding.keys, encoding.radices)
+        }
+        self._bins_covered = {k: 0 for k in encoding.keys}
+        self._record(registry.states)
+        # Snapshot identifier, and journal entries not yet saved
+        self._generation: Optional[str] = None
+        self._checkpoint: Optional[Path] = None
+        self._pending: List[Tuple[int, Set[int]]] = []
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_checkpoint"], state["_pending"]
+        return state
+
+    def __setstate__(self, state):
+        state.setdefault("_generation", None)
+        self.__dict__.update(state)
+        self._checkpoint = None
+        self._pending = []
+
+    @classmethod
+    def from_context(cls, context: Context) -> CoverageTracker:
+        return cls(EventCombinationsRegistry.from_context(context))
+
+    def _record(self, states: Set[int]) -> None:
+        encoding = self.registry.encoding
+        digits = encoding.digits(states)
+        self.covered += int(np.count_nonzero((digits != 0).all(axis=1)))
+        for i, k in enumerate(encoding.keys):
+            seen = digits[:, i]
+            self._bins[k][(seen[seen != 0] - 1).astype(np.int64)] = True
+            self._bins_covered[k] = int(np.count_nonzero(self._bins[k]))
+
+    def update(self, run: Union[EventCombinationsRegistry, Trace]) -> int:
+        """Record the states of a completed run, return the number of new states"""
+        encoding = self.registry.encoding
+        if isinstance(run, Trace):
+            states = EventCombinationsRegistry()
+            states.domain |= self.registry.domain
+            states.register(run)
+            run = states
+        if run.encoding == encoding:
+            new = run.states - self.registry.states
+        else:
+            new = run.encoding.translate(run.states, encoding) - self.registry.states
+        self.registry.states |= new
+        self._record(new)
+        self.runs += 1
+        self.new_states = len(new)
+        self._pending.append((self.runs, new))
+        return self.new_states
+
+    @property
+    def coverage(self) -> float:
+        return float(self.covered) / self.total
+
+    def atom_coverage(self, key: Any) -> float:
+        """Ratio of the bins of the component domain encountered in any state"""
+        return float(self._bins_covered[key]) / len(self._bins[key])
+
+    @property
+    def atom_coverages(self) -> Dict[Any, float]:
+        return {k: self.atom_coverage(k) for k in self._bins}
+
+    def save(self, path: os.PathLike) -> None:
+        """Checkpoint the tracker.
+
+        The first checkpoint at a path replaces any previous one at once, later
+        ones only append the states first encountered since to its journal.
+        """
+        path = Path(path)
+        journal = _journal(path)
+        if self._checkpoint != path or self._generation is None or not path.exists():
+            self._generation = uuid.uuid4().hex
+            temporary = path.with_name(path.name + ".tmp")
+            with temporary.open("wb") as checkpoint:
+                pickle.dump(self, checkpoint, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temporary, path)
+            # Entries of previous snapshots are ignored, the journal is obsolete
+            journal.unlink(missing_ok=True)
+        else:
+            with journal.open("ab") as entries:
+                entries.write(
+                    b"".join(
+                        pickle.dumps(
+                            (self._generation, runs, states),
+                            protocol=pickle.HIGHEST_PROTOCOL,
+                        )
+                        for runs, states in self._pending
+                    )
+                )
+        self._checkpoint = path
+        self._pending.clear()
+
+    @classmethod
+    def load(cls, path: os.PathLike) -> CoverageTracker:
+        """Restore a checkpoint, the snapshot updated with its journal"""
+        path = Path(path)
+        with path.open("rb") as checkpoint:
+            tracker = pickle.load(checkpoint)
+        tracker._checkpoint = path
+        journal = _journal(path)
+        if not journal.exists():
+            return tracker
+        size = journal.stat().st_size
+        with journal.open("rb") as entries:
+            while entries.tell() < size:
+                try:
+                    generation, runs, states = pickle.load(entries)
+                except (EOFError, pickle.UnpicklingError):
+                    # Interrupted append, the next checkpoint is a new snapshot
+                    tracker._checkpoint = None
+                    break
+                if generation != tracker._generation:
+                    continue
+                tracker.registry.states |= states
+                tracker._record(states)
+                tracker.runs = runs
+                tracker.new_states = len(states)
+        return tracker
+
+
+def _journal(path: Path) -> Path:
+    """Journal of the states recorded after the checkpoint snapshot"""
+    return path.with_name(path.name + ".journal")
+
+
+Subset = Tuple[Any, ...]
+
+
+class TWayCoverage:
+    """Coverage of the combinations of values of subsets of components.
+
+    The combinations covered for each subset are recorded in a bitmap over the
+    product of the subset's domains, registries are processed in a single pass
+    over their encoded states.
+    """
+
+    def __init__(self, domain: Mapping[Any, Domain], subsets: Iterable[Iterable[Any]]):
+        self.encoding = StateEncoding.of(domain)
+        positions = {k: i for i, k in enumerate(self.encoding.keys)}
+        self.bitmaps: Dict[Subset, np.ndarray] = {}
+        for s in subsets:
+            subset = self._subset(s)
+            size = reduce(
+                mul, (self.encoding.radices[positions[k]] - 1 for k in subset), 1
+            )
+            self.bitmaps[subset] = np.zeros(size, dtype=bool)
+
+    @staticmethod
+    def _subset(keys: Iterable[Any]) -> Subset:
+        return tuple(sorted(keys, key=_key_order))
+
+    @classmethod
+    def of(
+        cls,
+        registry: EventCombinationsRegistry,
+        t: int = 2,
+        subsets: Optional[Iterable[Iterable[Any]]] = None,
+    ) -> TWayCoverage:
+        """Coverage of the registry states, for the subsets or all t-subsets"""
+        if subsets is None:
+            subsets = itertools.combinations(registry.encoding.keys, t)
+        coverage = cls(registry.domain, subsets)
+        coverage.register(registry)
+        return coverage
+
+    @property
+    def subsets(self) -> Tuple[Subset, ...]:
+        return tuple(self.bitmaps)
+
+    def register(self, registry: EventCombinationsRegistry) -> None:
+        """Record the combinations covered by the registry states"""
+        encoding = registry.encoding
+        states = registry.states
+        if encoding != self.encoding:
+            states = encoding.translate(states, self.encoding)
+        digits = self.encoding.digits(states).astype(np.int64)
+        positions = {k: i for i, k in enumerate(self.encoding.keys)}
+        for subset, bitmap in self.bitmaps.items():
+            columns = digits[:, [positions[k] for k in subset]]
+            columns = columns[(columns != 0).all(axis=1)] - 1
+            radices = [self.encoding.radices[positions[k]] - 1 for k in subset]
+            bitmap[np.ravel_multi_index(columns.T, radices, order="F")] = True
+
+    def covered(self, subset: Iterable[Any]) -> int:
+        return int(np.count_nonzero(self.bitmaps[self._subset(subset)]))
+
+    def total(self, subset: Iterable[Any]) -> int:
+        return len(self.bitmaps[self._subset(subset)])
+
+    def coverage(self, subset: Iterable[Any]) -> float:
+        return float(self.covered(subset)) / self.total(subset)
+
+    def report(self) -> Dict[Subset, Tuple[int, int]]:
+        """Covered and total combinations of each subset"""
+        return {s: (int(np.count_nonzero(b)), len(b)) for s, b in self.bitmaps.items()}
+
+    def missing_values(
+        self, subset: Iterable[Any], limit: Optional[int] = None
+    ) -> Iterator[FrozenSet[Tuple[Any, Any]]]:
+        """Enumerate the uncovered combinations of the subset"""
+        subset = self._subset(subset)
+        positions = {k: i for i, k in enumerate(self.encoding.keys)}
+        domains = [self.encoding.domains[positions[k]] for k in subset]
+        indices = np.flatnonzero(~self.bitmaps[subset])[:limit]
+        digits = np.unravel_index(indices, [len(d) for d in domains], order="F")
+        for row in zip(*digits):
+            yield frozenset(
+                (k, d.from_index(int(i))) for k, d, i in zip(subset, domains, row)
+            )
+
+    def merge(self, other: TWayCoverage) -> TWayCoverage:
+        """Add the combinations covered in the other, over the same subsets"""
+        if other.encoding != self.encoding or other.subsets != self.subsets:
+            raise ValueError("Coverage over different domains or subsets")
+        for subset, bitmap in other.bitmaps.items():
+            self.bitmaps[subset] |= bitmap
+        return self
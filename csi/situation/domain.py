@@ -12,15 +12,50 @@ TODO Example of interval domain (distance)
 TODO Example mapping domain ()
 """
 import abc
+import functools
 import math
-from typing import Optional, Any, FrozenSet, Iterable
+from typing import Optional, Any, Callable, Dict, FrozenSet, Iterable, Tuple
 
 import attr
+import numpy as np
 
 # TODO Add wrapper for transition/combination of domain coverage
 # TODO Add method to highlight missing values in coverage
 
 
+def _objects(values: Iterable[Any]) -> np.ndarray:
+    """Store the values in an array of Python objects"""
+    values = list(values)
+    result = np.empty(len(values), dtype=object)
+    for i, v in enumerate(values):
+        result[i] = v
+    return result
+
+
+# Tolerance on bin bounds, in bins, absorbing rounding errors of representatives
+_TOLERANCE = 1e-9
+
+
+def _floor(x: float) -> int:
+    """Bin of the value scaled to bin units, bounds within tolerance included"""
+    n = round(x)
+    return n if abs(x - n) <= _TOLERANCE else math.floor(x)
+
+
+def _floors(x: np.ndarray) -> np.ndarray:
+    n = np.round(x)
+    return np.where(np.abs(x - n) <= _TOLERANCE, n, np.floor(x))
+
+
+def _representatives(
+    indices: np.ndarray, representative: Callable[[int], Any]
+) -> np.ndarray:
+    """Convert bin indices to their representative, computed once per bin"""
+    bins, inverse = np.unique(indices, return_inverse=True)
+    table = _objects(None if i < 0 else representative(int(i)) for i in bins)
+    return table[inverse.reshape(-1)]
+
+
 class DomainDefinition(abc.ABC):
     @abc.abstractmethod
     def value_of(self, v) -> Optional[Any]:
@@ -30,6 +65,28 @@ class DomainDefinition(abc.ABC):
     def __len__(self) -> int:
         return 0
 
+    def values_of(self, values: Iterable[Any]) -> np.ndarray:
+        """Convert all values to their representative, None if out of domain"""
+        return _objects(self.value_of(v) for v in values)
+
+    def indices_of(self, values: Iterable[Any]) -> np.ndarray:
+        """Convert all values to their bin index, -1 if out of domain"""
+        raise ValueError()
+
+    def index_of(self, v) -> Optional[int]:
+        """Index of the value bin in 0..len-1, None if out of domain"""
+        i = int(self.indices_of([v])[0])
+        return None if i < 0 else i
+
+    def representative(self, i: int) -> Any:
+        """Representative value of the i-th bin"""
+        raise ValueError()
+
+    @functools.cached_property
+    def bins(self) -> Tuple[Any, ...]:
+        """Representative values of all bins, ordered by index"""
+        return tuple(self.representative(i) for i in range(len(self)))
+
 
 class IdentityDomain(DomainDefinition):
     def value_of(self, v) -> Optional[Any]:
@@ -38,6 +95,9 @@ class IdentityDomain(DomainDefinition):
     def __len__(self) -> int:
         raise ValueError()
 
+    def values_of(self, values: Iterable[Any]) -> np.ndarray:
+        return _objects(values)
+
 
 @attr.s(frozen=True, init=True, eq=True)
 class RangeDomain(DomainDefinition):
@@ -48,13 +108,8 @@ class RangeDomain(DomainDefinition):
     lower_bound: bool = attr.ib(default=False)
 
     def value_of(self, v) -> Optional[Any]:
-        if self.lower_bound and v < self.a:
-            return self.a
-        elif self.upper_bound and self.b <= v:
-            return self.b
-        elif self.a <= v < self.b:
-            return math.floor((v - self.a) / self.step) * self.step + self.a
-        return None
+        i = self.index_of(v)
+        return None if i is None else self.representative(i)
 
     def __len__(self) -> int:
         if self.a <= self.b:
@@ -63,6 +118,44 @@ class RangeDomain(DomainDefinition):
             return math.ceil((self.b - self.a) / self.step)
         return 0
 
+    @functools.cached_property
+    def _inner(self) -> int:
+        """Number of bins within [a, b)"""
+        return len(self) - 1 if self.upper_bound else len(self)
+
+    def representative(self, i: int) -> Any:
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        if i == self._inner:
+            return self.b
+        return i * self.step + self.a
+
+    def index_of(self, v) -> Optional[int]:
+        if self.lower_bound and v < self.a:
+            return 0
+        elif self.upper_bound and self.b <= v:
+            return self._inner
+        elif self.a <= v < self.b:
+            return min(_floor((v - self.a) / self.step), self._inner - 1)
+        return None
+
+    def indices_of(self, values: Iterable[Any]) -> np.ndarray:
+        # Non-numeric values, e.g. None, are converted to NaN and out of domain
+        v = np.asarray(list(values), dtype=float)
+        with np.errstate(invalid="ignore"):
+            bins = np.minimum(_floors((v - self.a) / self.step), self._inner - 1)
+        indices = np.full(len(v), -1, dtype=np.int64)
+        inside = (self.a <= v) & (v < self.b)
+        indices[inside] = bins[inside]
+        if self.upper_bound:
+            indices[self.b <= v] = self._inner
+        if self.lower_bound:
+            indices[v < self.a] = 0
+        return indices
+
+    def values_of(self, values: Iterable[Any]) -> np.ndarray:
+        return _representatives(self.indices_of(values), self.representative)
+
 
 @attr.s(frozen=True, init=True, eq=True)
 class SpaceDomain(DomainDefinition):
@@ -74,14 +167,33 @@ class SpaceDomain(DomainDefinition):
         return self.count
 
     def value_of(self, v) -> Optional[Any]:
+        i = self.index_of(v)
+        return None if i is None else self.representative(i)
+
+    def representative(self, i: int) -> Any:
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return self.a + i * (self.b - self.a) / self.count
+
+    def index_of(self, v) -> Optional[int]:
         if self.a <= v < self.b:
-            return (
-                math.floor((v - self.a) * self.count / (self.b - self.a))
-                * (self.b - self.a)
-                / self.count
-            )
+            i = _floor((v - self.a) * self.count / (self.b - self.a))
+            return min(i, self.count - 1)
         return None
 
+    def indices_of(self, values: Iterable[Any]) -> np.ndarray:
+        v = np.asarray(list(values), dtype=float)
+        with np.errstate(invalid="ignore"):
+            bins = _floors((v - self.a) * self.count / (self.b - self.a))
+            bins = np.minimum(bins, self.count - 1)
+        indices = np.full(len(v), -1, dtype=np.int64)
+        inside = (self.a <= v) & (v < self.b)
+        indices[inside] = bins[inside]
+        return indices
+
+    def values_of(self, values: Iterable[Any]) -> np.ndarray:
+        return _representatives(self.indices_of(values), self.representative)
+
 
 @attr.s(frozen=True, init=True, eq=True)
 class SetDomain(DomainDefinition):
@@ -93,6 +205,40 @@ class SetDomain(DomainDefinition):
     def value_of(self, v) -> Optional[Any]:
         return v if v in self.contents else None
 
+    @functools.cached_property
+    def _order(self) -> Tuple[Any, ...]:
+        """Contents in a stable order, defining their index"""
+        try:
+            return tuple(sorted(self.contents))
+        except TypeError:
+            return tuple(sorted(self.contents, key=repr))
+
+    @functools.cached_property
+    def _lookup(self) -> Dict[Any, int]:
+        return {v: i for i, v in enumerate(self._order)}
+
+    def representative(self, i: int) -> Any:
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return self._order[i]
+
+    def index_of(self, v) -> Optional[int]:
+        return self._lookup.get(v)
+
+    @functools.cached_property
+    def bins(self) -> Tuple[Any, ...]:
+        return self._order
+
+    def indices_of(self, values: Iterable[Any]) -> np.ndarray:
+        values = list(values)
+        lookup = self._lookup
+        return np.fromiter(
+            (lookup.get(v, -1) for v in values), dtype=np.int64, count=len(values)
+        )
+
+    def values_of(self, values: Iterable[Any]) -> np.ndarray:
+        return _objects(v if v in self.contents else None for v in values)
+
 
 # TODO Rename to AtomDomain
 @attr.s(frozen=True, init=True)
@@ -120,6 +266,28 @@ class Domain:
     def value(self, v):
         return self._definition.value_of(v)
 
+    def values(self, values: Iterable[Any], indices: bool = False) -> np.ndarray:
+        """Convert values to their representative, or their bin index, at once.
+
+        Out of domain values are converted to None, or to -1 for indices.
+        Indices are not available for domains without bins, e.g. identity.
+        """
+        if indices:
+            return self._definition.indices_of(values)
+        return self._definition.values_of(values)
+
+    def index(self, v) -> Optional[int]:
+        """Dense index of the value bin, in 0..len-1, None if out of domain"""
+        return self._definition.index_of(v)
+
+    def bins(self) -> Tuple[Any, ...]:
+        """Representative value of each bin, ordered by index"""
+        return self._definition.bins
+
+    def from_index(self, i: int) -> Any:
+        """Representative value of the bin with the specified index"""
+        return self._definition.representative(i)
+
     def __len__(self):
         return len(self._definition)
 
@@ -0,0 +1,102 @@
+"""
+Temporal horizon of conditions.
+
+The verdict of a condition at time t depends on the values of its atoms over a
+bounded range of times around t, unless it involves unbounded operators. The
+horizon of each atom identifies the samples which can still influence future
+verdicts, allowing traces to be trimmed during long runs.
+"""
+from __future__ import annotations
+
+from typing import Any, Dict, Iterable, Mapping, Tuple
+
+import attr
+from mtfl import AtomicPred
+from mtfl.ast import G, Next, WeakUntil
+
+from csi.situation.components import Node
+
+OO = float("inf")
+
+
+@attr.s(frozen=True, auto_attribs=True, slots=True)
+class Horizon:
+    """Range of time offsets, relative to a verdict, at which values are read"""
+
+    lower: float = 0.0
+    upper: float = 0.0
+
+    @property
+    def bounded(self) -> bool:
+        """Check whether the verdict depends on a finite range of values"""
+        return self.upper < OO
+
+    def shift(self, lower: float, upper: float) -> Horizon:
+        return Horizon(self.lower + lower, self.upper + upper)
+
+    def __or__(self, other: Horizon) -> Horizon:
+        return Horizon(min(self.lower, other.lower), max(self.upper, other.upper))
+
+
+def _offsets(phi: Any, dt: float) -> Horizon:
+    """Offsets introduced by the operator between a node and its children"""
+    if isinstance(phi, G):
+        lower, upper = phi.interval
+        # Unbounded intervals are evaluated from the current time
+        if upper == OO:
+            return Horizon(0.0, OO)
+        # Windows are evaluated at pivots, which take the values read up to a
+        # window width later
+        return Horizon(lower, 2 * upper - lower)
+    if isinstance(phi, Next):
+        return Horizon(dt, dt)
+    if isinstance(phi, WeakUntil):
+        return Horizon(0.0, OO)
+    return Horizon()
+
+
+def _collect(
+    phi: Any, offset: Horizon, dt: float, horizons: Dict[AtomicPred, Horizon]
+) -> None:
+    if isinstance(phi, AtomicPred):
+        current = horizons.get(phi)
+        horizons[phi] = offset if current is None else current | offset
+        return
+    children = getattr(phi, "children", ())
+    if children:
+        o = _offsets(phi, dt)
+        for c in children:
+            _collect(c, offset.shift(o.lower, o.upper), dt, horizons)
+
+
+def atom_horizons(phi: Node, dt: float = 1.0) -> Mapping[AtomicPred, Horizon]:
+    """Compute the offsets at which each atom of the condition is read"""
+    horizons: Dict[AtomicPred, Horizon] = {}
+    _collect(phi, Horizon(), dt, horizons)
+    return horizons
+
+
+def horizon(phi: Node, dt: float = 1.0) -> Horizon:
+    """Compute the offsets at which the condition reads the values of its atoms"""
+    horizons = list(atom_horizons(phi, dt).values())
+    if not horizons:
+        return Horizon()
+    result = horizons[0]
+    for h in horizons[1:]:
+        result |= h
+    return result
+
+
+def windows(
+    horizons: Mapping[AtomicPred, Horizon], time: Any, starts: Iterable[Any]
+) -> Dict[AtomicPred, Tuple[Any, Any]]:
+    """Range of times at which each atom is read by the verdict at the specified time.
+
+    Verdicts at time False are given at the earliest sample of the evaluated
+    signals or time 0, between the earliest of the atoms' start times and 0.
+    """
+    if time is False:
+        lower, upper = min([0, *starts]), 0
+    else:
+        lower = upper = time
+    return {a: (lower + h.lower, upper + h.upper) for a, h in horizons.items()}
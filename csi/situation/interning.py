@@ -0,0 +1,238 @@
+"""
+Interning of conditions, sharing a single instance between equal sub-formulas.
+
+Conditions built from aliases and components are distinct objects, even when
+structurally equal, and comparing or hashing them walks the whole formula.
+Interned nodes are unique, their children are interned as well, such that
+they can be identified in constant time. The hash, atoms and predicates of
+each interned node are computed once, from the ones of its children.
+
+Interned nodes are instances of a subclass of their node type, returning their
+cached hash and comparing by identity to the nodes interned by the same table.
+They remain equal to structurally equal nodes which are not interned.
+"""
+from __future__ import annotations
+
+import weakref
+
+from typing import TYPE_CHECKING, Any, Dict, FrozenSet, Hashable, Iterable, Tuple
+
+import attr
+from mtfl import AtomicPred
+from mtfl.ast import BinaryOpMTL, Eq, Lt, ModalOp, NaryOpMTL
+
+if TYPE_CHECKING:
+    from csi.situation.components import Node
+
+
+@attr.s(frozen=True, auto_attribs=True, slots=True)
+class NodeInfo:
+    """Interned node and its cached properties"""
+
+    node: Node
+    hash: int
+    atoms: FrozenSet[AtomicPred]
+    comparisons: FrozenSet[BinaryOpMTL]
+
+    @property
+    def predicates(self) -> FrozenSet[Node]:
+        """Boolean predicates of the node, its atoms and comparisons"""
+        return self.atoms | self.comparisons
+
+
+def _is_node(value: Any) -> bool:
+    return hasattr(value, "children")
+
+
+def _parameters(phi: Any) -> Tuple[Hashable, ...]:
+    """Properties of the node which are not children"""
+    if isinstance(phi, AtomicPred):
+        return (phi,)
+    if isinstance(phi, BinaryOpMTL):
+        return (phi.tolerance,)
+    if isinstance(phi, ModalOp):
+        return (phi.interval,)
+    return ()
+
+
+def _structural(cls: type) -> type:
+    """Node type of interned nodes, or of other nodes"""
+    return getattr(cls, "_structural", cls)
+
+
+def _interned_eq(self, other: Any) -> bool:
+    if self is other:
+        return True
+    if _structural(type(other)) is not type(self)._structural:
+        return NotImplemented
+    if getattr(other, "_scope", None) is self._scope:
+        return False
+    return all(getattr(self, f) == getattr(other, f) for f in self._fields)
+
+
+def _interned_hash(self) -> int:
+    return self._hash
+
+
+def _interned_evolve(self, **changes) -> Any:
+    fields = {f: getattr(self, f) for f in self._fields}
+    fields.update(changes)
+    return self._structural(**fields)
+
+
+def _interned_reduce(self) -> Tuple[Any, ...]:
+    return self._structural, tuple(getattr(self, f) for f in self._fields)
+
+
+_INTERNED_TYPES: Dict[type, type] = {}
+
+
+def _interned_type(cls: type) -> type:
+    """Subclass of the node type used for interned nodes"""
+    interned = _INTERNED_TYPES.get(cls)
+    if interned is None:
+        interned = _INTERNED_TYPES[cls] = type(
+            cls.__name__,
+            (cls,),
+            {
+                "__slots__": ("_hash", "_scope"),
+                "__qualname__": cls.__qualname__,
+                "__module__": cls.__module__,
+                "_structural": cls,
+                "_fields": tuple(f.name for f in attr.fields(cls)),
+                "__eq__": _interned_eq,
+                "__hash__": _interned_hash,
+                "__reduce__": _interned_reduce,
+                "evolve": _interned_evolve,
+            },
+        )
+    return interned
+
+
+def _rebuild(phi: Any, children: Tuple[Any, ...], scope: object) -> Any:
+    """Build the interned node with the interned children, leaves are preserved"""
+    if not children:
+        return phi
+    cls = _structural(type(phi))
+    fields = {f.name: getattr(phi, f.name) for f in attr.fields(cls)}
+    if isinstance(phi, NaryOpMTL):
+        fields["args"] = children
+    elif hasattr(phi, "arg"):
+        fields["arg"] = children[0]
+    else:
+        fields["arg1"], fields["arg2"] = children
+    node = _interned_type(cls)(**fields)
+    object.__setattr__(node, "_hash", cls.__hash__(node))
+    object.__setattr__(node, "_scope", scope)
+    return node
+
+
+class NodeTable:
+    """Table of interned nodes and their properties.
+
+    Interned nodes are kept alive by the table, use `clear` to release them.
+    Nodes resolved to an interned one are tracked until garbage collected.
+    """
+
+    def __init__(self):
+        self._nodes: Dict[Tuple[Hashable, ...], NodeInfo] = {}
+        self._interned: Dict[int, NodeInfo] = {}
+        self._resolved: Dict[int, Tuple[weakref.ref, NodeInfo]] = {}
+        self._scope = object()
+
+    def __len__(self) -> int:
+        return len(self._nodes)
+
+    def __contains__(self, phi: Any) -> bool:
+        info = self._interned.get(id(phi))
+        return info is not None and info.node is phi
+
+    def _reference(self, value: Any) -> Tuple[Hashable, ...]:
+        if _is_node(value):
+            return True, id(value)
+        return False, value
+
+    def _resolve(self, phi: Node, info: NodeInfo) -> None:
+        key = id(phi)
+
+        def release(reference):
+            entry = self._resolved.get(key)
+            if entry is not None and entry[0] is reference:
+                del self._resolved[key]
+
+        self._resolved[key] = (weakref.ref(phi, release), info)
+
+    def info(self, phi: Node) -> NodeInfo:
+        """Intern the node, returning its cached properties"""
+        info = self._interned.get(id(phi))
+        if info is not None and info.node is phi:
+            return info
+        resolved = self._resolved.get(id(phi))
+        if resolved is not None and resolved[0]() is phi:
+            return resolved[1]
+        children = tuple(self.info(c).node if _is_node(c) else c for c in phi.children)
+        key = (_structural(type(phi)), _parameters(phi)) + tuple(
+            map(self._reference, children)
+        )
+        info = self._nodes.get(key)
+        if info is None:
+            node = _rebuild(phi, children, self._scope)
+            infos = [self._interned[id(c)] for c in children if _is_node(c)]
+            atoms = frozenset().union(*(i.atoms for i in infos))
+            comparisons = frozenset().union(*(i.comparisons for i in infos))
+            if isinstance(node, AtomicPred):
+                atoms = frozenset({node})
+            if isinstance(node, BinaryOpMTL):
+                comparisons |= {node}
+            info = NodeInfo(node, hash(node), atoms, comparisons)
+            self._nodes[key] = info
+            self._interned[id(node)] = info
+        if info.node is not phi:
+            self._resolve(phi, info)
+        return info
+
+    def intern(self, phi: Node) -> Node:
+        """Retrieve the unique instance structurally equal to the node"""
+        return self.info(phi).node
+
+    def atoms(self, phi: Node) -> FrozenSet[AtomicPred]:
+        return self.info(phi).atoms
+
+    def predicates(self, phi: Node) -> FrozenSet[Node]:
+        return self.info(phi).predicates
+
+    def boolean_predicates(self, conditions: Iterable[Node]) -> FrozenSet[Node]:
+        """Extract the boolean predicates, atoms or comparisons, of the conditions.
+
+        Atoms used in comparisons are excluded, as are a = b comparisons
+        resulting from a <= b in the same condition.
+        """
+        terms = set()
+        comparisons = set()
+        for c in conditions:
+            info = self.info(c)
+            terms.update(info.atoms)
+            lower = {p.children for p in info.comparisons if isinstance(p, Lt)}
+            comparisons.update(
+                p
+                for p in info.comparisons
+                if not (isinstance(p, Eq) and p.children in lower)
+            )
+        for p in comparisons:
+            terms.difference_update(p.children)
+        return frozenset(terms | comparisons)
+
+    def clear(self) -> None:
+        self._nodes.clear()
+        self._interned.clear()
+        self._resolved.clear()
+        self._scope = object()
+
+
+# Table shared by monitors and aliases
+NODES = NodeTable()
+
+
+def intern(phi: Node) -> Node:
+    """Retrieve the unique instance structurally equal to the node"""
+    return NODES.intern(phi)
@@ -0,0 +1,521 @@
+"""
+Vectorised evaluation of temporal logic conditions over traces.
+
+Conditions are evaluated following the semantics of the mtfl pointwise
+evaluator: signals are piecewise-constant, and sampled at the union of their
+children's change points. Each operator is computed with NumPy over the whole
+signal, temporal operators rely on single backward passes or sliding windows,
+keeping the cost of each operator linear in the number of samples.
+
+Kernels are provided for the min/max connectives families (default, zadeh, and
+godel logics).
+"""
+from __future__ import annotations
+
+import collections
+import functools
+import numbers
+from functools import reduce
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    FrozenSet,
+    Iterable,
+    List,
+    Mapping,
+    Optional,
+    Tuple,
+)
+
+import attr
+import numpy as np
+from mtfl import ast
+from mtfl.connective import _ConnectivesDef
+
+OO = float("inf")
+
+
+# Connectives-specific operations, vectorised
+_NEGATION: Dict[str, Callable[[np.ndarray, np.ndarray], np.ndarray]] = {
+    "default": lambda v, out: np.negative(v, out=out),
+    "zadeh": lambda v, out: np.subtract(1.0, v, out=out),
+    "godel": lambda v, out: np.where(v > 0.0, 0.0, 1.0),
+}
+
+_IMPLICATION: Dict[str, Callable[[np.ndarray, np.ndarray, np.ndarray], np.ndarray]] = {
+    "default": lambda a, b, out: np.maximum(np.negative(a, out=out), b, out=out),
+    "zadeh": lambda a, b, out: np.maximum(np.subtract(1.0, a, out=out), b, out=out),
+    "godel": lambda a, b, out: np.where(a <= b, 1.0, b),
+}
+
+SUPPORTED_LOGICS = frozenset(_NEGATION)
+
+
+def supports(logic: _ConnectivesDef) -> bool:
+    """Check whether kernels are available for the specified logic"""
+    return logic.name in SUPPORTED_LOGICS
+
+
+@attr.s(frozen=True, auto_attribs=True, slots=True, eq=False)
+class Signal:
+    """Piecewise-constant signal sampled at increasing times, over [start, end)"""
+
+    times: np.ndarray
+    values: np.ndarray
+    start: float
+    end: float
+
+    @classmethod
+    def of(cls, times, values, start: float, end: float) -> Signal:
+        """Build a signal restricted to its [start, end) interval"""
+        times = np.asarray(times, dtype=float)
+        values = _as_values(values)
+        mask = (start <= times) & (times < end)
+        if not mask.all():
+            times, values = times[mask], values[mask]
+        return cls(times, values, start, end)
+
+    @classmethod
+    def constant(cls, value: Any) -> Signal:
+        return cls(np.zeros(1), _as_values([value]), -OO, OO)
+
+    def __len__(self) -> int:
+        return len(self.times)
+
+    def at(self, times: np.ndarray, default: Any) -> np.ndarray:
+        """Values of the signal at the specified times, or default before"""
+        idx = np.searchsorted(self.times, times, side="right") - 1
+        values = self.values[np.maximum(idx, 0)]
+        if (idx < 0).any():
+            values = values.copy()
+            values[idx < 0] = default
+        return values
+
+    def interp(self, t: float) -> Any:
+        """Value of the signal at time t, or its first value if t precedes it"""
+        idx = max(int(np.searchsorted(self.times, t, side="right")) - 1, 0)
+        return self.values[idx]
+
+    def shift(self, delta: float) -> Signal:
+        return Signal(
+            self.times + delta, self.values, self.start + delta, self.end + delta
+        )
+
+
+def _as_values(values) -> np.ndarray:
+    """Convert values to a float array if possible, an object array otherwise"""
+    if isinstance(values, np.ndarray) and values.dtype != object:
+        return values.astype(float, copy=False)
+    values = list(values)
+    if all(
+        isinstance(v, numbers.Real) and not isinstance(v, bool) for v in values
+    ) or all(isinstance(v, bool) for v in values):
+        return np.asarray(values, dtype=float)
+    array = np.empty(len(values), dtype=object)
+    array[:] = values
+    return array
+
+
+def _align(signals: List[Signal], default: Any) -> Tuple[np.ndarray, List[np.ndarray]]:
+    """Sample signals at the union of their times, default before their start"""
+    times = reduce(np.union1d, (s.times for s in signals))
+    return times, [s.at(times, default) for s in signals]
+
+
+def _with_point(
+    times: np.ndarray, values: List[np.ndarray], t: float
+) -> Tuple[np.ndarray, List[np.ndarray]]:
+    """Add a sample at time t, interpolated from the previous or first sample"""
+    if len(times) == 0:
+        return times, values
+    idx = int(np.searchsorted(times, t, side="left"))
+    if idx < len(times) and times[idx] == t:
+        return times, values
+    source = max(idx - 1, 0)
+    times = np.insert(times, idx, t)
+    return times, [np.insert(v, idx, v[source]) for v in values]
+
+
+def window_min(
+    times: np.ndarray,
+    values: np.ndarray,
+    width: float,
+    out: Optional[np.ndarray] = None,
+) -> np.ndarray:
+    """Minimum of the values over [t, t + width) for each sample time t.
+
+    Computed in a single backward pass over a monotone deque of candidates.
+    """
+    result = np.empty(len(values), dtype=float) if out is None else out
+    t_list, v_list = times.tolist(), values.tolist()
+    candidates: collections.deque = collections.deque()
+    for i in range(len(v_list) - 1, -1, -1):
+        v = v_list[i]
+        while candidates and v_list[candidates[-1]] >= v:
+            candidates.pop()
+        candidates.append(i)
+        limit = t_list[i] + width
+        while t_list[candidates[0]] >= limit:
+            candidates.popleft()
+        result[i] = v_list[candidates[0]]
+    return result
+
+
+def suffix_min(values: np.ndarray, out: Optional[np.ndarray] = None) -> np.ndarray:
+    """Minimum of the values over [t, oo) for each sample time t"""
+    if out is None:
+        out = np.empty(len(values), dtype=float)
+    np.minimum.accumulate(values[::-1], out=out[::-1])
+    return out
+
+
+def weak_until_recurrence(
+    left: np.ndarray,
+    right: np.ndarray,
+    initial: float,
+    out: Optional[np.ndarray] = None,
+) -> np.ndarray:
+    """Backward fixpoint u(i) = max(right(i), min(left(i), u(i + 1)))"""
+    result = np.empty(len(left), dtype=float) if out is None else out
+    u = initial
+    lefts, rights = left.tolist(), right.tolist()
+    for i in range(len(lefts) - 1, -1, -1):
+        u = max(rights[i], min(lefts[i], u))
+        result[i] = u
+    return result
+
+
+# Operators
+#
+# Operators compute the signal of a node from the signals of its children.
+# Output values are written in a buffer provided by the caller when possible.
+
+Buffer = Callable[[int], np.ndarray]
+
+
+@attr.s(frozen=True, auto_attribs=True, slots=True)
+class EvaluationContext:
+    """Parameters of an evaluation shared by all operators"""
+
+    logic: _ConnectivesDef
+    dt: float
+    start: float
+    end: float
+
+    @property
+    def true(self) -> float:
+        return self.logic.const_true
+
+    @property
+    def false(self) -> float:
+        return self.logic.const_false
+
+
+def _empty(n: int) -> np.ndarray:
+    return np.empty(n, dtype=float)
+
+
+def negation(s: Signal, ctx: EvaluationContext, buffer: Buffer = _empty) -> Signal:
+    values = _NEGATION[ctx.logic.name](s.values.astype(float), buffer(len(s)))
+    return Signal(s.times, values, s.start, s.end)
+
+
+def _nary(
+    signals: List[Signal], ctx: EvaluationContext, reducer, buffer: Buffer
+) -> Signal:
+    start = min(s.start for s in signals)
+    end = max(s.end for s in signals)
+    signals = [s for s in signals if len(s) > 0]
+    if not signals:
+        return Signal.of([], [], start, end)
+    times, values = _align(signals, ctx.true)
+    stacked = np.stack(values).astype(float)
+    result = reducer.reduce(stacked, axis=0, out=buffer(len(times)))
+    return Signal.of(times, result, start, end)
+
+
+def conjunction(
+    signals: List[Signal], ctx: EvaluationContext, buffer: Buffer = _empty
+) -> Signal:
+    return _nary(signals, ctx, np.minimum, buffer)
+
+
+def disjunction(
+    signals: List[Signal], ctx: EvaluationContext, buffer: Buffer = _empty
+) -> Signal:
+    return _nary(signals, ctx, np.maximum, buffer)
+
+
+def _scalar_lt(a, b, tolerance, ctx: EvaluationContext):
+    if a < b:
+        return ctx.true
+    elif b <= a - tolerance:
+        return ctx.false
+    c = (b - (a - tolerance)) / tolerance
+    return c * (ctx.true - ctx.false) + ctx.false
+
+
+def _scalar_eq(a, b, tolerance, ctx: EvaluationContext):
+    if a == b:
+        return ctx.true
+    elif tolerance != 0.0 and abs(a - b) < tolerance:
+        return (tolerance - abs(a - b)) / tolerance * (ctx.true - ctx.false) + ctx.false
+    return ctx.false
+
+
+def comparison(
+    op: str, s1: Signal, s2: Signal, tolerance: float, ctx: EvaluationContext
+) -> Signal:
+    start, end = min(s1.start, s2.start), max(s1.end, s2.end)
+    times, (a, b) = _align([s1, s2], ctx.false)
+    scalar = _scalar_lt if op == "<" else _scalar_eq
+    if a.dtype == object or b.dtype == object or tolerance != 0.0:
+        with np.errstate(all="ignore"):
+            values = [scalar(x, y, tolerance, ctx) for x, y in zip(a, b)]
+    elif op == "<":
+        values = np.where(a < b, ctx.true, ctx.false)
+    else:
+        values = np.where(a == b, ctx.true, ctx.false)
+    return Signal.of(times, values, start, end)
+
+
+def implication(
+    s1: Signal, s2: Signal, ctx: EvaluationContext, buffer: Buffer = _empty
+) -> Signal:
+    times, (a, b) = _align([s1, s2], ctx.false)
+    times, (a, b) = _with_point(times, [a, b], ctx.start)
+    a, b = a.astype(float), b.astype(float)
+    values = _IMPLICATION[ctx.logic.name](a, b, buffer(len(times)))
+    return Signal.of(times, values, ctx.start, ctx.end)
+
+
+def weak_until(
+    s1: Signal, s2: Signal, ctx: EvaluationContext, buffer: Buffer = _empty
+) -> Signal:
+    times, (a, b) = _align([s1, s2], ctx.false)
+    times, (a, b) = _with_point(times, [a, b], ctx.start)
+    mask = (ctx.start <= times) & (times < ctx.end)
+    times, a, b = times[mask], a[mask].astype(float), b[mask].astype(float)
+    until = weak_until_recurrence(a, b, ctx.false, out=buffer(len(times)))
+    values = np.maximum(until, np.minimum(suffix_min(a), ctx.true), out=until)
+    return Signal(times, values, ctx.start, ctx.end)
+
+
+def always(
+    s: Signal,
+    lower: float,
+    upper: float,
+    ctx: EvaluationContext,
+    buffer: Buffer = _empty,
+) -> Signal:
+    if upper < lower:
+        return Signal.constant(ctx.true)
+    if upper == lower:
+        return s
+    end = s.end - upper if upper < s.end else s.end
+    values = s.values.astype(float)
+    if upper == OO:
+        return Signal.of(s.times, suffix_min(values, buffer(len(s))), s.start, end)
+    width = upper - lower
+    # Pivot samples where the window starts to include each change point
+    pivots = s.times - width + ctx.dt
+    valid = (s.start <= pivots) & (pivots < s.end)
+    times = np.concatenate([s.times, pivots[valid]])
+    values = np.concatenate([values, values[valid]])
+    priority = np.concatenate([np.zeros(len(s)), np.ones(int(valid.sum()))])
+    order = np.lexsort((priority, times))
+    times, values = times[order], values[order]
+    last = np.append(times[1:] != times[:-1], True)
+    times, values = times[last], values[last]
+    minimum = window_min(times, values, width, out=buffer(len(times)))
+    result = Signal.of(times, minimum, s.start, end)
+    return result.shift(-lower) if lower != 0 else result
+
+
+def next_(s: Signal, ctx: EvaluationContext) -> Signal:
+    return s.shift(-ctx.dt)
+
+
+# Operators schedule
+#
+# Conditions are flattened into a sequence of steps in post-order, equal
+# sub-formulas sharing a single step. Each step output is identified by the
+# step index.
+
+
+@attr.s(frozen=True, auto_attribs=True, slots=True)
+class Step:
+    """Application of an operator to the outputs of previous steps"""
+
+    operator: str
+    children: Tuple[int, ...] = ()
+    parameters: Tuple[Any, ...] = ()
+
+
+def _step(phi, children: Tuple[int, ...]) -> Step:
+    if isinstance(phi, ast.AtomicPred):
+        return Step("atom", (), (phi.id,))
+    if phi == ast.BOT:
+        return Step("false")
+    if isinstance(phi, ast.Neg):
+        return Step("neg", children)
+    if isinstance(phi, ast.And):
+        return Step("and", children)
+    if isinstance(phi, ast.Or):
+        return Step("or", children)
+    if isinstance(phi, ast.BinaryOpMTL):
+        return Step("compare", children, (phi.OP, phi.tolerance))
+    if isinstance(phi, ast.Implies):
+        return Step("implies", children)
+    if isinstance(phi, ast.WeakUntil):
+        return Step("weak_until", children)
+    if isinstance(phi, ast.G):
+        return Step("always", children, tuple(phi.interval))
+    if isinstance(phi, ast.Next):
+        return Step("next", children)
+    if hasattr(phi, "children"):
+        raise NotImplementedError(f"No kernel for {type(phi).__name__}")
+    return Step("constant", (), (phi,))
+
+
+def node_children(phi) -> Tuple[Any, ...]:
+    """Children of the node evaluated as sub-signals"""
+    if isinstance(phi, ast.AtomicPred):
+        return ()
+    return tuple(getattr(phi, "children", ()))
+
+
+def schedule(conditions: Iterable[Any]) -> Tuple[Tuple[Step, ...], Tuple[int, ...]]:
+    """Flatten the conditions into steps, returns the steps and output of each"""
+    steps: List[Step] = []
+    index: Dict[Any, int] = {}
+    outputs: List[int] = []
+    for phi in conditions:
+        stack = [(phi, False)]
+        while stack:
+            n, expanded = stack.pop()
+            if n in index:
+                continue
+            children = node_children(n)
+            if expanded or not children:
+                index[n] = len(steps)
+                steps.append(_step(n, tuple(index[c] for c in children)))
+            else:
+                stack.append((n, True))
+                stack.extend((c, False) for c in reversed(children))
+        outputs.append(index[phi])
+    return tuple(steps), tuple(outputs)
+
+
+def dependencies(steps: Tuple[Step, ...], output: int) -> FrozenSet[int]:
+    """Indices of the steps required to compute the output"""
+    required = set()
+    pending = [output]
+    while pending:
+        i = pending.pop()
+        if i not in required:
+            required.add(i)
+            pending.extend(steps[i].children)
+    return frozenset(required)
+
+
+def apply(
+    step: Step,
+    children: List[Signal],
+    inputs: Mapping[Any, Signal],
+    ctx: EvaluationContext,
+    buffer: Buffer = _empty,
+) -> Signal:
+    """Compute the output of the step"""
+    operator = step.operator
+    if operator == "atom":
+        signal = inputs.get(step.parameters[0])
+        return Signal.of([], [], ctx.start, ctx.end) if signal is None else signal
+    if operator == "false":
+        return Signal.constant(ctx.false)
+    if operator == "constant":
+        return Signal.constant(step.parameters[0])
+    if operator == "neg":
+        return negation(children[0], ctx, buffer)
+    if operator == "and":
+        return conjunction(children, ctx, buffer)
+    if operator == "or":
+        return disjunction(children, ctx, buffer)
+    if operator == "compare":
+        op, tolerance = step.parameters
+        return comparison(op, children[0], children[1], tolerance, ctx)
+    if operator == "implies":
+        return implication(children[0], children[1], ctx, buffer)
+    if operator == "weak_until":
+        return weak_until(children[0], children[1], ctx, buffer)
+    if operator == "always":
+        lower, upper = step.parameters
+        return always(children[0], lower, upper, ctx, buffer)
+    if operator == "next":
+        return next_(children[0], ctx)
+    raise NotImplementedError(f"Unknown operator {operator}")
+
+
+def run(
+    steps: Tuple[Step, ...],
+    required: Iterable[int],
+    inputs: Mapping[Any, Signal],
+    ctx: EvaluationContext,
+    buffers: Optional[Callable[[int, int], np.ndarray]] = None,
+) -> Dict[int, Signal]:
+    """Compute the outputs of the required steps, in schedule order"""
+    results: Dict[int, Signal] = {}
+    for i in sorted(required):
+        step = steps[i]
+        buffer = _empty if buffers is None else functools.partial(buffers, i)
+        children = [results[c] for c in step.children]
+        results[i] = apply(step, children, inputs, ctx, buffer)
+    return results
+
+
+# Conditions evaluation
+
+
+def atom_signals(
+    signals: Mapping[Any, Iterable[Tuple[float, Any]]],
+) -> Tuple[Dict[Any, Signal], float]:
+    """Convert atoms' samples into signals, starting at the earliest sample"""
+    samples = {k: list(v) for k, v in signals.items()}
+    start = min(t for v in samples.values() for t, _ in v)
+    return {
+        k: Signal.of([t for t, _ in v], [x for _, x in v], start, OO)
+        for k, v in samples.items()
+    }, start
+
+
+def extract(result: Signal, start: float, time: Any) -> Any:
+    """Extract the value at the specified time, or the whole signal if None"""
+    if time is None:
+        return [
+            (t, v)
+            for t, v in zip(result.times.tolist(), result.values.tolist())
+            if t >= start
+        ]
+    if time is False:
+        time = start
+    v = result.interp(time)
+    return v.item() if isinstance(v, np.generic) else v
+
+
+def evaluate(
+    phi,
+    signals: Mapping[Any, Iterable[Tuple[float, Any]]],
+    *,
+    dt: float = 0.1,
+    time: Any = False,
+    logic: _ConnectivesDef,
+) -> Any:
+    """Evaluate the quantitative value of the condition over the signals"""
+    if not supports(logic):
+        raise ValueError(f"No kernels available for logic '{logic.name}'")
+    inputs, start = atom_signals(signals)
+    steps, (output,) = schedule([phi])
+    ctx = EvaluationContext(logic, dt, start, OO)
+    results = run(steps, range(len(steps)), inputs, ctx)
+    return extract(results[output], start, time)
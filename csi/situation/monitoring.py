@@ -3,16 +3,18 @@ Collection of events occurring in the system and monitoring of situation occurre
 
 """
 from __future__ import annotations
+import heapq
 import itertools
+import os
 from typing import (
     FrozenSet,
+    Iterator,
     Set,
     Optional,
     Any,
     Mapping,
     Iterable,
     MutableMapping,
-    Dict,
     List,
     Tuple,
     Callable,
@@ -21,11 +23,47 @@ from typing import (
 import attr
 import funcy
 from mtfl import AtomicPred
-from mtfl.ast import BinaryOpMTL
 from mtfl.connective import _ConnectivesDef, default
-from traces import TimeSeries
 
 from csi.situation.components import Node, _Atom, PathType
+from csi.situation.horizon import Horizon, atom_horizons, windows
+from csi.situation.interning import NODES
+from csi.situation.plan import EvaluationPlan
+from csi.situation.reduction import Decimation
+from csi.situation.simplification import is_aligned, simplify
+from csi.situation.storage import SignalStore, DEFAULT_CHUNK_SIZE
+
+
+def _intern_all(conditions: Iterable[Node]) -> FrozenSet[Node]:
+    return frozenset(NODES.intern(c) for c in conditions)
+
+
+def _window(
+    samples: Iterable[Tuple[Any, Any]], lower: Any, upper: Any
+) -> Iterator[Tuple[Any, Any]]:
+    """First sample, and samples defining the signal values between the bounds.
+
+    The samples immediately before and after the bounds are kept, as the extent
+    of the signal affects the evaluation of temporal operators.
+    """
+    samples = iter(samples)
+    first = next(samples, None)
+    if first is None:
+        return
+    yield first
+    previous = None
+    for t, v in samples:
+        if t <= lower:
+            previous = t, v
+            continue
+        if previous is not None:
+            yield previous
+            previous = None
+        yield t, v
+        if t > upper:
+            return
+    if previous is not None:
+        yield previous
 
 
 @attr.s(
@@ -40,7 +78,7 @@ from csi.situation.components import Node, _Atom, PathType
 class Monitor:
     """Ensemble of temporal logic conditions"""
 
-    conditions: FrozenSet[Node] = attr.ib(factory=frozenset)
+    conditions: FrozenSet[Node] = attr.ib(factory=frozenset, converter=_intern_all)
 
     def __iadd__(self, other: Node) -> Monitor:
         return Monitor(self.conditions | {other})
@@ -54,38 +92,45 @@ class Monitor:
     def atoms(self, condition=None) -> Set[_Atom]:
         """Extract the atoms used in the monitor or the specified condition"""
         reference = self.conditions if condition is None else {condition}
-        return {
-            a
-            for c in reference
-            for a in c.walk()
-            if isinstance(a, _Atom) or isinstance(a, AtomicPred)
-        }
+        return {a for c in reference for a in NODES.atoms(c)}
 
     def extract_boolean_predicates(self, conditions=None) -> Set[Node]:
         """Extract the boolean predicates used in the monitor or the specified conditions."""
-        terms: Set[AtomicPred] = set()
-        comparisons: Set[BinaryOpMTL] = set()
         conditions = self.conditions if conditions is None else conditions
-        # Extract all candidates
-        for s in conditions:
-            local_comparisons = set()
-            for p in s.condition.walk():
-                if isinstance(p, AtomicPred):
-                    terms.add(p)
-                if isinstance(p, BinaryOpMTL):
-                    local_comparisons.add(p)
-            # Remove a = b cases resulting from a <= b in condition s
-            for p in list(local_comparisons):
-                if any(
-                    c.children == p.children and p.OP == "=" and c.OP == "<"
-                    for c in local_comparisons
-                ):
-                    local_comparisons.remove(p)
-            comparisons.update(local_comparisons)
-        # Remove values used in comparisons
-        for p in comparisons:
-            terms = terms.difference(p.children)
-        return set(itertools.chain(terms, comparisons))
+        return set(
+            NODES.boolean_predicates(getattr(s, "condition", s) for s in conditions)
+        )
+
+    def horizon(self, condition=None, dt=1.0) -> Mapping[AtomicPred, Horizon]:
+        """Compute the horizon of the atoms used in the monitor or the specified condition"""
+        reference = self.conditions if condition is None else {condition}
+        horizons: MutableMapping[AtomicPred, Horizon] = {}
+        for c in reference:
+            # Unaligned simplifications retain the atoms of all verdicts
+            simplification = simplify(c, aligned=False)
+            for a, h in atom_horizons(simplification.condition, dt).items():
+                horizons[a] = h | horizons[a] if a in horizons else h
+        return horizons
+
+    def trim(self, trace: Trace, since: Any, dt=1.0) -> int:
+        """Discard trace values which cannot influence verdicts from the specified time.
+
+        Verdicts are preserved from the specified time onwards, verdicts at
+        earlier times are lost. Atoms read by unbounded operators are kept, as
+        any of their values may influence verdicts. Return the number of
+        discarded values.
+        """
+        return sum(
+            trace.discard(a, since + h.lower)
+            for a, h in self.horizon(dt=dt).items()
+            if a in trace.values and h.bounded
+        )
+
+    def compile(
+        self, logic: _ConnectivesDef = default, dt=1.0, quantitative=False
+    ) -> EvaluationPlan:
+        """Compile the monitor conditions into a reusable evaluation plan."""
+        return EvaluationPlan(self.conditions, logic, dt, quantitative)
 
     def evaluate(
         self,
@@ -95,22 +140,51 @@ class Monitor:
         dt=1.0,
         time: Any = False,
         quantitative=False,
-        logic: _ConnectivesDef = default
+        logic: _ConnectivesDef = default,
+        engine: str = "mtfl",
     ) -> Mapping[Node, Optional[bool]]:
-        """Evaluate the truth values of the monitor conditions on the specified trace."""
+        """Evaluate the truth values of the monitor conditions on the specified trace.
+
+        Conditions are simplified prior to their evaluation, the trace is not
+        accessed for conditions simplified to a constant. Conditions are
+        evaluated with the mtfl evaluator by default, or with vectorised
+        kernels if the "numpy" engine is selected.
+
+        Single verdicts only load the samples of each atom within its horizon,
+        reading spilled signals in chunks. Verdicts at all times (time None),
+        and atoms read by unbounded operators, load their whole signal.
+        """
+        if engine not in {"mtfl", "numpy"}:
+            raise ValueError(f"Unknown evaluation engine '{engine}'")
         evaluated_conditions: Iterable[Node] = (
             self.conditions if condition is None else {condition}
         )
+        if engine == "numpy":
+            plan = EvaluationPlan(evaluated_conditions, logic, dt, quantitative)
+            results = plan.evaluate(trace, time=time)
+            return results if condition is None else funcy.first(results.values())
 
         results: MutableMapping[Node, Optional[bool]] = dict()
         for phi in evaluated_conditions:
-            signals = {
-                k.id: v for k, v in trace.project(self.atoms(phi), logic).items()
-            }
-            # FIXME A default value is required by mtl even if no atoms required (TOP/BOT)
+            atoms = self.atoms(phi)
+            # Single verdicts only read the atoms over their horizon
+            read = None
+            if time is not None:
+                read = windows(self.horizon(phi, dt=dt), time, trace.start(atoms))
+            signals = {k.id: v for k, v in trace.project(atoms, logic, read).items()}
+            simplification = simplify(
+                phi, aligned=is_aligned(signals.values()), logic=logic
+            )
+            if simplification.is_constant:
+                results[phi] = simplification.verdict(
+                    logic, time=time, quantitative=quantitative
+                )
+                continue
+            psi = simplification.condition
+            # Conditions are evaluated from the earliest sample, or time 0
             signals[None] = [(0, logic.const_false)]
-            if all(a.id in signals for a in self.atoms(phi)):
-                r = phi(signals, dt=dt, time=time, logic=logic)
+            if all(a.id in signals for a in self.atoms(psi)):
+                r = psi(signals, dt=dt, time=time, logic=logic)
                 if not quantitative:
                     if time is None:
                         r = funcy.walk_values(lambda v: v >= logic.const_true, r)
@@ -123,25 +197,85 @@ class Monitor:
 
 
 class Trace:
-    """Trace of situation components' value over time"""
+    """Trace of situation components' value over time
+
+    Signals are held in memory unless a memory limit, in bytes, is specified.
+    Signals are then spilled to the specified file, or a temporary one, once
+    the limit is exceeded. Redundant samples are dropped on recording if a
+    reducer is specified. Recorded paths are resolved to their atom if an
+    index of atoms is specified.
+    """
 
-    values: Dict[_Atom, TimeSeries]
+    values: SignalStore
+    reducer: Optional[Decimation]
+    index: Optional[Mapping[PathType, _Atom]]
+
+    def __init__(
+        self,
+        *,
+        memory_limit: Optional[int] = None,
+        spill_path: Optional[os.PathLike] = None,
+        reducer: Optional[Decimation] = None,
+        index: Optional[Mapping[PathType, _Atom]] = None,
+    ):
+        self.values = SignalStore(memory_limit, spill_path)
+        self.reducer = reducer
+        self.index = index
 
-    def __init__(self):
-        self.values = {}
+    def __setstate__(self, state):
+        # Upgrade traces serialised with plain dictionaries of signals
+        values = state.get("values", {})
+        if not isinstance(values, SignalStore):
+            state["values"] = SignalStore()
+            state["values"].update(values)
+        state.setdefault("reducer", None)
+        state.setdefault("index", None)
+        self.__dict__.update(state)
 
     def atoms(self) -> Set[_Atom]:
         """Extract the atoms which values has been defined in the trace"""
         return set(self.values.keys())
 
+    def stream(
+        self, atom: _Atom, chunk_size: int = DEFAULT_CHUNK_SIZE
+    ) -> Iterable[Tuple[Any, Any]]:
+        """Iterate over the values of the atom, in chunks if stored on disk"""
+        return self.values.stream(atom, chunk_size)
+
+    def discard(self, atom: _Atom, before: Any) -> int:
+        """Remove the values of the atom superseded at the specified time"""
+        return self.values.discard(atom, before)
+
+    def iter_merge(
+        self, atoms: Iterable[_Atom], chunk_size: int = DEFAULT_CHUNK_SIZE
+    ) -> Iterable[Tuple[Any, List[Any]]]:
+        """Iterate over the combined values of the atoms as they change"""
+        return self.values.iter_merge(atoms, chunk_size)
+
+    def start(self, atoms: Iterable[_Atom]) -> List[Any]:
+        """Time of the first sample of each atom defined in the trace"""
+        return [next(iter(self.stream(a, 1)))[0] for a in atoms if a in self.values]
+
     def project(
-        self, atoms: Iterable[_Atom], logic=default
+        self,
+        atoms: Iterable[_Atom],
+        logic=default,
+        windows: Optional[Mapping[_Atom, Tuple[Any, Any]]] = None,
     ) -> Mapping[_Atom, List[Tuple[int, Any]]]:
-        """Reduce the trace to the specified atoms"""
+        """Reduce the trace to the specified atoms.
+
+        If a window is specified for an atom, only its first sample and the
+        samples defining its values within the window are kept, its samples are
+        not read beyond the window.
+        """
         results: Mapping[_Atom, List[Tuple[int, Any]]] = {}
+        windows = {} if windows is None else windows
         for a in set(atoms) & self.atoms():
             results[a] = []
-            for (t, v) in self.values[a].items():
+            samples = self.stream(a)
+            if a in windows:
+                samples = _window(samples, *windows[a])
+            for t, v in samples:
                 if isinstance(v, bool):
                     results[a].append((t, logic.const_true if v else logic.const_false))
                 else:
@@ -149,21 +283,51 @@ class Trace:
         return results
 
     @staticmethod
-    def _merge_values(values: List[Optional[TimeSeries]]):
-        return funcy.last(i for i in values if i is not None)
+    def _merge_samples(
+        current: Iterable[Tuple[Any, Any]], update: Iterable[Tuple[Any, Any]]
+    ) -> Iterator[Tuple[Any, Any]]:
+        """Merge the samples of two signals, the latter defined values prevailing.
+
+        Equivalent to a compacted `TimeSeries.merge` of the signals.
+        """
+        streams = [
+            ((t, 0, v) for t, v in current),
+            ((t, 1, v) for t, v in update),
+        ]
+        values: List[Any] = [None, None]
+        previous: Any = None
+        merged = heapq.merge(*streams, key=lambda s: (s[0], s[1]))
+        for t, changes in itertools.groupby(merged, key=lambda s: s[0]):
+            for _, i, v in changes:
+                values[i] = v
+            value = values[0] if values[1] is None else values[1]
+            if previous is None or value != previous[1]:
+                previous = t, value
+                yield previous
 
     def update(self, other: Trace) -> Trace:
-        """Update the values of the current trace with the other"""
-        for t, s in other.values.items():
-            c = self.values.get(t, TimeSeries())
-            self.values[t] = TimeSeries.merge([c, s], operation=self._merge_values)
+        """Update the values of the current trace with the other.
+
+        Signals are merged as streams, spilled signals are not loaded in memory.
+        """
+        for k in other.values:
+            samples = other.stream(k)
+            if k in self.values:
+                samples = self._merge_samples(self.stream(k), samples)
+            self.values.assign(k, samples)
         return self
 
     def __ior__(self, other: Trace) -> Trace:
         return self | other
 
     def __or__(self, other: Trace) -> Trace:
-        return Trace().update(self).update(other)
+        trace = Trace(
+            memory_limit=self.values.memory_limit,
+            spill_path=self.values.path,
+            reducer=self.reducer,
+            index=self.index,
+        )
+        return trace.update(self).update(other)
 
     @classmethod
     def _extract_atom_values(
@@ -190,18 +354,19 @@ class Trace:
             if t is None:
                 continue
             for path, value in self._extract_atom_values(e):
-                # FIXME Identify an atom with a matching path else... ignore value? or keep value (change typing)?
-                if path not in self.values:
-                    self.values[path] = TimeSeries()
-                self.values[path][t] = value
+                # Values without a matching atom are recorded by path
+                key = path if self.index is None else self.index.get(path, path)
+                self._add(key, t, value)
 
     def __setitem__(self, key: _Atom, value: Tuple[float, Any]):
         t, v = value
         k = key
-        if k not in self.values:
-            self.values[k] = TimeSeries()
         # FIXME Events occuring at the same time
         #        e = self.values[k]
         #        while t in e._d:
         #            t += 0.0001
-        self.values[k][t] = v
+        self._add(k, t, v)
+
+    def _add(self, key: Any, t: Any, v: Any) -> None:
+        if self.reducer is None or self.reducer.accept(key, t, v):
+            self.values.add(key, t, v)
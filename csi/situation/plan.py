@@ -0,0 +1,162 @@
+"""
+Evaluation plans compiling monitor conditions into reusable operator schedules.
+
+A plan flattens a set of conditions into a single schedule of vectorised
+operators, shared sub-formulas being evaluated once. Compiling a plan once and
+evaluating it on many traces avoids walking the conditions for every trace.
+Plans can be pickled to be shared with worker processes.
+"""
+from __future__ import annotations
+
+from typing import Any, Dict, FrozenSet, Iterable, List, Mapping, Optional, Tuple
+
+import funcy
+import numpy as np
+from mtfl import AtomicPred
+from mtfl import connective
+from mtfl.connective import _ConnectivesDef
+
+from csi.situation import kernels
+from csi.situation.components import Node
+from csi.situation.horizon import Horizon, atom_horizons, windows
+from csi.situation.simplification import Simplification, is_aligned, simplify
+
+
+class EvaluationPlan:
+    """Conditions compiled into a schedule of vectorised operators.
+
+    Output buffers are allocated on first use and reused across evaluations,
+    a plan should thus not be shared between threads.
+    """
+
+    conditions: Tuple[Node, ...]
+    atoms: Tuple[AtomicPred, ...]
+    steps: Tuple[kernels.Step, ...]
+    simplifications: Tuple[Simplification, ...]
+
+    def __init__(
+        self,
+        conditions: Iterable[Node],
+        logic: _ConnectivesDef,
+        dt: float,
+        quantitative: bool = False,
+    ):
+        if not kernels.supports(logic):
+            raise ValueError(f"No kernels available for logic '{logic.name}'")
+        self.conditions = tuple(conditions)
+        self.logic = logic
+        self.dt = dt
+        self.quantitative = quantitative
+        self.simplifications = tuple(simplify(c, logic=logic) for c in self.conditions)
+        # Conditions over atoms defined after time 0 only support some rewrites
+        self._variants = self.simplifications + tuple(
+            simplify(c, aligned=False, logic=logic) for c in self.conditions
+        )
+        self.steps, self._outputs = kernels.schedule(
+            s.condition for s in self._variants
+        )
+        self._required: Tuple[FrozenSet[int], ...] = tuple(
+            kernels.dependencies(self.steps, o) for o in self._outputs
+        )
+        self._condition_atoms: Tuple[FrozenSet[AtomicPred], ...] = tuple(
+            frozenset(a for a in s.condition.walk() if isinstance(a, AtomicPred))
+            for s in self._variants
+        )
+        self.atoms = tuple(
+            sorted(frozenset().union(*self._condition_atoms), key=lambda a: a.id)
+        )
+        # Offsets at which verdicts read each atom, over all variants
+        self._horizons: Dict[AtomicPred, Horizon] = {}
+        for s in self._variants[len(self.conditions) :]:
+            for a, h in atom_horizons(s.condition, dt).items():
+                self._horizons[a] = h | self._horizons[a] if a in self._horizons else h
+        self._buffers: Dict[int, np.ndarray] = {}
+
+    def __len__(self) -> int:
+        return len(self.steps)
+
+    def __getstate__(self):
+        # Connectives are identified by name, their definition is not picklable
+        state = self.__dict__.copy()
+        state["logic"] = self.logic.name
+        state["_buffers"] = {}
+        return state
+
+    def __setstate__(self, state):
+        state["logic"] = getattr(connective, state["logic"])
+        self.__dict__.update(state)
+
+    def _buffer(self, step: int, size: int) -> np.ndarray:
+        """Output buffer of the step, reallocated only if too small"""
+        buffer = self._buffers.get(step)
+        if buffer is None or len(buffer) < size:
+            capacity = size if buffer is None else max(size, 2 * len(buffer))
+            buffer = self._buffers[step] = np.empty(capacity, dtype=float)
+        return buffer[:size]
+
+    def _verdict(self, value: Any, time: Any) -> Any:
+        if self.quantitative:
+            return value
+        if time is None:
+            return funcy.walk_values(lambda v: v >= self.logic.const_true, value)
+        return value >= self.logic.const_true
+
+    @property
+    def removed(self) -> int:
+        """Number of nodes removed from the conditions by their simplification"""
+        return sum(s.removed for s in self.simplifications)
+
+    def evaluate(self, trace, *, time: Any = False) -> Mapping[Node, Optional[Any]]:
+        """Evaluate all conditions on the trace, None if atoms are missing.
+
+        Single verdicts only read the atoms' samples within their horizon,
+        verdicts at all times (time None) read the whole trace.
+        """
+        read = None
+        if time is not None:
+            read = windows(self._horizons, time, trace.start(self.atoms))
+        samples: Dict[Any, List[Tuple[Any, Any]]] = {
+            a.id: v for a, v in trace.project(self.atoms, self.logic, read).items()
+        }
+        # A default signal is defined by the monitor even if no atoms required
+        samples[None] = [(0, self.logic.const_false)]
+        signals = {
+            k: kernels.Signal.of(
+                [t for t, _ in v], [x for _, x in v], -kernels.OO, kernels.OO
+            )
+            for k, v in samples.items()
+        }
+        results: Dict[Node, Optional[Any]] = {}
+        # Conditions are evaluated from the earliest sample of their atoms
+        groups: Dict[float, List[int]] = {}
+        count = len(self.conditions)
+        for i, phi in enumerate(self.conditions):
+            # Unaligned variants retain all the atoms of the condition
+            unaligned = self._condition_atoms[i + count]
+            if not is_aligned(samples[a.id] for a in unaligned if a.id in samples):
+                i += count
+            simplification = self._variants[i]
+            if simplification.is_constant:
+                results[phi] = simplification.verdict(
+                    self.logic, time=time, quantitative=self.quantitative
+                )
+                continue
+            atoms = self._condition_atoms[i]
+            if not all(a.id in samples for a in atoms):
+                results[phi] = None
+                continue
+            start = min(samples[k][0][0] for k in {a.id for a in atoms} | {None})
+            groups.setdefault(start, []).append(i)
+        for start, indices in groups.items():
+            inputs = {
+                k: kernels.Signal(s.times, s.values, start, kernels.OO)
+                for k, s in signals.items()
+            }
+            ctx = kernels.EvaluationContext(self.logic, self.dt, start, kernels.OO)
+            required = frozenset().union(*(self._required[i] for i in indices))
+            outputs = kernels.run(self.steps, required, inputs, ctx, self._buffer)
+            for i in indices:
+                value = kernels.extract(outputs[self._outputs[i]], start, time)
+                phi = self.conditions[i % count]
+                results[phi] = self._verdict(value, time)
+        return results
@@ -0,0 +1,113 @@
+"""
+Reduction of redundant samples at trace ingestion.
+
+Consecutive samples of a component carrying the same value, or values within
+the same bin of the component domain, do not alter the evaluation of
+situations over the trace. Dropping them on ingestion reduces the size of the
+trace and the cost of all later processing.
+"""
+from __future__ import annotations
+
+import enum
+import itertools
+from typing import Any, Dict, FrozenSet, Hashable, Iterable, Tuple
+
+import attr
+from mtfl.ast import BinaryOpMTL
+
+from csi.situation.components import Node, _Atom
+
+
+class DecimationMode(enum.Enum):
+    """Criterion identifying redundant samples"""
+
+    EXACT = 0
+    DOMAIN = 1
+
+
+@attr.s(auto_attribs=True, slots=True)
+class DecimationStats:
+    """Count of the samples received and dropped for a trace component"""
+
+    received: int = 0
+    dropped: int = 0
+
+    @property
+    def kept(self) -> int:
+        return self.received - self.dropped
+
+
+class Decimation:
+    """Ingestion-time filter dropping samples redundant with the previous one.
+
+    In EXACT mode, a sample is dropped if its value is equal to the value of
+    the latest recorded sample of the component. In DOMAIN mode, a sample is
+    dropped if its value falls in the same domain bin as the latest recorded
+    one. Recorded samples keep their raw value. Components without a domain,
+    and raw components (e.g. used in comparisons), are reduced in EXACT mode.
+
+    Only samples recorded after the latest one are dropped, out-of-order
+    samples are always recorded.
+    """
+
+    def __init__(
+        self,
+        mode: DecimationMode = DecimationMode.EXACT,
+        raw: Iterable[Hashable] = frozenset(),
+    ):
+        self.mode = mode
+        self.raw: FrozenSet[Hashable] = frozenset(raw)
+        self.stats: Dict[Hashable, DecimationStats] = {}
+        self._latest: Dict[Hashable, Tuple[Any, Any]] = {}
+
+    @classmethod
+    def for_conditions(
+        cls, conditions: Iterable[Node], mode: DecimationMode = DecimationMode.DOMAIN
+    ) -> Decimation:
+        """Prepare a reduction keeping raw values for atoms used in comparisons"""
+        comparisons = (
+            n for c in conditions for n in c.walk() if isinstance(n, BinaryOpMTL)
+        )
+        raw = {
+            a
+            for a in itertools.chain.from_iterable(c.children for c in comparisons)
+            if isinstance(a, _Atom)
+        }
+        return cls(mode, raw)
+
+    def _equivalent(self, key: Hashable, v: Any, w: Any) -> bool:
+        if type(v) is type(w) and v == w:
+            return True
+        domain = getattr(key, "domain", None)
+        if self.mode is DecimationMode.EXACT or domain is None or key in self.raw:
+            return False
+        try:
+            b = domain.value(v)
+        except TypeError:
+            return False
+        return b is not None and b == domain.value(w)
+
+    def accept(self, key: Hashable, t: Any, v: Any) -> bool:
+        """Check whether the sample should be recorded, updating statistics"""
+        stats = self.stats.get(key)
+        if stats is None:
+            stats = self.stats[key] = DecimationStats()
+        stats.received += 1
+        latest = self._latest.get(key)
+        if latest is not None:
+            latest_t, latest_v = latest
+            if t < latest_t:
+                return True
+            if t > latest_t and self._equivalent(key, v, latest_v):
+                stats.dropped += 1
+                return False
+        self._latest[key] = (t, v)
+        return True
+
+    @property
+    def received(self) -> int:
+        return sum(s.received for s in self.stats.values())
+
+    @property
+    def dropped(self) -> int:
+        return sum(s.dropped for s in self.stats.values())
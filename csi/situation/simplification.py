@@ -0,0 +1,159 @@
+"""
+Static simplification of conditions prior to their evaluation.
+
+Conditions assembled from aliases and reductions often contain constant or
+duplicated sub-terms, e.g. `reduce(operator.or_, ..., BOT)`. Simplifying them
+reduces the cost of their evaluation, and identifies conditions which value
+does not depend on the trace.
+
+Simplifications preserve the boolean value of conditions, and their
+quantitative value under min/max connectives, provided all atoms are defined
+from time 0, as constants are. Before its first sample an atom is undefined,
+and considered true by conjunctions and disjunctions, such that e.g. `a`,
+`a | BOT` and `a & (a | b)` differ when `a` starts late. Only the rewrites preserving
+values whatever the start of atoms, flattening nested connectives, removing
+duplicated terms and double negations, are applied to unaligned conditions.
+Double negations are removed as done when building negations with the `~`
+operator, only under connectives with an involutive negation. The Gödel
+negation of any non-zero value is 0, such that `~~a` differs from `a` for
+fractional values.
+"""
+from __future__ import annotations
+
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import attr
+from mtfl import BOT, TOP
+from mtfl.ast import And, G, Implies, Neg, Next, Or, WeakUntil
+from mtfl.connective import _ConnectivesDef, default
+
+from csi.situation.components import Node
+
+
+@attr.s(frozen=True, auto_attribs=True, slots=True)
+class Simplification:
+    """Simplified condition and the number of nodes removed from the original"""
+
+    condition: Node
+    removed: int
+
+    @property
+    def is_constant(self) -> bool:
+        return self.condition == TOP or self.condition == BOT
+
+    @property
+    def value(self) -> Optional[bool]:
+        """Truth value of the condition if constant, None otherwise"""
+        if self.condition == TOP:
+            return True
+        if self.condition == BOT:
+            return False
+        return None
+
+    def verdict(self, logic: _ConnectivesDef, *, time: Any, quantitative: bool) -> Any:
+        """Result of a constant condition, as provided by its evaluation"""
+        value: Any = self.value
+        if quantitative:
+            value = logic.const_true if value else logic.const_false
+        return [(0, value)] if time is None else value
+
+
+def size(phi: Node) -> int:
+    """Number of nodes in the condition, counting repeated sub-terms"""
+    return sum(1 for _ in phi.walk())
+
+
+def _nary(phi, operator, absorbing: Node, neutral: Node, dual, aligned: bool) -> Node:
+    args: List[Node] = []
+    for a in phi.args:
+        args.extend(a.args if isinstance(a, operator) else [a])
+    # Remove duplicates (idempotence), undefined over the same times
+    unique: List[Node] = []
+    for a in args:
+        if a not in unique:
+            unique.append(a)
+    if not aligned:
+        return unique[0] if len(unique) == 1 else phi.evolve(args=tuple(unique))
+    if any(a == absorbing for a in unique):
+        return absorbing
+    # Remove neutral elements
+    unique = [a for a in unique if a != neutral]
+    # Absorption, a & (a | b) = a and a | (a & b) = a
+    unique = [
+        a
+        for a in unique
+        if not (isinstance(a, dual) and any(b in a.args for b in unique if b != a))
+    ]
+    if not unique:
+        return neutral
+    if len(unique) == 1:
+        return unique[0]
+    return phi.evolve(args=tuple(unique))
+
+
+def _simplify(phi: Any, cache: Dict[Any, Any], aligned: bool, involutive: bool) -> Any:
+    if phi in cache:
+        return cache[phi]
+    result = phi
+    if isinstance(phi, Neg):
+        arg = _simplify(phi.arg, cache, aligned, involutive)
+        if involutive and isinstance(arg, Neg):
+            result = arg.arg
+        else:
+            result = phi.evolve(arg=arg)
+    elif isinstance(phi, And):
+        args = tuple(_simplify(a, cache, aligned, involutive) for a in phi.args)
+        result = _nary(phi.evolve(args=args), And, BOT, TOP, Or, aligned)
+    elif isinstance(phi, Or):
+        args = tuple(_simplify(a, cache, aligned, involutive) for a in phi.args)
+        result = _nary(phi.evolve(args=args), Or, TOP, BOT, And, aligned)
+    elif isinstance(phi, Implies):
+        a, b = (_simplify(c, cache, aligned, involutive) for c in phi.children)
+        result = phi.evolve(arg1=a, arg2=b)
+        if aligned and (a == BOT or b == TOP):
+            result = TOP
+        elif aligned and a == TOP:
+            result = b
+    elif isinstance(phi, WeakUntil):
+        a, b = (_simplify(c, cache, aligned, involutive) for c in phi.children)
+        result = phi.evolve(arg1=a, arg2=b)
+        if aligned and (a == TOP or b == TOP):
+            result = TOP
+        elif aligned and a == BOT:
+            result = b
+    elif isinstance(phi, G):
+        arg = _simplify(phi.arg, cache, aligned, involutive)
+        result = phi.evolve(arg=arg)
+        if aligned and (phi.interval.upper < phi.interval.lower or arg == TOP):
+            result = TOP
+        elif aligned and arg == BOT:
+            result = BOT
+    elif isinstance(phi, Next):
+        arg = _simplify(phi.arg, cache, aligned, involutive)
+        result = phi.evolve(arg=arg)
+        if aligned and (arg == TOP or arg == BOT):
+            result = arg
+    cache[phi] = result
+    return result
+
+
+def is_aligned(signals: Iterable[Sequence[Tuple[Any, Any]]]) -> bool:
+    """Whether all signals, as sequences of samples, are defined from time 0"""
+    return all(s[0][0] == 0 for s in signals if s)
+
+
+# Connectives whose negation is involutive, ~~a = a
+INVOLUTIVE_LOGICS = frozenset({"default", "zadeh"})
+
+
+def simplify(
+    phi: Node, aligned: bool = True, logic: _ConnectivesDef = default
+) -> Simplification:
+    """Simplify the condition folding constants and removing redundant terms.
+
+    Unless aligned, i.e. all atoms are defined from time 0, only rewrites
+    independent of the start of atoms are applied. Double negations are only
+    removed if the negation of the logic is involutive.
+    """
+    simplified = _simplify(phi, {}, aligned, logic.name in INVOLUTIVE_LOGICS)
+    return Simplification(simplified, size(phi) - size(simplified))
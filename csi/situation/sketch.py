@@ -0,0 +1,197 @@
+"""
+Approximate counts of distinct states for unbounded domains.
+
+Components without a finite domain, e.g. raw distances, cannot be covered
+exhaustively and the exact set of their values grows with each run. Sketches
+estimate the number of distinct values of components, or of tuples of
+components, with HyperLogLog counters of fixed size which can be merged across
+runs.
+"""
+from __future__ import annotations
+
+import hashlib
+import itertools
+import numbers
+from typing import Any, Dict, Iterable, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+
+from csi.situation.components import Context
+from csi.situation.coverage import _key_order
+from csi.situation.domain import Domain
+from csi.situation.monitoring import Trace
+from csi.situation.storage import DEFAULT_CHUNK_SIZE
+
+DEFAULT_PRECISION = 12
+
+_GOLDEN = np.uint64(0x9E3779B97F4A7C15)
+
+
+def _mix(x: np.ndarray) -> np.ndarray:
+    """Scramble 64 bits integers, following splitmix64"""
+    x = x + _GOLDEN
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+def _is_number(v: Any) -> bool:
+    return isinstance(v, numbers.Real) and not isinstance(v, (bool, np.bool_))
+
+
+def hash_values(values: Iterable[Any]) -> np.ndarray:
+    """Hash the values to 64 bits, consistently across processes.
+
+    Numbers are hashed from their float representation, such that equal ints
+    and floats share their hash, other values from their representation.
+    """
+    values = list(values)
+    hashes = np.empty(len(values), dtype=np.uint64)
+    numeric = np.fromiter(map(_is_number, values), dtype=bool, count=len(values))
+    if numeric.any():
+        floats = np.asarray([v for v, n in zip(values, numeric) if n], dtype=float)
+        # Adding 0.0 merges -0.0 with 0.0
+        hashes[numeric] = _mix((floats + 0.0).view(np.uint64))
+    for i in np.flatnonzero(~numeric):
+        digest = hashlib.blake2b(repr(values[i]).encode(), digest_size=8).digest()
+        hashes[i] = int.from_bytes(digest, "little")
+    return hashes
+
+
+def combine_hashes(columns: Sequence[np.ndarray]) -> np.ndarray:
+    """Hash tuples of values from the hashes of each element"""
+    combined = np.zeros(len(columns[0]), dtype=np.uint64)
+    for column in columns:
+        rotated = (combined << np.uint64(1)) | (combined >> np.uint64(63))
+        combined = _mix(rotated ^ column)
+    return combined
+
+
+class HyperLogLog:
+    """Estimate of the number of distinct hashes, using 2**precision registers"""
+
+    def __init__(self, precision: int = DEFAULT_PRECISION):
+        if not 4 <= precision <= 18:
+            raise ValueError("Precision must be in [4, 18]")
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+
+    def add(self, hashes: np.ndarray) -> None:
+        """Record the 64 bits hashes"""
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        p = np.uint64(self.precision)
+        index = (hashes >> (np.uint64(64) - p)).astype(np.int64)
+        remainder = hashes << p
+        # Count leading zeros of the remainder, from the bit length of each half
+        high = np.frexp((remainder >> np.uint64(32)).astype(float))[1]
+        low = np.frexp((remainder & np.uint64(0xFFFFFFFF)).astype(float))[1]
+        length = np.where(high > 0, high + 32, low)
+        rank = np.minimum(64 - length, 64 - self.precision) + 1
+        np.maximum.at(self.registers, index, rank.astype(np.uint8))
+
+    def count(self) -> float:
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.sum(np.ldexp(1.0, -self.registers.astype(int)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * m and zeros > 0:
+            # Linear counting for small cardinalities
+            estimate = m * np.log(m / zeros)
+        return float(estimate)
+
+    def merge(self, other: HyperLogLog) -> HyperLogLog:
+        if other.precision != self.precision:
+            raise ValueError("Sketches with different precision")
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    @property
+    def memory(self) -> int:
+        """Size of the registers, in bytes"""
+        return self.registers.nbytes
+
+
+Keys = Tuple[Any, ...]
+
+
+class DistinctStatesSketch:
+    """Approximate number of distinct values of components and component tuples.
+
+    Values of components with a domain are counted as the representative of
+    their bin, others as is.
+    """
+
+    def __init__(
+        self,
+        domain: Mapping[Any, Optional[Domain]],
+        tuples: Iterable[Iterable[Any]] = (),
+        precision: int = DEFAULT_PRECISION,
+    ):
+        self.domain = dict(domain)
+        self.keys: Keys = tuple(sorted(self.domain, key=_key_order))
+        self.precision = precision
+        self.sketches: Dict[Keys, HyperLogLog] = {}
+        for k in self.keys:
+            self.sketches[(k,)] = HyperLogLog(precision)
+        for t in tuples:
+            self.sketches[self._keys(t)] = HyperLogLog(precision)
+
+    def _keys(self, keys: Iterable[Any]) -> Keys:
+        keys = set(keys)
+        return tuple(k for k in self.keys if k in keys)
+
+    @classmethod
+    def from_context(
+        cls, context: Context, t: int = 1, precision: int = DEFAULT_PRECISION
+    ) -> DistinctStatesSketch:
+        """Sketch all atoms of the context, and all their t-tuples"""
+        atoms = context.atoms()
+        domain = {a: a.domain for a in atoms.values()}
+        tuples = itertools.combinations(domain, t) if t > 1 else ()
+        return cls(domain, tuples, precision)
+
+    def _add(self, columns: Sequence[Sequence[Any]]) -> None:
+        hashes = {}
+        for k, column in zip(self.keys, columns):
+            d = self.domain[k]
+            hashes[k] = hash_values(column if d is None else d.values(column))
+        for keys, sketch in self.sketches.items():
+            sketch.add(combine_hashes([hashes[k] for k in keys]))
+
+    def record(self, values: Mapping[Any, Any]) -> None:
+        """Record the specified state, missing values being None"""
+        self._add([[values.get(k)] for k in self.keys])
+
+    def register(self, trace: Trace) -> None:
+        """Record the consecutive states encountered in the trace"""
+        # Components without signal in the trace are undefined (None) in all states
+        signals = {}
+        for i, e in enumerate(self.keys):
+            if e in trace.values:
+                signals[i] = e
+            elif getattr(e, "id", e) in trace.values:
+                signals[i] = getattr(e, "id", e)
+        events = trace.iter_merge(list(signals.values()))
+        while chunk := list(itertools.islice(events, DEFAULT_CHUNK_SIZE)):
+            columns = [[None] * len(chunk)] * len(self.keys)
+            for j, i in enumerate(signals):
+                columns[i] = [v[j] for _, v in chunk]
+            self._add(columns)
+
+    def count(self, keys: Iterable[Any]) -> float:
+        """Estimated number of distinct values of the component tuple"""
+        return self.sketches[self._keys(keys)].count()
+
+    def report(self) -> Dict[Keys, float]:
+        return {keys: sketch.count() for keys, sketch in self.sketches.items()}
+
+    def merge(self, other: DistinctStatesSketch) -> DistinctStatesSketch:
+        if set(other.sketches) != set(self.sketches):
+            raise ValueError("Sketches over different components")
+        for keys, sketch in self.sketches.items():
+            sketch.merge(other.sketches[keys])
+        return self
+
+    @property
+    def memory(self) -> int:
+        return sum(s.memory for s in self.sketches.values())
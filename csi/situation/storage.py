@@ -0,0 +1,369 @@
+"""
+Storage of the signals recorded in a trace.
+
+Signals are kept in memory as long as the trace fits within its memory budget.
+Once the budget is exceeded, the largest signals are spilled to a local SQLite
+file and read back in chunks when required. This allows traces of long runs to
+be recorded and processed without holding all samples in memory.
+"""
+from __future__ import annotations
+
+import heapq
+import itertools
+import os
+import pickle
+import sqlite3
+import sys
+import tempfile
+import uuid
+from collections.abc import MutableMapping
+from pathlib import Path
+from typing import (
+    Any,
+    Dict,
+    FrozenSet,
+    Hashable,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+)
+
+from traces import TimeSeries
+
+# Approximate memory overhead of a sample in a TimeSeries (sorted dict entry)
+_SAMPLE_OVERHEAD = 112
+
+# Default number of samples read back from disk at once
+DEFAULT_CHUNK_SIZE = 4096
+
+
+def _sample_size(t: Any, v: Any) -> int:
+    """Estimate the memory footprint of a single sample"""
+    return sys.getsizeof(t) + sys.getsizeof(v) + _SAMPLE_OVERHEAD
+
+
+class SignalStore(MutableMapping):
+    """Signals of a trace, spilled to disk once the memory budget is exceeded.
+
+    The store behaves as a mapping from trace keys to TimeSeries. Accessing a
+    spilled signal through the mapping interface materialises it in memory,
+    use `stream` to iterate over its samples in bounded chunks instead.
+
+    Each store spills its signals to its own table, such that several stores
+    can share a file. Tables are dropped when their store is closed, and the
+    file removed once no table remains.
+    """
+
+    def __init__(
+        self,
+        memory_limit: Optional[int] = None,
+        path: Optional[os.PathLike] = None,
+    ):
+        if memory_limit is not None and memory_limit < 0:
+            raise ValueError("Memory limit must be positive")
+        self.memory_limit = memory_limit
+        self.path = None if path is None else Path(path)
+        self._signals: Dict[Hashable, TimeSeries] = {}
+        self._usage: Dict[Hashable, int] = {}
+        self._spilled: Dict[Hashable, int] = {}
+        self._next_identifier = 0
+        self._connection: Optional[sqlite3.Connection] = None
+        self._temporary: Optional[Path] = None
+        self._table = f"samples_{uuid.uuid4().hex}"
+        # Samples recorded to spilled signals, written to disk in batches
+        self._pending: List[Tuple[int, Any, bytes]] = []
+
+    # Mapping interface
+
+    def __getitem__(self, key: Hashable) -> TimeSeries:
+        if key in self._signals:
+            return self._signals[key]
+        if key in self._spilled:
+            return TimeSeries(list(self.stream(key)))
+        raise KeyError(key)
+
+    def __setitem__(self, key: Hashable, value: TimeSeries) -> None:
+        if key in self._spilled:
+            self._discard_spilled(key)
+        self._signals[key] = value
+        if self.memory_limit is not None:
+            self._usage[key] = sum(_sample_size(t, v) for t, v in value.items())
+            self._enforce_limit()
+
+    def __delitem__(self, key: Hashable) -> None:
+        if key in self._signals:
+            del self._signals[key]
+            self._usage.pop(key, None)
+        elif key in self._spilled:
+            self._discard_spilled(key)
+        else:
+            raise KeyError(key)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._signals or key in self._spilled
+
+    def __iter__(self) -> Iterator[Hashable]:
+        yield from list(self._signals)
+        yield from list(self._spilled)
+
+    def __len__(self) -> int:
+        return len(self._signals) + len(self._spilled)
+
+    # Sample-level access
+
+    def add(self, key: Hashable, t: Any, v: Any) -> None:
+        """Record the value of the signal at the specified time"""
+        if key in self._spilled:
+            self._pending.append((self._spilled[key], t, pickle.dumps(v)))
+            if len(self._pending) >= DEFAULT_CHUNK_SIZE:
+                self._flush()
+            return
+        if key not in self._signals:
+            self._signals[key] = TimeSeries()
+        self._signals[key][t] = v
+        if self.memory_limit is not None:
+            self._usage[key] = self._usage.get(key, 0) + _sample_size(t, v)
+            self._enforce_limit()
+
+    def stream(
+        self, key: Hashable, chunk_size: int = DEFAULT_CHUNK_SIZE
+    ) -> Iterator[Tuple[Any, Any]]:
+        """Iterate over the signal samples, reading at most chunk_size at once"""
+        if key in self._signals:
+            yield from self._signals[key].items()
+        elif key in self._spilled:
+            for t, v in self._rows(self._spilled[key], chunk_size):
+                yield t, pickle.loads(v)
+        else:
+            raise KeyError(key)
+
+    def assign(
+        self,
+        key: Hashable,
+        samples: Iterable[Tuple[Any, Any]],
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+    ) -> None:
+        """Replace the signal with the samples, recorded in chunks.
+
+        The samples are written to disk once they exceed the memory budget, and
+        may be read from the replaced signal.
+        """
+        samples = iter(samples)
+        signal: Optional[TimeSeries] = TimeSeries()
+        usage = 0
+        identifier = None
+        while chunk := list(itertools.islice(samples, chunk_size)):
+            if identifier is not None:
+                self._insert(identifier, chunk)
+                continue
+            for t, v in chunk:
+                signal[t] = v
+            if self.memory_limit is not None:
+                usage += sum(_sample_size(t, v) for t, v in chunk)
+                if (
+                    self.memory_usage - self._usage.get(key, 0) + usage
+                    > self.memory_limit
+                ):
+                    identifier = self._identifier()
+                    self._insert(identifier, signal.items())
+                    signal = None
+        if key in self:
+            del self[key]
+        if identifier is not None:
+            self._spilled[key] = identifier
+            return
+        self._signals[key] = signal
+        if self.memory_limit is not None:
+            self._usage[key] = usage
+            self._enforce_limit()
+
+    def discard(self, key: Hashable, before: Any) -> int:
+        """Remove the samples superseded at the specified time, return their count.
+
+        The latest sample at or before the specified time is kept, as it defines
+        the value of the signal from that time.
+        """
+        if key in self._spilled:
+            self._flush()
+            identifier = self._spilled[key]
+            cursor = self._database.execute(
+                f"DELETE FROM {self._table} WHERE signal = ? AND t < "
+                f"(SELECT MAX(t) FROM {self._table} WHERE signal = ? AND t <= ?)",
+                (identifier, identifier, before),
+            )
+            return cursor.rowcount
+        if key not in self._signals:
+            raise KeyError(key)
+        signal = self._signals[key]
+        count = max(signal._d.bisect_right(before) - 1, 0)
+        superseded = list(signal._d.islice(0, count))
+        for t in superseded:
+            if self.memory_limit is not None:
+                self._usage[key] -= _sample_size(t, signal[t])
+            signal.remove(t)
+        return len(superseded)
+
+    def iter_merge(
+        self, keys: Iterable[Hashable], chunk_size: int = DEFAULT_CHUNK_SIZE
+    ) -> Iterator[Tuple[Any, List[Any]]]:
+        """Iterate over the combined values of the signals, as their values change.
+
+        Equivalent to a compacted `TimeSeries.merge` of the signals, without
+        loading spilled signals in memory. Missing values are set to None.
+        """
+
+        def indexed(i, k):
+            for t, v in self.stream(k, chunk_size):
+                yield t, i, v
+
+        streams = [indexed(i, k) for i, k in enumerate(keys)]
+        state: List[Any] = [None] * len(streams)
+        previous: Optional[List[Any]] = None
+        current_time: Any = None
+        for t, i, v in heapq.merge(*streams, key=lambda s: (s[0], s[1])):
+            if current_time is not None and t != current_time and state != previous:
+                previous = list(state)
+                yield current_time, previous
+            state[i] = v
+            current_time = t
+        if current_time is not None and state != previous:
+            yield current_time, list(state)
+
+    # Memory management
+
+    @property
+    def memory_usage(self) -> int:
+        """Estimated memory used by the in-memory signals, in bytes"""
+        return sum(self._usage.values())
+
+    @property
+    def spilled(self) -> FrozenSet[Hashable]:
+        """Keys of the signals currently stored on disk"""
+        return frozenset(self._spilled)
+
+    def spill(self, key: Hashable) -> None:
+        """Move the signal to disk storage"""
+        if key in self._spilled:
+            return
+        signal = self._signals.pop(key)
+        self._usage.pop(key, None)
+        identifier = self._identifier()
+        self._insert(identifier, signal.items())
+        self._spilled[key] = identifier
+
+    def _enforce_limit(self) -> None:
+        if self.memory_limit is None:
+            return
+        while self._signals and self.memory_usage > self.memory_limit:
+            self.spill(max(self._usage, key=self._usage.__getitem__))
+
+    def _discard_spilled(self, key: Hashable) -> None:
+        self._flush()
+        identifier = self._spilled.pop(key)
+        self._database.execute(
+            f"DELETE FROM {self._table} WHERE signal = ?", (identifier,)
+        )
+
+    def _identifier(self) -> int:
+        self._next_identifier += 1
+        return self._next_identifier
+
+    def _insert(self, identifier: int, samples: Iterable[Tuple[Any, Any]]) -> None:
+        self._insert_rows(identifier, ((t, pickle.dumps(v)) for t, v in samples))
+
+    def _insert_rows(self, identifier: int, rows: Iterable[Tuple[Any, bytes]]) -> None:
+        """Record the encoded samples of the signal, with any pending sample"""
+        self._write(itertools.chain(self._pending, ((identifier, *r) for r in rows)))
+
+    def _flush(self) -> None:
+        if self._pending:
+            self._write(self._pending)
+
+    def _write(self, rows: Iterable[Tuple[int, Any, bytes]]) -> None:
+        """Write the encoded samples in a single transaction"""
+        database = self._database
+        database.execute("BEGIN")
+        try:
+            database.executemany(
+                f"INSERT OR REPLACE INTO {self._table} VALUES (?, ?, ?)", rows
+            )
+        except BaseException:
+            database.execute("ROLLBACK")
+            raise
+        database.execute("COMMIT")
+        self._pending = []
+
+    def _rows(self, identifier: int, chunk_size: int) -> Iterator[Tuple[Any, bytes]]:
+        """Iterate over the encoded samples of the signal, in chunks"""
+        self._flush()
+        cursor = self._database.execute(
+            f"SELECT t, v FROM {self._table} WHERE signal = ? ORDER BY t",
+            (identifier,),
+        )
+        while chunk := cursor.fetchmany(chunk_size):
+            yield from chunk
+
+    @property
+    def _database(self) -> sqlite3.Connection:
+        if self._connection is None:
+            path = self.path
+            if path is None:
+                handle, name = tempfile.mkstemp(prefix="csi-trace-", suffix=".db")
+                os.close(handle)
+                path = self._temporary = Path(name)
+            # Statements are committed at once, unless in an explicit transaction,
+            # such that stores sharing the file do not hold its lock
+            self._connection = sqlite3.connect(str(path), isolation_level=None)
+            self._connection.execute("PRAGMA synchronous = OFF")
+            self._connection.execute(
+                f"CREATE TABLE {self._table} "
+                "(signal INTEGER, t, v BLOB, PRIMARY KEY (signal, t)) WITHOUT ROWID"
+            )
+        return self._connection
+
+    def close(self) -> None:
+        """Release the disk storage, discarding spilled signals"""
+        if self._connection is not None:
+            self._connection.execute(f"DROP TABLE IF EXISTS {self._table}")
+            remaining = self._connection.execute(
+                "SELECT COUNT(*) FROM sqlite_master WHERE type = 'table'"
+            ).fetchone()[0]
+            self._connection.close()
+            self._connection = None
+            if remaining == 0 and self.path is not None:
+                self.path.unlink(missing_ok=True)
+        if self._temporary is not None:
+            self._temporary.unlink(missing_ok=True)
+            self._temporary = None
+        self._spilled.clear()
+        self._pending = []
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+
+    # Disk storage is not portable, spilled signals are serialised as their
+    # encoded samples, read in chunks, and restored to disk without decoding
+
+    def __getstate__(self):
+        return {
+            "memory_limit": self.memory_limit,
+            "signals": dict(self._signals),
+            "spilled": {
+                k: list(self._rows(i, DEFAULT_CHUNK_SIZE))
+                for k, i in self._spilled.items()
+            },
+        }
+
+    def __setstate__(self, state):
+        self.__init__(state["memory_limit"])
+        for k, v in state["signals"].items():
+            self[k] = v
+        for k, rows in state.get("spilled", {}).items():
+            identifier = self._identifier()
+            self._insert_rows(identifier, rows)
+            self._spilled[k] = identifier
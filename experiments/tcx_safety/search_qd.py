@@ -16,7 +16,13 @@ if __name__ == "__main__":
         shutil.rmtree(runs)
     #
     random.seed(42)
-    w = RunnerFitnessWrapper("./build/", runs, "zadeh", with_features=True)
+    w = RunnerFitnessWrapper(
+        "./build/",
+        runs,
+        "zadeh",
+        with_features=True,
+        coverage=runs / "coverage.pkl",
+    )
 
     H = len([h for h in hazards if h.uid not in SafecompControllerRunner.blacklist])
     U = len(
@@ -53,5 +59,6 @@ if __name__ == "__main__":
     print(f"Runtime: {time_end - time_start}s")
 
     print(algo.summary())
+    print(f"State coverage: {w.coverage.coverage} ({w.coverage.covered} states)")
     plots.default_plots_grid(logger)
     print("All results in %s" % logger.final_filename)
@@ -1,31 +1,25 @@
 import shutil
 import time
 from pathlib import Path
-from multiprocessing import Pool
 
 
+from csi import ExperimentScheduler
 from wrapper.fitness import RunnerFitnessWrapper
 import random
 
 
-def run(seed):
-    runs = Path("./runs/")
-    w = RunnerFitnessWrapper("./build/", runs, "zadeh", with_features=True)
-    random.seed(seed)
-    X = [random.random() for _ in range(5)]
-    w(X)
-    return seed
-
-
 if __name__ == "__main__":
     runs = Path("./runs/")
     if runs.exists():
         shutil.rmtree(runs)
     #
     random.seed(42)
+    w = RunnerFitnessWrapper("./build/", runs, "zadeh", with_features=True)
+    experiments = (
+        w.generate_experiment([random.random() for _ in range(5)]) for _ in range(2)
+    )
     time_start = time.time()
-    with Pool(processes=2) as pool:
-        for i in pool.imap_unordered(run, range(2)):
-            print(i)
+    for run in ExperimentScheduler(workers=2).run(experiments):
+        print(run.experiment.uuid, run.status, w.score_experiment(run.experiment))
     time_end = time.time()
     print(f"Runtime: {time_end - time_start}s")
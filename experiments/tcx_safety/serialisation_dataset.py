@@ -27,6 +27,7 @@ from csi.situation import Domain, Monitor, Trace
 from csi.situation.components import _Atom, Node
 
 from wrapper.fitness import RunnerFitnessWrapper
+from wrapper.monitor import P
 from wrapper.runner import SafecompControllerRunner
 from wrapper.utils import as_working_directory
 
@@ -37,9 +38,11 @@ predicates: set[Node] = Monitor().extract_boolean_predicates(conditions)
 
 def compute_domain():
     e: Dict[_Atom, Domain] = {}
+    index = P.atoms()
     for atom in Monitor(frozenset(c.condition for c in conditions)).atoms():
-        if atom.domain is not None:
-            e[atom] = atom.domain
+        declared = index.get(atom.path, atom)
+        if declared.domain is not None:
+            e[atom] = declared.domain
     return e
 
 
@@ -60,16 +63,15 @@ def collect_states(
     event_keys: list[_Atom] = sorted(atoms, key=lambda d: d.id)
     events: TimeSeries = TimeSeries.merge([trace.values[e] for e in event_keys])
     events.compact()
+    states = list(events.items())
+    # Values of each atom are converted to their domain at once
+    columns = []
+    for i, e in enumerate(event_keys):
+        values = [v[i] for _, v in states]
+        columns.append(domain[e].values(values) if e in domain else values)
     t: float
-    for t, v in events.items():
-        s = set()
-        for e, i in zip(event_keys, v):
-            if e in domain:
-                d = domain[e]
-                s.add((e.id, d.value(i)))
-            else:
-                s.add((e.id, i))
-        yield t, s
+    for j, (t, _) in enumerate(states):
+        yield t, {(e.id, c[j]) for e, c in zip(event_keys, columns)}
 
 
 def collect_predicates(trace: Trace):
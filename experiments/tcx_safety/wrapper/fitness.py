@@ -1,10 +1,17 @@
+import dataclasses
+import hashlib
 import json
+import pickle
+from datetime import datetime
 from pathlib import Path
-from typing import Tuple
+from typing import Any, Dict, Optional, Tuple
 
 import numpy
 
 from csi import Repository, RunStatus, Experiment
+from csi.experiment import ResultCache, configuration_digest
+from csi.situation import CoverageTracker
+from .monitor import P
 from .safety import hazards, unsafe_control_actions
 
 from .configuration import (
@@ -16,10 +23,32 @@ from .configuration import (
 from .runner import SafecompControllerRunner
 
 
+def build_digest(build: Path) -> Optional[str]:
+    """Digest of the contents of the build files, if it exists"""
+    if not build.exists():
+        return None
+    digest = hashlib.sha256()
+    for path in sorted(p for p in build.rglob("*") if p.is_file()):
+        digest.update(path.relative_to(build).as_posix().encode() + b"\0")
+        with path.open("rb") as build_file:
+            while chunk := build_file.read(1 << 20):
+                digest.update(chunk)
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
 # TODO Add typing to all primitives where appropriate
 class RunnerFitnessWrapper:
     def __init__(
-        self, build="../build/", runs="runs/", logic="default", with_features=True
+        self,
+        build="../build/",
+        runs="runs/",
+        logic="default",
+        with_features=True,
+        coverage=None,
+        cache=True,
+        cache_entries=None,
+        cache_age=None,
     ):
         self.build = Path(build).absolute()
         self.repository = Repository(Path(runs))
@@ -36,6 +65,18 @@ class RunnerFitnessWrapper:
         self.evaluation_logic = logic
         self.evaluation_quantitative = True
         self.retrieve_features = with_features
+        # Coverage of the encountered states, checkpointed after each run
+        self.coverage_checkpoint = None if coverage is None else Path(coverage)
+        self.coverage: Optional[CoverageTracker] = None
+        if self.coverage_checkpoint is not None:
+            if self.coverage_checkpoint.exists():
+                self.coverage = CoverageTracker.load(self.coverage_checkpoint)
+            else:
+                self.coverage = CoverageTracker.from_context(P)
+        # Safety reports of simulated configurations, shared through the repository
+        self.results: Optional[ResultCache] = None
+        if cache:
+            self.results = self.repository.results(cache_entries, cache_age)
 
     @staticmethod
     def score_domain():
@@ -44,14 +85,38 @@ class RunnerFitnessWrapper:
     def score_experiment(
         self, experiment: Experiment
     ) -> Tuple[Tuple[int], Tuple[int, int]]:
+        report = self.experiment_report(experiment)
+        if report is not None:
+            return self.score(report)
+
+    @staticmethod
+    def experiment_report(experiment: Experiment) -> Optional[Dict[str, Any]]:
+        """Safety report of the first complete run of the experiment"""
         for run in experiment.runs:
             if run.status == RunStatus.COMPLETE:
-                return self.score_report(run.work_path / "hazard-report.json")
+                with (run.work_path / "hazard-report.json").open() as report_file:
+                    return json.load(report_file)
+        return None
+
+    def track_coverage(self, experiment: Experiment) -> Optional[int]:
+        """Record the states of the experiment run, return the number of new states"""
+        if self.coverage is None:
+            return None
+        for run in experiment.runs:
+            if run.status == RunStatus.COMPLETE:
+                with (run.work_path / experiment.trace_output).open("rb") as trace_file:
+                    self.coverage.update(pickle.load(trace_file))
+                self.coverage.save(self.coverage_checkpoint)
+                return self.coverage.new_states
+        return None
 
     def score_report(self, report_path):
+        with Path(report_path).open() as report_file:
+            return self.score(json.load(report_file))
+
+    def score(self, report: Dict[str, Any]):
         run_score = 0
         conditions = ({0}, {0})
-        report = json.load(Path(report_path).open())
         for uid, occurs in report.items():
             # Constraint occurs domain to [0, 1]
             if occurs is None:
@@ -103,7 +168,7 @@ class RunnerFitnessWrapper:
         world.wp_exit.duration = val(4)
         return world
 
-    def __call__(self, X):
+    def generate_experiment(self, X) -> SafecompControllerRunner:
         world = self.generate_configuration(X)
         # Condition evaluation
         evaluation = MonitorConfiguration()
@@ -112,10 +177,41 @@ class RunnerFitnessWrapper:
         # Build configuration
         b = BuildConfiguration(self.build)
         # Prepare experiment
-        exp = SafecompControllerRunner(
+        return SafecompControllerRunner(
             self.repository.path,
             RunnerConfiguration(world, b, evaluation),
         )
+
+    @staticmethod
+    def configuration_key(configuration: RunnerConfiguration) -> str:
+        """Digest of the configuration elements which affect a run's results"""
+        # The generation timestamp does not affect the simulation
+        world = dataclasses.replace(configuration.world, timestamp=datetime.min)
+        # Builds rebuilt in place keep their path, identify them by their contents
+        build = configuration.build.path
+        return configuration_digest(
+            {
+                "world": world,
+                "build": {"path": build, "contents": build_digest(build)},
+                "ltl": configuration.ltl,
+            }
+        )
+
+    def __call__(self, X):
+        exp = self.generate_experiment(X)
+        # Reuse the report of a previous run of the same configuration
+        key = None
+        if self.results is not None:
+            key = self.configuration_key(exp.configuration)
+            report = self.results.get(key)
+            if report is not None:
+                return self.score(report)
         # Run experiment and compute score
         exp.run()
-        return self.score_experiment(exp)
+        self.track_coverage(exp)
+        report = self.experiment_report(exp)
+        if report is None:
+            return None
+        if key is not None:
+            self.results.put(key, report)
+        return self.score(report)
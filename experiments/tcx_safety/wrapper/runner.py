@@ -7,7 +7,7 @@ from typing import Set
 
 import docker
 
-from csi import ConfigurationManager, Experiment
+from csi import ConfigurationManager, Experiment, phase
 from csi.situation import Monitor, Trace
 from csi.twin import DataBase, from_table
 
@@ -66,30 +66,34 @@ class SafecompControllerRunner(Experiment):
             # Run twin container
             try:
                 client = docker.from_env()
-                logs = client.containers.run(
-                    self.image_name,
-                    auto_remove=True,
-                    volumes={
-                        str(configuration_dir.absolute()): {
-                            "bind": "/csi/configuration",
-                            "mode": "rw",
+                with phase("twin"):
+                    logs = client.containers.run(
+                        self.image_name,
+                        auto_remove=True,
+                        volumes={
+                            str(configuration_dir.absolute()): {
+                                "bind": "/csi/configuration",
+                                "mode": "rw",
+                            },
+                            str(database_dir.absolute()): {
+                                "bind": "/csi/databases",
+                                "mode": "rw",
+                            },
                         },
-                        str(database_dir.absolute()): {
-                            "bind": "/csi/databases",
-                            "mode": "rw",
-                        },
-                    },
-                    stdout=True,
-                    stderr=True,
-                )
+                        stdout=True,
+                        stderr=True,
+                    )
                 print(logs)
             finally:
-                self.collect_output(configuration_path, database_path)
+                with phase("collect"):
+                    self.collect_output(configuration_path, database_path)
         # Check for hazard occurrence
-        trace, conditions = self.process_output()
-        self.produce_safety_report(trace, conditions)
+        with phase("trace"):
+            trace, conditions = self.process_output()
+        with phase("monitor"):
+            self.produce_safety_report(trace, conditions)
         # Backup processed trace
-        with self.trace_output.open("wb") as trace_file:
+        with phase("backup"), self.trace_output.open("wb") as trace_file:
             pickle.dump(trace, trace_file)
 
     def collect_output(self, configuration_path, database_path):
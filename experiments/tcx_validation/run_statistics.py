@@ -11,6 +11,7 @@ import seaborn as sns
 import matplotlib.pyplot as mpl
 
 from csi import ConfigurationManager, Repository, Experiment, Run, RunStatus
+from csi.situation import TWayCoverage
 
 from wrapper.configuration import SceneConfiguration
 from wrapper.runner import SafetyDigitalTwinRunner
@@ -53,38 +54,32 @@ def plot_coverage(t: Repository):
     e: Experiment
     r: Run
     # Use Case coverage
-    uc_events_per_run = []
+    coverage_per_uc: Dict[str, TWayCoverage] = {}
     # Collect statistics across all runs
     for e, r in t.completed_runs:
         assert isinstance(e, SafetyDigitalTwinRunner)
-        with (r.work_path / e.use_cases_events).open("rb") as uc_events_file:
-            x = pickle.load(uc_events_file)
-            for use_case in x:
-                for (condition, events) in x[use_case]:
-                    uc_events_per_run.append((use_case, condition, events))
-
-    # Merge use case events
-    events_per_uc = {}
-    for use_case, condition, events in uc_events_per_run:
-        coverage_criterion = (use_case, tuple(condition))
-        if coverage_criterion not in events_per_uc:
-            events_per_uc[coverage_criterion] = events
-        else:
-            events_per_uc[coverage_criterion].merge(events)
-    coverage_per_uc = [
-        (use_case, str(condition), re.coverage)
-        for (use_case, condition), re in events_per_uc.items()
+        x = e.load_use_cases_coverage(r.work_path / e.use_cases_events)
+        for use_case, coverage in x.items():
+            if use_case not in coverage_per_uc:
+                coverage_per_uc[use_case] = coverage
+            else:
+                coverage_per_uc[use_case].merge(coverage)
+    criterion_coverage = [
+        (use_case, str(subset), coverage.coverage(subset))
+        for use_case, coverage in coverage_per_uc.items()
+        for subset in coverage.subsets
     ]
 
     # Display missing values per coverage criterion
-    for criterion, coverage in events_per_uc.items():
-        if coverage.coverage < 1.0:
-            print(criterion)
-            for missing_value in coverage.missing_values():
-                print(f"\t{missing_value}")
+    for use_case, coverage in coverage_per_uc.items():
+        for subset, (covered, total) in coverage.report().items():
+            if covered < total:
+                print((use_case, subset), f"{total - covered} missing")
+                for missing_value in coverage.missing_values(subset, limit=100):
+                    print(f"\t{missing_value}")
 
     k: DataFrame = DataFrame(
-        coverage_per_uc, columns=["use case", "criterion", "coverage"]
+        criterion_coverage, columns=["use case", "criterion", "coverage"]
     )
     sns.relplot(
         data=k,
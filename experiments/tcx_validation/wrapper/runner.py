@@ -6,10 +6,17 @@ import shutil
 import subprocess
 
 from pathlib import Path
-from typing import List, Iterable, Dict, Tuple
+from typing import List, Iterable, Dict, Mapping, Tuple
 
 from csi import ConfigurationManager, Experiment, SafetyCondition
-from csi.situation import Domain, EventCombinationsRegistry, Monitor, Trace
+from csi.situation import (
+    Domain,
+    EventCombinationsRegistry,
+    Monitor,
+    Trace,
+    TWayCoverage,
+    domain_values,
+)
 from csi.twin import DataBase, from_table
 
 from .monitor import SafetyControllerStatus, Notif, Act, Loc, RngDet, SafMod, Phase
@@ -181,27 +188,42 @@ class SafetyDigitalTwinRunner(Experiment):
 
         return trace
 
-    def compute_events_combinations(self, trace: Trace):
-        """Compute combinations of observed concurrent events"""
+    @staticmethod
+    def events_domain() -> Dict[str, Domain]:
+        """Domain of the events recorded in the combinations registry"""
         P = SafetyControllerStatus
         # TODO Declare domain with Term definition in monitor
         # TODO Build registry from monitor definition using terms' domain if available
-        registry = EventCombinationsRegistry()
-        registry.domain[P.notif.id] = Domain({n for n in Notif})
-        registry.domain[P.ract.id] = Domain([Act.welding, Act.exchWrkp])
-        registry.domain[P.lgtBar.id] = Domain([True, False], True)
-        registry.domain[P.rloc.id] = Domain([Loc.inCell, Loc.sharedTbl, Loc.atWeldSpot])
-        registry.domain[P.wact.id] = Domain([Act.idle, Act.welding])
-        registry.domain[P.safmod.id] = Domain(
+        domain = {}
+        domain[P.notif.id] = domain_values({n for n in Notif})
+        domain[P.ract.id] = domain_values([Act.welding, Act.exchWrkp])
+        domain[P.lgtBar.id] = domain_values([True, False])
+        domain[P.rloc.id] = domain_values([Loc.inCell, Loc.sharedTbl, Loc.atWeldSpot])
+        domain[P.wact.id] = domain_values([Act.idle, Act.welding])
+        domain[P.safmod.id] = domain_values(
             {s for s in SafMod}.difference({SafMod.srmst, SafMod.hguid})
         )
         # .difference( frozenset([SafMod.pflim]) )
-        registry.domain[P.notif_leaveWrkb.id] = Domain([True, False])
-        registry.domain[P.rngDet.id] = Domain({r for r in RngDet}, True)
-        registry.domain[P.hsp.id] = Domain({s for s in Phase}.difference({Phase.mis}))
-        registry.domain[P.hcp.id] = Domain({s for s in Phase}.difference({Phase.mis}))
-        registry.domain[P.hrwp.id] = Domain({s for s in Phase}.difference({Phase.mis}))
-        registry.domain[P.oloc.id] = Domain([Loc.inCell, None], True)
+        domain[P.notif_leaveWrkb.id] = domain_values([True, False])
+        domain[P.rngDet.id] = domain_values({r for r in RngDet})
+        domain[P.hsp.id] = domain_values({s for s in Phase}.difference({Phase.mis}))
+        domain[P.hcp.id] = domain_values({s for s in Phase}.difference({Phase.mis}))
+        domain[P.hrwp.id] = domain_values({s for s in Phase}.difference({Phase.mis}))
+        domain[P.oloc.id] = domain_values([Loc.inCell, None])
+        return domain
+
+    @staticmethod
+    def coverage_subsets(
+        criteria: Iterable[Iterable[str]], domain: Mapping[str, Domain]
+    ) -> List[List[str]]:
+        """Coverage criteria, ignoring atoms without domain and empty criteria"""
+        subsets = ([k for k in c if k in domain] for c in criteria)
+        return [s for s in subsets if s]
+
+    def compute_events_combinations(self, trace: Trace):
+        """Compute combinations of observed concurrent events"""
+        registry = EventCombinationsRegistry()
+        registry.domain.update(self.events_domain())
         registry.register(trace)
         #
         with self.event_combinations_output.open("wb") as combinations_file:
@@ -211,16 +233,37 @@ class SafetyDigitalTwinRunner(Experiment):
     def project_events_per_uc(
         self, ucs: Iterable[SafetyUseCase], events: EventCombinationsRegistry
     ):
-        """Project events' combinations to individual use case coverage criterion"""
+        """Compute the coverage of each use case coverage criterion"""
         projection = {}
         for u in ucs:
-            projection[u.name] = []
-            for i in u.coverage_criterions:
-                ci = events.project(i)
-                projection[u.name].append((i, ci))
+            subsets = self.coverage_subsets(u.coverage_criterions, events.domain)
+            projection[u.name] = TWayCoverage.of(events, subsets=subsets)
         with self.use_cases_events.open("wb") as uc_events:
             pickle.dump(projection, uc_events)
 
+    @classmethod
+    def load_use_cases_coverage(cls, path: Path) -> Dict[str, TWayCoverage]:
+        """Load the coverage of each use case recorded by a run.
+
+        Runs recorded before t-way coverage stored a list of (criterion,
+        registry) pairs per use case, with each registry projected on its
+        criterion. Their coverage is converted to the domain of the events
+        registry, as recorded by current runs.
+        """
+        with path.open("rb") as uc_events_file:
+            projection = pickle.load(uc_events_file)
+        domain = cls.events_domain()
+        coverage_per_uc = {}
+        for use_case, coverage in projection.items():
+            if not isinstance(coverage, TWayCoverage):
+                registries = coverage
+                subsets = cls.coverage_subsets((c for c, _ in registries), domain)
+                coverage = TWayCoverage(domain, subsets)
+                for _, registry in registries:
+                    coverage.register(registry)
+            coverage_per_uc[use_case] = coverage
+        return coverage_per_uc
+
     def process_output(self):
         """Extract values from simulation message trace"""
         # Process run database
@@ -1,4 +1,28 @@
-from csi.situation.domain import RangeDomain, SpaceDomain, Domain
+import pickle
+import random
+
+import pytest
+
+from csi.situation.components import Component, Context
+from csi.situation.coverage import (
+    CoverageTracker,
+    EventCombinationsRegistry,
+    TWayCoverage,
+    merge_all,
+)
+from csi.situation.domain import (
+    Domain,
+    IdentityDomain,
+    RangeDomain,
+    SetDomain,
+    SpaceDomain,
+    domain_linspace,
+    domain_range,
+    domain_threshold_range,
+    domain_values,
+)
+from csi.situation.monitoring import Trace
+from csi.situation.sketch import DistinctStatesSketch, HyperLogLog, hash_values
 
 
 class TestDomain:
@@ -87,3 +111,433 @@ class TestDomain:
         # TODO Test with non 0 base
         # TODO Test with negative - positive interval
         # TODO Test with pure negative interval
+
+    def test_vectorised_values(self):
+        values = [-1, 0, 0.5, 3.2, 3.99, 4, 7.5, None]
+        for d in [
+            Domain(RangeDomain(0, 4, 0.5)),
+            Domain(RangeDomain(0, 4, 0.5, upper_bound=True, lower_bound=True)),
+            Domain(SpaceDomain(0, 4, 3)),
+        ]:
+            expected = [d.value(v) if v is not None else None for v in values]
+            assert list(d.values(values)) == expected
+        d = Domain(RangeDomain(0, 4, 0.5, upper_bound=True, lower_bound=True))
+        assert list(d.values(values, indices=True)) == [0, 0, 1, 6, 7, 8, 8, -1]
+
+    def test_vectorised_set_values(self):
+        d = Domain(SetDomain({"a", "b", "c"}))
+        assert list(d.values(["b", "d", "a"])) == ["b", None, "a"]
+        assert list(d.values(["b", "d", "a"], indices=True)) == [1, -1, 0]
+        with pytest.raises(ValueError):
+            Domain(IdentityDomain()).values([1], indices=True)
+
+    def test_bin_indices(self):
+        d = Domain(RangeDomain(0, 10, 3, upper_bound=True, lower_bound=True))
+        assert d.bins() == (0, 3, 6, 9, 10)
+        assert [d.index(v) for v in [-1, 0, 4, 9.5, 10, 12]] == [0, 0, 1, 3, 4, 4]
+        assert d.from_index(4) == 10
+        assert d.bins() is d.bins()
+        for v in [-1, 0, 4, 9.5, 10, 12]:
+            assert d.from_index(d.index(v)) == d.value(v)
+        with pytest.raises(IndexError):
+            d.from_index(5)
+        d = Domain(RangeDomain(0, 1, 0.1))
+        assert len(d.bins()) == len(d)
+        assert d.index(1) is None
+        assert all(0 <= d.index(v / 1000) < len(d) for v in range(1000))
+
+    def test_space_bin_indices(self):
+        d = Domain(SpaceDomain(0, 10, 4))
+        assert d.bins() == (0, 2.5, 5, 7.5)
+        assert [d.index(v) for v in [-1, 0, 2.5, 9.9, 10]] == [None, 0, 1, 3, None]
+
+    def test_bins_round_trip(self):
+        for d in [
+            domain_range(0, 2.6, 0.04),
+            domain_range(-1.5, 0.7, 0.1),
+            domain_threshold_range(0.1, 3.3, 0.1, upper=True, lower=True),
+            domain_linspace(1.5, 4.5, 7),
+            domain_linspace(-0.3, 0.9, 9),
+        ]:
+            for i, v in enumerate(d.bins()):
+                assert d.index(v) == i
+                assert d.value(v) == v
+            assert list(d.values(d.bins(), indices=True)) == list(range(len(d)))
+        assert domain_linspace(2, 4, 4).bins() == (2, 2.5, 3, 3.5)
+
+    def test_set_bin_indices(self):
+        d = Domain(SetDomain({"b", "a", "c"}))
+        assert d.bins() == ("a", "b", "c")
+        assert d.index("c") == 2
+        assert d.index("d") is None
+        assert d.from_index(1) == "b"
+        with pytest.raises(ValueError):
+            Domain(IdentityDomain()).bins()
+
+
+class Cell(Context):
+    distance = Component(domain_threshold_range(0.0, 2.0, 0.5, upper=True))
+    mode = Component(domain_values({"auto", "manual"}))
+
+
+class TestEventCombinationsRegistry:
+    @staticmethod
+    def trace():
+        P = Cell()
+        t = Trace()
+        for i, d in enumerate([0.2, 0.4, 1.1, 3.0, 0.7]):
+            t[P.distance] = (i, d)
+        t[P.mode] = (0, "auto")
+        t[P.mode] = (3, "manual")
+        return t
+
+    def test_register(self):
+        P = Cell()
+        registry = EventCombinationsRegistry.from_context(P)
+        registry.register(self.trace())
+        assert registry.combinations == {
+            frozenset({(P.distance, 0.0), (P.mode, "auto")}),
+            frozenset({(P.distance, 1.0), (P.mode, "auto")}),
+            frozenset({(P.distance, 2.0), (P.mode, "manual")}),
+            frozenset({(P.distance, 0.5), (P.mode, "manual")}),
+        }
+        assert registry.covered == 4
+        assert registry.total == 10
+
+    def test_restrict(self):
+        P = Cell()
+        registry = EventCombinationsRegistry.from_context(P)
+        registry.register(self.trace())
+        restricted = registry.restrict({P.distance: domain_threshold_range(0, 2, 1)})
+        assert restricted.combinations == {
+            frozenset({(P.distance, 0), (P.mode, "auto")}),
+            frozenset({(P.distance, 1), (P.mode, "auto")}),
+            frozenset({(P.distance, None), (P.mode, "manual")}),
+            frozenset({(P.distance, 0), (P.mode, "manual")}),
+        }
+
+    def test_views(self):
+        P = Cell()
+        registry = EventCombinationsRegistry.from_context(P)
+        registry.register(self.trace())
+        projection = registry.project({P.mode})
+        restriction = registry.restrict({P.distance: domain_values({0.0, 2.0})})
+        assert projection.covered == 2 and projection._states is None
+        assert restriction.covered == 2 and restriction._states is None
+        assert len(restriction.states) == 4
+        restored = pickle.loads(pickle.dumps(projection))
+        assert type(restored) is EventCombinationsRegistry
+        assert restored.combinations == projection.combinations
+
+    def test_view_domain_update(self):
+        P = Cell()
+        registry = EventCombinationsRegistry.from_context(P)
+        registry.register(self.trace())
+        projection = registry.project({P.mode, P.distance})
+        assert projection.covered == 4 and projection._states is None
+        projection.domain[P.distance] = domain_values({0.0, 2.0})
+        expected = registry.restrict({P.distance: domain_values({0.0, 2.0})})
+        assert projection.combinations == expected.combinations
+        projection.domain[P.mode] = domain_values({"auto"})
+        assert projection.combinations == {
+            frozenset({(P.distance, 0.0), (P.mode, "auto")}),
+            frozenset({(P.distance, None), (P.mode, "auto")}),
+            frozenset({(P.distance, 2.0), (P.mode, None)}),
+            frozenset({(P.distance, None), (P.mode, None)}),
+        }
+
+    def test_encoding(self):
+        P = Cell()
+        registry = EventCombinationsRegistry.from_context(P)
+        encoding = registry.encoding
+        assert encoding.size == 6 * 3
+        state = {P.distance: 1.2, P.mode: "manual"}
+        assert encoding.decode(encoding.encode(state)) == frozenset(
+            {(P.distance, 1.0), (P.mode, "manual")}
+        )
+        assert encoding.decode(encoding.encode({})) == frozenset(
+            {(P.distance, None), (P.mode, None)}
+        )
+
+    def test_large_encoding(self):
+        registry = EventCombinationsRegistry()
+        keys = [f"k{i}" for i in range(20)]
+        registry.domain |= {k: domain_values(range(30)) for k in keys}
+        registry.record({k: 29 for k in keys})
+        registry.record({k: 1 for k in keys})
+        assert registry.encoding.size > 2**64
+        assert registry.covered == 2
+        assert frozenset((k, 29) for k in keys) in registry.combinations
+
+    def test_project(self):
+        P = Cell()
+        registry = EventCombinationsRegistry.from_context(P)
+        registry.register(self.trace())
+        projection = registry.project({P.mode})
+        assert projection.combinations == {
+            frozenset({(P.mode, "auto")}),
+            frozenset({(P.mode, "manual")}),
+        }
+        assert projection.coverage == 1.0
+
+    def test_domain_update(self):
+        P = Cell()
+        registry = EventCombinationsRegistry.from_context(P)
+        registry.register(self.trace())
+        combinations = registry.combinations
+        registry.domain[P.mode] = domain_values({"auto", "manual", "off"})
+        assert registry.combinations == combinations
+        assert registry.total == 15
+
+    def test_pickle(self):
+        P = Cell()
+        registry = EventCombinationsRegistry.from_context(P)
+        registry.register(self.trace())
+        restored = pickle.loads(pickle.dumps(registry))
+        assert restored.states == registry.states
+        # Registries serialised before states were encoded
+        legacy = EventCombinationsRegistry.__new__(EventCombinationsRegistry)
+        legacy.__setstate__(
+            {
+                "domain": dict(registry.domain),
+                "default": registry.default,
+                "combinations": registry.combinations,
+            }
+        )
+        assert legacy.combinations == registry.combinations
+
+    def test_missing_values(self):
+        P = Cell()
+        registry = EventCombinationsRegistry.from_context(P)
+        registry.register(self.trace())
+        everything = {
+            frozenset({(P.distance, d), (P.mode, m)})
+            for d in registry.domain[P.distance].bins()
+            for m in registry.domain[P.mode].bins()
+        }
+        missing = list(registry.missing_values())
+        assert set(missing) == everything - registry.combinations
+        assert len(missing) == registry.missing == 6
+        assert missing[:2] == list(registry.missing_values(limit=2))
+        sample = registry.sample_missing(4, random.Random(0))
+        assert len(set(sample)) == 4 and set(sample) <= set(missing)
+        assert len(registry.sample_missing(10)) == 6
+
+    def test_missing_values_large(self):
+        registry = EventCombinationsRegistry()
+        registry.domain |= {f"k{i}": domain_values(range(65)) for i in range(8)}
+        registry.record({f"k{i}": 0 for i in range(8)})
+        assert registry.missing == 65**8 - 1
+        first = next(registry.missing_values())
+        assert first == frozenset({("k0", 1)} | {(f"k{i}", 0) for i in range(1, 8)})
+        assert len(registry.sample_missing(100)) == 100
+
+    def test_sample_missing_huge(self):
+        registry = EventCombinationsRegistry()
+        registry.domain |= {f"k{i}": domain_values(range(65)) for i in range(12)}
+        registry.record({f"k{i}": 0 for i in range(12)})
+        assert registry.missing > 2**64
+        sample = registry.sample_missing(50, random.Random(0))
+        assert len(set(sample)) == 50
+        assert frozenset((f"k{i}", 0) for i in range(12)) not in sample
+
+    def test_merge(self):
+        P = Cell()
+        registry = EventCombinationsRegistry.from_context(P)
+        registry.register(self.trace())
+        other = registry.project({P.mode})
+        other.domain["phase"] = domain_values({1, 2})
+        other.record({P.mode: "auto", "phase": 2})
+        union = registry.copy().merge(other)
+        assert set(union.domain) == {P.distance, P.mode, "phase"}
+        assert (
+            frozenset({(P.distance, None), (P.mode, "auto"), ("phase", 2)})
+            in union.combinations
+        )
+        assert (
+            frozenset({(P.distance, 0.0), (P.mode, "auto"), ("phase", None)})
+            in union.combinations
+        )
+        assert union.covered == 0
+        intersection = registry.copy().merge(other, intersection=True)
+        assert intersection.combinations == registry.project({P.mode}).combinations
+
+    def test_merge_all(self, tmp_path):
+        P = Cell()
+        registries = []
+        for i, d in enumerate([0.2, 0.7, 1.2, 1.7, 2.5]):
+            registry = EventCombinationsRegistry.from_context(P)
+            registry.record({P.distance: d, P.mode: "auto"})
+            registries.append(registry)
+        paths = []
+        for i, registry in enumerate(registries):
+            paths.append(tmp_path / f"registry-{i}.pkl")
+            with paths[-1].open("wb") as registry_file:
+                pickle.dump(registry, registry_file)
+        merged = merge_all(registries)
+        assert merged.covered == 5
+        assert all(len(r.states) == 1 for r in registries)
+        assert merge_all(paths, workers=2).combinations == merged.combinations
+        assert merge_all([]).covered == 0
+
+    def test_statistics(self):
+        P = Cell()
+        registry = EventCombinationsRegistry.from_context(P)
+        registry.register(self.trace(), statistics=True)
+        state = registry.encoding.encode
+        near = state({P.distance: 0.0, P.mode: "auto"})
+        far = state({P.distance: 1.0, P.mode: "auto"})
+        # distance 0.2 then 0.4 fall in the same bin
+        assert registry.dwell[near] == 2
+        assert sum(registry.dwell.values()) == 4
+        assert registry.transitions[(near, far)] == 1
+        assert sum(registry.transitions.values()) == 3
+        restricted = EventCombinationsRegistry().merge(registry)
+        restricted.domain[P.distance] = domain_threshold_range(0, 2, 1, upper=True)
+        encoding = restricted.encoding
+        assert restricted.dwell[encoding.encode({P.distance: 0, P.mode: "auto"})] == 2
+        assert sum(restricted.transitions.values()) == 3
+
+
+class TestCoverageTracker:
+    def test_update(self, tmp_path):
+        P = Cell()
+        tracker = CoverageTracker.from_context(P)
+        assert tracker.update(TestEventCombinationsRegistry.trace()) == 4
+        assert tracker.coverage == 0.4
+        assert tracker.atom_coverage(P.distance) == 4 / 5
+        assert tracker.atom_coverages[P.mode] == 1.0
+        run = EventCombinationsRegistry.from_context(P)
+        run.record({P.distance: 0.2, P.mode: "auto"})
+        run.record({P.distance: 1.6, P.mode: "auto"})
+        assert tracker.update(run) == 1
+        assert tracker.new_states == 1
+        assert tracker.covered == 5 and tracker.runs == 2
+        tracker.save(tmp_path / "coverage.pkl")
+        restored = CoverageTracker.load(tmp_path / "coverage.pkl")
+        assert restored.coverage == tracker.coverage
+        assert restored.update(run) == 0
+
+    def test_journal(self, tmp_path):
+        P = Cell()
+        path = tmp_path / "coverage.pkl"
+        journal = tmp_path / "coverage.pkl.journal"
+        tracker = CoverageTracker.from_context(P)
+        tracker.update(TestEventCombinationsRegistry.trace())
+        tracker.save(path)
+        snapshot = path.read_bytes()
+        run = EventCombinationsRegistry.from_context(P)
+        run.record({P.distance: 1.6, P.mode: "auto"})
+        for _ in range(2):
+            tracker.update(run)
+            tracker.save(path)
+        # Later checkpoints only append the new states to the journal
+        assert path.read_bytes() == snapshot and journal.exists()
+        restored = CoverageTracker.load(path)
+        assert (restored.covered, restored.runs, restored.new_states) == (5, 3, 0)
+        assert restored.registry.states == tracker.registry.states
+        run.record({P.distance: 0.2, P.mode: "manual"})
+        assert restored.update(run) == 1
+        restored.save(path)
+        assert path.read_bytes() == snapshot
+        assert CoverageTracker.load(path).covered == 6
+        # Interrupted appends are ignored, the next checkpoint is a new snapshot
+        journal.write_bytes(journal.read_bytes()[:-2])
+        restored = CoverageTracker.load(path)
+        assert (restored.covered, restored.runs) == (5, 3)
+        restored.save(path)
+        assert path.read_bytes() != snapshot and not journal.exists()
+        assert CoverageTracker.load(path).runs == 3
+
+    def test_missing_signal(self):
+        P = Cell()
+        tracker = CoverageTracker.from_context(P)
+        trace = Trace()
+        trace[P.mode] = (0, "auto")
+        trace[P.mode] = (2, "manual")
+        # States of components without signal are undefined
+        assert tracker.update(trace) == 2
+        assert tracker.covered == 0
+        assert tracker.atom_coverage(P.mode) == 1.0
+        assert tracker.atom_coverage(P.distance) == 0.0
+
+
+class TestTWayCoverage:
+    def test_pairwise(self):
+        registry = EventCombinationsRegistry()
+        registry.domain |= {
+            "a": domain_values({0, 1, 2}),
+            "b": domain_values({"x", "y"}),
+            "c": domain_threshold_range(0.0, 1.0, 0.5),
+        }
+        registry.record({"a": 0, "b": "x", "c": 0.2})
+        registry.record({"a": 1, "b": "x", "c": 0.7})
+        registry.record({"a": 2, "b": None, "c": 0.7})
+        coverage = TWayCoverage.of(registry)
+        assert coverage.subsets == (("a", "b"), ("a", "c"), ("b", "c"))
+        for subset in coverage.subsets:
+            projection = registry.project(subset)
+            assert coverage.covered(subset) == projection.covered
+            assert coverage.total(subset) == projection.total
+            assert set(coverage.missing_values(subset)) == set(
+                projection.missing_values()
+            )
+        assert coverage.report()[("a", "c")] == (3, 6)
+        assert coverage.coverage(("b", "a")) == 2 / 6
+
+    def test_merge(self):
+        registry = EventCombinationsRegistry()
+        registry.domain |= {"a": domain_values({0, 1}), "b": domain_values({0, 1})}
+        registry.record({"a": 0, "b": 0})
+        coverage = TWayCoverage.of(registry, subsets=[["a", "b"], ["a"]])
+        other = EventCombinationsRegistry()
+        other.domain |= registry.domain
+        other.record({"a": 1, "b": 0})
+        coverage.merge(TWayCoverage.of(other, subsets=[["b", "a"], ["a"]]))
+        assert coverage.report() == {("a", "b"): (2, 4), ("a",): (2, 2)}
+        assert list(coverage.missing_values(["a", "b"], limit=1)) == [
+            frozenset({("a", 0), ("b", 1)})
+        ]
+
+
+class Probe(Context):
+    distance = Component()
+    mode = Component(domain_values({"auto", "manual"}))
+
+
+class TestDistinctStatesSketch:
+    def test_hyperloglog(self):
+        a, b = HyperLogLog(), HyperLogLog()
+        a.add(hash_values(range(0, 20000)))
+        b.add(hash_values([float(i) for i in range(10000, 30000)]))
+        assert a.count() == pytest.approx(20000, rel=0.05)
+        assert a.merge(b).count() == pytest.approx(30000, rel=0.05)
+        assert a.memory == 4096
+
+    def test_register(self):
+        P = Probe()
+        sketch = DistinctStatesSketch.from_context(P, t=2)
+        t = Trace()
+        for i in range(1000):
+            t[P.distance] = (i, i * 0.01)
+            t[P.mode] = (i, "auto" if i % 2 else "manual")
+        sketch.register(t)
+        assert sketch.count([P.mode]) == pytest.approx(2, abs=0.1)
+        assert sketch.count([P.distance]) == pytest.approx(1000, rel=0.05)
+        assert sketch.count([P.mode, P.distance]) == pytest.approx(1000, rel=0.05)
+        other = DistinctStatesSketch.from_context(P, t=2)
+        other.record({P.mode: "off"})
+        assert sketch.merge(other).count([P.mode]) == pytest.approx(3, abs=0.1)
+        assert sketch.memory == 3 * 4096
+
+    def test_missing_signal(self):
+        P = Probe()
+        sketch = DistinctStatesSketch.from_context(P, t=2)
+        t = Trace()
+        for i in range(100):
+            t[P.mode] = (i, "auto" if i % 2 else "manual")
+        # Components without signal are undefined in all states
+        sketch.register(t)
+        assert sketch.count([P.mode]) == pytest.approx(2, abs=0.1)
+        assert sketch.count([P.distance]) == pytest.approx(1, abs=0.1)
+        assert sketch.count([P.mode, P.distance]) == pytest.approx(2, abs=0.1)
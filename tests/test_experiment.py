@@ -0,0 +1,245 @@
+import os
+import pathlib
+import pickle
+import shutil
+import time
+import types
+
+import csi.experiment
+from csi.experiment import (
+    Catalogue,
+    Experiment,
+    ExperimentScheduler,
+    FailingExperiment,
+    Repository,
+    ResultCache,
+    Run,
+    RunStatus,
+    Telemetry,
+    WorkingExperiment,
+    WorkQueue,
+    WorkState,
+    configuration_digest,
+    phase,
+)
+
+
+class CrashingExperiment(Experiment):
+    def execute(self):
+        os._exit(1)
+
+
+class PhasedExperiment(Experiment):
+    def execute(self):
+        with phase("write"), open("./results.txt", "w") as results_file:
+            results_file.write(str(self.configuration))
+
+
+class TestExperimentScheduler:
+    def test_run(self, tmp_path):
+        experiments = [WorkingExperiment(tmp_path, {"input": i}) for i in range(4)]
+        experiments.append(FailingExperiment(tmp_path, {"input": True}))
+        scheduler = ExperimentScheduler(workers=2, retries=3)
+        runs = list(scheduler.run(experiments))
+        assert len(runs) == 5
+        status = {r.experiment.uuid: r.status for r in runs}
+        assert all(status[e.uuid] == RunStatus.COMPLETE for e in experiments[:4])
+        assert status[experiments[4].uuid] == RunStatus.FAILED
+        assert len(list(experiments[4].runs)) == 3
+        for e in experiments[:4]:
+            (run,) = e.runs
+            assert (run.work_path / "results.txt").exists()
+            assert run.status == RunStatus.COMPLETE
+
+    def test_crash(self, tmp_path):
+        experiments = [WorkingExperiment(tmp_path, {"input": i}) for i in range(3)]
+        crashing = CrashingExperiment(tmp_path, {"input": True})
+        # Crashes fail all runs in progress, a single worker runs one at a time
+        scheduler = ExperimentScheduler(workers=1, retries=2)
+        runs = list(scheduler.run([crashing] + experiments))
+        assert len(runs) == 4
+        status = {r.experiment.uuid: r.status for r in runs}
+        assert status[crashing.uuid] == RunStatus.FAILED
+        assert all(status[e.uuid] == RunStatus.COMPLETE for e in experiments)
+        assert [r.status for r in crashing.runs] == [RunStatus.FAILED] * 2
+
+
+class TestRepository:
+    def test_catalogue(self, tmp_path):
+        WorkingExperiment(tmp_path, {"input": 0}).run()
+        failing = FailingExperiment(tmp_path, {"input": 1})
+        failing.run(2)
+        repository = Repository(tmp_path)
+        status = repository.status()
+        assert status[RunStatus.COMPLETE] == 1
+        assert status[RunStatus.FAILED] == 2
+        ((e, r),) = repository.completed_runs
+        assert isinstance(e, WorkingExperiment)
+        assert r.status == RunStatus.COMPLETE
+        experiments = list(repository.experiments)
+        assert len(experiments) == 2
+        assert all(isinstance(e, Experiment) for e in experiments)
+        assert len(list(repository.manifests)) == 2
+        assert repository.catalogue.experiments("csi.experiment:FailingExperiment") == [
+            failing.path.name
+        ]
+        # Repositories without catalogue are indexed on first use
+        repository.catalogue.path.unlink()
+        assert repository.status() == status
+
+    def test_warm_catalogue(self, tmp_path, monkeypatch):
+        WorkingExperiment(tmp_path, {"input": 0}).run()
+        walked = []
+        iterdir = pathlib.Path.iterdir
+        monkeypatch.setattr(
+            pathlib.Path, "iterdir", lambda p: walked.append(p) or iterdir(p)
+        )
+        repository = Repository(tmp_path)
+        assert repository.status()[RunStatus.COMPLETE] == 1
+        assert len(repository.catalogue.experiments()) == 1
+        assert walked == []
+
+    def test_reindex(self, tmp_path):
+        WorkingExperiment(tmp_path, {"input": 0}).run()
+        assert Repository(tmp_path).status()[RunStatus.COMPLETE] == 1
+        # Records written without the catalogue are indexed on open
+        other = WorkingExperiment(tmp_path / "other", {"input": 1})
+        other.run()
+        shutil.copytree(other.path, tmp_path / other.path.name)
+        repository = Repository(tmp_path)
+        assert repository.status()[RunStatus.COMPLETE] == 2
+        assert len(list(repository.experiments)) == 2
+        catalogue = repository.catalogue
+        assert catalogue is Catalogue.of(tmp_path)
+        connection = catalogue._connect()
+        # Runs record their metadata through the shared connection
+        for _, r in repository.completed_runs:
+            r.update_metadata()
+        assert catalogue._connect() is connection
+
+
+class TestExperimentProxy:
+    def test_open(self, tmp_path):
+        experiment = WorkingExperiment(tmp_path, {"input": 0})
+        experiment.run(2)
+        proxy = Experiment.open(experiment.path)
+        assert proxy.uuid == experiment.uuid and proxy.path == experiment.path
+        assert proxy.experiment_class is WorkingExperiment
+        assert proxy.configuration_digest == configuration_digest({"input": 0})
+        assert not isinstance(proxy, Experiment)
+        (run,) = proxy.runs
+        assert run.experiment is proxy and run.status == RunStatus.COMPLETE
+        assert proxy._experiment is None
+        assert proxy.configuration == {"input": 0}
+        assert proxy._experiment is not None
+        assert isinstance(proxy.resolve(), WorkingExperiment)
+        # Runs loaded on their own share their experiment
+        experiment = Run.load(run.path).experiment
+        assert isinstance(experiment, WorkingExperiment)
+        assert Run.load(run.path).experiment is experiment
+        assert pickle.loads(pickle.dumps(proxy)).uuid == experiment.uuid
+
+
+class TestResultCache:
+    def test_cache(self, tmp_path):
+        cache = Repository(tmp_path).results(max_entries=2)
+        key = configuration_digest({"b": 1.0, "a": [1, 2]})
+        assert key == configuration_digest({"a": [1, 2], "b": 1.0})
+        assert cache.get(key) is None
+        cache.put(key, {"H1": 0.5})
+        assert cache.get(key) == {"H1": 0.5}
+        # Results are shared by caches over the same repository
+        cache.put("other", 1)
+        assert Repository(tmp_path).results().get("other") == 1
+        time.sleep(0.01)
+        assert cache.get(key) is not None
+        cache.put("last", 2)
+        assert len(cache) == 2 and "other" not in cache
+
+    def test_expiry(self, tmp_path):
+        cache = ResultCache(tmp_path, max_age=0.0)
+        cache.put("key", 1)
+        time.sleep(0.01)
+        assert cache.get("key") is None
+        assert len(cache) == 0
+
+
+class TestWorkQueue:
+    def test_claims(self, tmp_path):
+        queue = Repository(tmp_path).queue(lease=60.0, max_attempts=2)
+        experiments = [WorkingExperiment(tmp_path, {"input": i}) for i in range(3)]
+        for e in experiments:
+            queue.enqueue(e)
+        a, b = queue.claim("a"), queue.claim("b")
+        assert a.uuid == experiments[0].uuid and b.uuid == experiments[1].uuid
+        assert queue.heartbeat(a, "a") and not queue.heartbeat(a, "b")
+        assert queue.complete(a, "a") and not queue.complete(a, "a")
+        assert queue.fail(b, "b")
+        # Experiments queued again keep their position
+        assert queue.claim("c").uuid == b.uuid
+        assert queue.claim("c").uuid == experiments[2].uuid
+        assert queue.claim("c") is None
+        assert queue.fail(b, "c")
+        status = queue.status()
+        assert status[WorkState.COMPLETE] == 1 and status[WorkState.FAILED] == 1
+
+    def test_expired_lease(self, tmp_path):
+        queue = WorkQueue(tmp_path, lease=0.0, max_attempts=2)
+        queue.enqueue(WorkingExperiment(tmp_path, {"input": 0}))
+        stale = queue.claim("a")
+        time.sleep(0.01)
+        assert queue.claim("b").uuid == stale.uuid
+        assert not queue.complete(stale, "a")
+        # Expired leases count as failed attempts
+        time.sleep(0.01)
+        assert queue.claim("c") is None
+        assert not queue.complete(stale, "b")
+        assert queue.status()[WorkState.FAILED] == 1
+
+    def test_work(self, tmp_path):
+        queue = WorkQueue(tmp_path, lease=1.0, max_attempts=2)
+        queue.enqueue(WorkingExperiment(tmp_path, {"input": 0}))
+        queue.enqueue(FailingExperiment(tmp_path, {"input": 1}))
+        runs = list(queue.work(heartbeat=0.1))
+        assert [r.status for r in runs] == [
+            RunStatus.COMPLETE,
+            RunStatus.FAILED,
+            RunStatus.FAILED,
+        ]
+        assert queue.status()[WorkState.PENDING] == 0
+
+
+class TestTelemetry:
+    def test_phases(self):
+        telemetry = Telemetry()
+        with telemetry.phase("a"):
+            with telemetry.phase("b"):
+                pass
+            with telemetry.phase("b"):
+                pass
+        assert set(telemetry.phases) == {"a", "a/b"}
+        assert telemetry.phases["a"] >= telemetry.phases["a/b"] >= 0
+        assert Telemetry.from_json(telemetry.to_json()).phases == telemetry.phases
+        # Phases outside of runs are not recorded
+        with phase("c"):
+            pass
+
+    def test_repository(self, tmp_path):
+        for i in range(3):
+            PhasedExperiment(tmp_path, {"input": i}).run()
+        run = next(r for _, r in Repository(tmp_path).completed_runs)
+        assert set(run.telemetry.phases) == {"execute", "execute/write"}
+        report = Repository(tmp_path).telemetry(percentiles=(50, 100))
+        assert report["execute/write"]["count"] == 3
+        assert report["execute"]["p50"] <= report["execute"]["p100"]
+        assert "process_peak_memory" in report
+
+    def test_peak_memory(self, monkeypatch):
+        usage = types.SimpleNamespace(ru_maxrss=2048)
+        resource = types.SimpleNamespace(RUSAGE_SELF=0, getrusage=lambda _: usage)
+        monkeypatch.setattr(csi.experiment, "resource", resource)
+        monkeypatch.setattr(csi.experiment.sys, "platform", "linux")
+        assert csi.experiment._process_peak_memory() == 2048 * 1024
+        # Reported in bytes on macOS
+        monkeypatch.setattr(csi.experiment.sys, "platform", "darwin")
+        assert csi.experiment._process_peak_memory() == 2048
@@ -1,12 +1,25 @@
 import enum
+import gc
+import operator
+import pickle
+
+from functools import reduce
 
 from pprint import pprint
 
 import pytest
 import mtfl
+from traces import TimeSeries
+from mtfl import BOT, TOP
+from mtfl.ast import And, Neg, Or
 
 from csi.situation.monitoring import Monitor, Trace
-from csi.situation.components import Context, Component
+from csi.situation.components import Alias, Context, Component, _Atom
+from csi.situation.coverage import EventCombinationsRegistry
+from csi.situation.domain import domain_values
+from csi.situation.horizon import Horizon, atom_horizons, horizon
+from csi.situation.interning import NodeTable
+from csi.situation.simplification import Simplification, simplify
 
 
 class Constraint(Context):
@@ -182,3 +195,339 @@ class TestMonitor:
         print(list(t.values[P.height].items()))
 
         print(t)
+
+
+class TestKernels:
+    @staticmethod
+    def trace():
+        P = World()
+        t = Trace()
+        for i, (h, s) in enumerate([(5, 1), (3, 2), (8, 0), (2, 4), (6, 1), (1, 3)]):
+            t[P.height] = (i * 0.5, h)
+            t[P.speed] = (i * 0.75, s)
+        t[P.operator.has_component] = (0, False)
+        t[P.operator.has_component] = (1.2, True)
+        t[P.operator.has_component] = (2.1, False)
+        return t
+
+    @pytest.mark.parametrize(
+        "logic", [mtfl.connective.default, mtfl.connective.zadeh, mtfl.connective.godel]
+    )
+    def test_engines_agree(self, logic):
+        P = World()
+        c = P.operator.has_component
+        m = Monitor()
+        m += (P.height < 5) & c
+        m += c.implies(P.speed > 2)
+        m += c.weak_until(P.height.eq(8))
+        m += (P.height >= P.speed).always()
+        m += c.eventually(lo=0, hi=1.0)
+        m += (P.height < 4).always(lo=0.5, hi=2.0)
+        m += ~(c >> 2) | (P.speed < 2)
+        t = self.trace()
+        for time in [False, None]:
+            expected = m.evaluate(t, time=time, dt=0.1, quantitative=True, logic=logic)
+            actual = m.evaluate(
+                t, time=time, dt=0.1, quantitative=True, logic=logic, engine="numpy"
+            )
+            assert actual == expected
+
+    def test_unsupported_logic(self):
+        P = World()
+        m = Monitor()
+        m += P.height < 5
+        with pytest.raises(ValueError):
+            m.evaluate(self.trace(), logic=mtfl.connective.product, engine="numpy")
+        with pytest.raises(ValueError):
+            m.evaluate(self.trace(), engine="unknown")
+
+    def test_compiled_plan(self):
+        P = World()
+        c = P.operator.has_component
+        m = Monitor()
+        m += (P.height < 5) & c
+        m += ((P.height < 5) & c).eventually()
+        m += c.weak_until((P.height < 5) & c)
+        m += P.position.eq(3)
+        plan = m.compile(mtfl.connective.zadeh, 0.1, True)
+        assert len(plan) < sum(sum(1 for _ in p.walk()) for p in m.conditions)
+        plan = pickle.loads(pickle.dumps(plan))
+        t = self.trace()
+        for _ in range(2):
+            results = plan.evaluate(t)
+            assert results[P.position.eq(3)] is None
+            for phi in m.conditions - {P.position.eq(3)}:
+                assert results[phi] == m.evaluate(
+                    t, phi, dt=0.1, quantitative=True, logic=mtfl.connective.zadeh
+                )
+
+
+class TestSimplification:
+    def test_constants(self):
+        P = World()
+        c = P.operator.has_component
+        assert simplify(And((c, BOT))).condition == BOT
+        assert simplify(Or((c, BOT))).condition == c
+        assert simplify(And((c, ~BOT))).condition == c
+        assert simplify(reduce(operator.or_, [BOT, BOT], BOT)).condition == BOT
+        assert simplify(BOT.implies(c)).condition == TOP
+        assert simplify(BOT.always()).value is False
+        assert simplify(c).removed == 0
+
+    def test_redundant_terms(self):
+        P = World()
+        c = P.operator.has_component
+        d = P.height < 5
+        assert simplify(c & c).condition == c
+        assert simplify(c & (c | d)).condition == c
+        assert simplify(c | (d & c)).condition == c
+        assert simplify(Neg(Neg(c))) == Simplification(c, 2)
+        assert simplify((c & d) & (d & c)).condition == c & d
+
+    def test_godel_negation(self):
+        P = World()
+        c = P.speed
+        phi = Neg(Neg(c))
+        assert simplify(phi, logic=mtfl.connective.godel).condition == phi
+        assert simplify(phi, logic=mtfl.connective.zadeh).condition == c
+        # Gödel negation is not involutive for fractional values
+        t = Trace()
+        t[c] = (0, 0.5)
+        m = Monitor({phi})
+        for engine in ["mtfl", "numpy"]:
+            verdict = m.evaluate(
+                t, phi, quantitative=True, logic=mtfl.connective.godel, engine=engine
+            )
+            assert verdict == 1.0
+        assert m.compile(mtfl.connective.godel, 0.1, True).evaluate(t) == {phi: 1.0}
+
+    def test_short_circuit(self):
+        P = World()
+        c = P.operator.has_component
+        m = Monitor()
+        m += BOT
+        m += And((c, BOT))
+        m += Or((c, ~BOT))
+        t = Trace()
+        assert m.evaluate(t) == {BOT: False, And((c, BOT)): False, Or((c, ~BOT)): True}
+        assert m.evaluate(t, BOT, time=None) == [(0, False)]
+        assert m.evaluate(t, Or((c, ~BOT)), quantitative=True) == float("inf")
+        plan = m.compile()
+        assert plan.removed == 4
+        assert plan.evaluate(t) == m.evaluate(t)
+
+    def test_preserves_verdicts(self):
+        P = World()
+        c = P.operator.has_component
+        m = Monitor()
+        m += (c | BOT) & (P.height < 5) & (c | (P.height < 5))
+        m += Or((Neg(Neg(c)), And((c, TOP)))).eventually(lo=0, hi=1.0)
+        t = TestKernels.trace()
+        for phi in m.conditions:
+            psi = simplify(phi).condition
+            assert psi != phi
+            assert m.evaluate(t, phi) == Monitor().evaluate(t, psi)
+
+    def test_preserves_late_verdicts(self):
+        P = World()
+        a, b = P.operator.has_component, P.speed
+        m = Monitor()
+        m += a & (a | b)
+        m += Or((a, BOT))
+        m += And((a, TOP))
+        # Atoms are considered true by connectives before their first sample
+        t = Trace()
+        t[a] = (4, False)
+        t[b] = (0, False)
+        for phi in m.conditions:
+            assert simplify(phi, aligned=False).condition == phi
+        expected = {phi: True for phi in m.conditions}
+        assert m.evaluate(t) == expected
+        assert m.evaluate(t, engine="numpy") == expected
+        assert m.compile().evaluate(t) == expected
+        t[a] = (0, False)
+        assert m.evaluate(t) == {phi: False for phi in m.conditions}
+
+
+class TestHorizon:
+    def test_atom_horizons(self):
+        P = World()
+        c = P.operator.has_component
+        phi = (P.height < 5).always(lo=0.5, hi=2.0) & (c >> 2).eventually(hi=1.0)
+        # Bounded windows are read up to their width ahead
+        assert horizon(phi, dt=0.25) == Horizon(0.5, 3.5)
+        assert atom_horizons(phi, dt=0.25) == {
+            P.height: Horizon(0.5, 3.5),
+            c: Horizon(0.5, 2.5),
+        }
+        assert not horizon(c.weak_until(P.height < 5)).bounded
+        assert horizon(c.always(lo=1.0)) == Horizon(0.0, float("inf"))
+
+    def test_trim(self):
+        P = World()
+        c = P.operator.has_component
+        m = Monitor()
+        m += (P.height < 5).always(lo=0.5, hi=2.0) | (c >> 1)
+        m += (P.height > P.speed).eventually(lo=1.0, hi=1.5)
+        t, r, s = Trace(), Trace(memory_limit=0), Trace()
+        for u in (t, r, s):
+            for i in range(40):
+                u[P.height] = (i * 0.25, i % 7)
+                u[P.speed] = (i * 0.5, i % 5)
+                u[c] = (i * 0.75, i % 3 == 0)
+        assert m.horizon(dt=0.5)[P.height] == Horizon(0.5, 3.5)
+        assert m.trim(r, 4.0, dt=0.5) == m.trim(s, 4.0, dt=0.5) > 0
+        assert min(v for v, _ in r.stream(P.height)) == 4.5
+        for phi in m.conditions:
+            expected = TimeSeries(m.evaluate(t, phi, dt=0.5, time=None))
+            for trimmed in (r, s):
+                actual = TimeSeries(m.evaluate(trimmed, phi, dt=0.5, time=None))
+                for u in range(16, 40):
+                    assert actual[u * 0.25] == expected[u * 0.25]
+
+    def test_trim_unbounded(self):
+        P = World()
+        c = P.operator.has_component
+        m = Monitor()
+        m += c.always()
+        m += c.eventually()
+        m += (P.height < 5).eventually(hi=1.0)
+        t = Trace()
+        for i in range(20):
+            t[c] = (i, i == 3)
+            t[P.height] = (i, i % 7)
+        expected = m.evaluate(t)
+        assert expected[c.eventually()] and not expected[c.always()]
+        # Atoms read by unbounded operators are not trimmed
+        assert m.trim(t, 10.0) == 10
+        assert len(list(t.stream(c))) == 20
+        assert m.evaluate(t, c.always()) == expected[c.always()]
+        assert m.evaluate(t, c.eventually()) == expected[c.eventually()]
+
+
+class TestInterning:
+    def test_shared_instances(self):
+        P, Q = World(), World()
+        table = NodeTable()
+        phi = table.intern((P.height < 5) & P.operator.has_component)
+        psi = table.intern(Q.operator.has_component.weak_until(Q.height < 5))
+        assert phi == (Q.height < 5) & Q.operator.has_component
+        assert phi is table.intern((Q.height < 5) & Q.operator.has_component)
+        assert phi.args[0] is psi.arg2
+        assert phi.args[1] is psi.arg1
+        assert phi in table and (P.height < 5) not in table
+
+    def test_cached_properties(self):
+        P = World()
+        table = NodeTable()
+        phi = (P.height <= P.speed) & P.operator.has_component
+        assert table.atoms(phi) == {P.height, P.speed, P.operator.has_component}
+        assert table.predicates(phi) == table.atoms(phi) | {
+            P.height < P.speed,
+            P.height.eq(P.speed),
+        }
+        assert table.info(phi) is table.info(phi.evolve())
+
+    def test_boolean_predicates(self):
+        P = World()
+        m = Monitor()
+        m += (P.height <= P.speed) & P.operator.has_component
+        m += P.position.eq(P.speed)
+        assert m.extract_boolean_predicates() == {
+            P.height < P.speed,
+            P.position.eq(P.speed),
+            P.operator.has_component,
+        }
+
+    def test_identity_hash(self, monkeypatch):
+        P = World()
+        table = NodeTable()
+        phi = P.height < 5
+        for i in range(50):
+            phi = (phi & P.operator.has_component).always(lo=0, hi=i + 1)
+        interned = table.intern(phi)
+        assert hash(interned) == hash(phi) and interned == phi
+
+        def recurse(_):
+            raise AssertionError("Hashing recursed into the atoms")
+
+        monkeypatch.setattr(type(P.height), "__hash__", recurse)
+        assert hash(interned) == table.info(phi).hash
+        assert interned in {interned} and interned != interned.arg
+        assert interned.evolve() == interned and interned.evolve() is not interned
+
+    def test_release_resolved(self):
+        P = World()
+        table = NodeTable()
+        table.intern(P.height < 5)
+        table.intern(P.height < 5)
+        gc.collect()
+        assert len(table._resolved) == 0
+
+
+class Site(Context):
+    world = World()
+    lifted = Alias(world.operator.has_component & ~world.speed)
+
+
+class Plant(Context):
+    site = Site()
+
+
+class TestDescriptors:
+    def test_repeated_access(self):
+        P, Q = World(), World()
+        assert P.operator is Q.operator
+        assert P.operator.height is Q.operator.height
+        assert Site().lifted is Site().lifted
+        assert World.height is World().height
+
+    def test_resolution_by_path(self):
+        S = Site()
+        assert S.world.operator.height.path == ("world", "operator", "height")
+        assert World().operator.height.path == ("operator", "height")
+        assert Plant().site.lifted != S.lifted
+        assert Monitor().atoms(Plant().site.lifted) == {
+            _Atom(("site", "operator", "has_component")),
+            _Atom(("site", "speed")),
+        }
+
+
+class Gauge(Context):
+    level = Component(domain_values({0, 1, 2}))
+    active = Component()
+
+
+class Tank(Context):
+    gauge = Gauge()
+    volume = Component(domain_values({"low", "high"}))
+
+
+class TestAtomIndex:
+    def test_index(self):
+        T = Tank()
+        index = T.atoms()
+        assert index is T.atoms() and index == Tank().atoms()
+        assert set(index) == {("gauge", "level"), ("gauge", "active"), ("volume",)}
+        assert index[("gauge", "level")] is T.gauge.level
+        assert index.ids["gauge::active"] is T.gauge.active
+        assert set(index.domains) == {T.gauge.level, T.volume}
+        assert set(T.gauge.atoms()) == {("gauge", "level"), ("gauge", "active")}
+
+    def test_record(self):
+        T = Tank()
+        t = Trace(index=T.atoms())
+        t.record(
+            [{"t": 0, "gauge": {"level": 1, "other": 2}}, {"t": 1, "volume": "low"}],
+            timestamp=lambda e: e.pop("t"),
+        )
+        assert t.atoms() == {T.gauge.level, ("gauge", "other"), T.volume}
+
+    def test_registry(self):
+        T = Tank()
+        registry = EventCombinationsRegistry.from_context(T)
+        assert registry.domain == {
+            T.gauge.level: T.gauge.level.domain,
+            T.volume: T.volume.domain,
+        }
+        assert registry.total == 6
@@ -0,0 +1,190 @@
+import pickle
+import tracemalloc
+
+from traces import TimeSeries
+
+from csi.situation.components import Context, Component
+from csi.situation.domain import domain_threshold_range
+from csi.situation.monitoring import Monitor, Trace
+from csi.situation.reduction import Decimation, DecimationMode
+
+
+class World(Context):
+    height = Component()
+    speed = Component()
+
+
+class TestSignalStore:
+    @staticmethod
+    def populate(trace):
+        P = World()
+        for i in range(200):
+            trace[P.height] = (i, i % 7)
+            trace[P.speed] = (i * 0.5, i % 3 == 0)
+        return trace
+
+    def test_spill_over_limit(self):
+        t = self.populate(Trace(memory_limit=4096))
+        assert t.values.memory_usage <= 4096
+        assert len(t.values.spilled) > 0
+        assert t.atoms() == {World().height, World().speed}
+
+    def test_spilled_values(self):
+        P = World()
+        r = self.populate(Trace())
+        t = self.populate(Trace(memory_limit=0))
+        assert t.values.spilled == {P.height, P.speed}
+        for a in r.atoms():
+            assert list(t.stream(a, chunk_size=3)) == list(r.values[a].items())
+            assert list(t.values[a].items()) == list(r.values[a].items())
+
+    def test_spilled_update(self):
+        P = World()
+        t = Trace(memory_limit=0)
+        t[P.height] = (0, 1)
+        t[P.height] = (5, 2)
+        t[P.height] = (2, 3)
+        t[P.height] = (5, 4)
+        assert list(t.stream(P.height)) == [(0, 1), (2, 3), (5, 4)]
+
+    def test_evaluate_spilled(self):
+        P = World()
+        m = Monitor()
+        m += P.height < 3
+        m += (P.height > 5) & P.speed
+        r = self.populate(Trace())
+        t = self.populate(Trace(memory_limit=1024))
+        for c in m.conditions:
+            assert m.evaluate(t, c, time=None) == m.evaluate(r, c, time=None)
+
+    def test_evaluate_spilled_budget(self):
+        P = World()
+        budget = 1 << 20
+        t = Trace(memory_limit=budget)
+        for i in range(100000):
+            t[P.height] = (i * 0.5, i % 7)
+            t[P.speed] = (i * 0.5, i % 5)
+        assert t.values.spilled == {P.height, P.speed}
+        m = Monitor()
+        m += (P.height < 5).always(lo=0.5, hi=2.0) | (P.speed > 2)
+        for engine in ["mtfl", "numpy"]:
+            expected = m.evaluate(t, engine=engine)
+            # Single verdicts only read the samples within the atoms' horizon
+            tracemalloc.start()
+            try:
+                assert m.evaluate(t, engine=engine) == expected
+                _, peak = tracemalloc.get_traced_memory()
+            finally:
+                tracemalloc.stop()
+            assert peak < budget
+
+    def test_iter_merge(self):
+        P = World()
+        t = self.populate(Trace(memory_limit=1024))
+        keys = [P.height, P.speed]
+        expected = TimeSeries.merge([t.values[k] for k in keys])
+        expected.compact()
+        assert list(t.iter_merge(keys, chunk_size=5)) == list(expected.items())
+
+    def test_pickle(self):
+        P = World()
+        t = self.populate(Trace(memory_limit=1024))
+        u = pickle.loads(pickle.dumps(t))
+        assert list(u.stream(P.height)) == list(t.stream(P.height))
+        assert u.values.memory_usage <= 1024
+        assert u.values.spilled == t.values.spilled
+
+    def test_shared_spill_path(self, tmp_path):
+        P = World()
+        path = tmp_path / "signals.db"
+        t = self.populate(Trace(memory_limit=0, spill_path=path))
+        u = Trace(memory_limit=0, spill_path=path)
+        u[P.height] = (0, -1)
+        assert list(u.stream(P.height)) == [(0, -1)]
+        assert len(list(t.stream(P.height))) == 200
+        t.values.close()
+        assert path.exists()
+        assert list(u.stream(P.height)) == [(0, -1)]
+        u.values.close()
+        assert not path.exists()
+
+    def test_merge_spilled(self):
+        P = World()
+        r = self.populate(Trace())
+        s = Trace()
+        for i in range(0, 300, 7):
+            s[P.height] = (i + 0.5, None if i % 2 else -i)
+        t = self.populate(Trace(memory_limit=1024, reducer=Decimation()))
+        merged = t | s
+        assert merged.reducer is not None
+        assert merged.values.memory_usage <= 1024
+        expected = TimeSeries.merge(
+            [r.values[P.height], s.values[P.height]],
+            operation=lambda v: v[0] if v[1] is None else v[1],
+        )
+        assert list(merged.stream(P.height)) == list(expected.items())
+        assert list(merged.stream(P.speed)) == list(t.stream(P.speed))
+
+    def test_discard(self):
+        P = World()
+        for t in (self.populate(Trace()), self.populate(Trace(memory_limit=0))):
+            assert t.discard(P.height, -1) == 0
+            assert t.discard(P.height, 10.5) == 10
+            assert t.discard(P.height, 10.5) == 0
+            assert list(t.stream(P.height))[:2] == [(10, 3), (11, 4)]
+
+
+class Measures(Context):
+    distance = Component(domain_threshold_range(0.0, 4.0, 0.25, upper=True))
+    limit = Component()
+
+
+class TestDecimation:
+    def test_exact(self):
+        P = Measures()
+        t = Trace(reducer=Decimation())
+        for i, v in enumerate([1.0, 1.0, 2.0, 2.0, 2.0, 1.0]):
+            t[P.distance] = (i, v)
+        assert list(t.stream(P.distance)) == [(0, 1.0), (2, 2.0), (5, 1.0)]
+        assert t.reducer.stats[P.distance].received == 6
+        assert t.reducer.stats[P.distance].dropped == 3
+        assert t.reducer.stats[P.distance].kept == 3
+
+    def test_out_of_order(self):
+        P = Measures()
+        t = Trace(reducer=Decimation())
+        t[P.distance] = (0, 1.0)
+        t[P.distance] = (10, 2.0)
+        t[P.distance] = (5, 2.0)
+        t[P.distance] = (10, 1.0)
+        t[P.distance] = (11, 1.0)
+        assert list(t.stream(P.distance)) == [(0, 1.0), (5, 2.0), (10, 1.0)]
+        assert t.reducer.dropped == 1
+
+    def test_domain(self):
+        P = Measures()
+        t = Trace(reducer=Decimation(DecimationMode.DOMAIN))
+        for i, v in enumerate([0.1, 0.2, 0.3, 0.45, 0.6, 5.0, 6.0]):
+            t[P.distance] = (i, v)
+        assert list(t.stream(P.distance)) == [(0, 0.1), (2, 0.3), (4, 0.6), (5, 5.0)]
+        assert t.reducer.dropped == 3
+
+    def test_domain_raw(self):
+        P = Measures()
+        m = Monitor()
+        m += P.distance < P.limit
+        t = Trace(reducer=Decimation.for_conditions(m.conditions))
+        assert t.reducer.raw == {P.distance, P.limit}
+        r = Trace()
+        for i, v in enumerate([0.1, 0.2, 0.2, 0.3, 0.45, 0.6]):
+            t[P.distance] = (i, v)
+            r[P.distance] = (i, v)
+        t[P.limit] = (0, 0.4)
+        r[P.limit] = (0, 0.4)
+        assert t.reducer.dropped == 1
+        for c in m.conditions:
+            u = TimeSeries(m.evaluate(t, c, time=None))
+            v = TimeSeries(m.evaluate(r, c, time=None))
+            u.compact()
+            v.compact()
+            assert list(u.items()) == list(v.items())
@@ -0,0 +1,56 @@
+import pathlib
+import pickle
+import sys
+
+import pytest
+
+pytest.importorskip("docker")
+sys.path.insert(
+    0, str(pathlib.Path(__file__).parents[1] / "experiments" / "tcx_safety")
+)
+
+from wrapper.fitness import RunnerFitnessWrapper  # noqa: E402
+from wrapper.runner import SafecompControllerRunner  # noqa: E402
+
+
+class EmptyDataBase:
+    """Run database without any message"""
+
+    def flatten_messages(self, *tables):
+        return iter(())
+
+
+class ReplayRunner(SafecompControllerRunner):
+    def execute(self) -> None:
+        trace = self.build_event_trace(EmptyDataBase())
+        with self.trace_output.open("wb") as trace_file:
+            pickle.dump(trace, trace_file)
+
+
+class TestRunnerFitnessWrapper:
+    def test_track_coverage(self, tmp_path):
+        runs = tmp_path / "runs"
+        wrapper = RunnerFitnessWrapper(
+            runs=runs, coverage=tmp_path / "coverage.pkl", cache=False
+        )
+        experiment = ReplayRunner(runs, {})
+        experiment.run()
+        assert wrapper.track_coverage(experiment) > 0
+        assert (tmp_path / "coverage.pkl").exists()
+        assert wrapper.track_coverage(experiment) == 0
+
+    def test_configuration_key(self, tmp_path):
+        build = tmp_path / "build"
+        (build / "Unity_Data").mkdir(parents=True)
+        player = build / "Unity.x86_64"
+        player.write_bytes(b"player")
+        (build / "Unity_Data" / "data.unity3d").write_bytes(b"data")
+        wrapper = RunnerFitnessWrapper(build=build, runs=tmp_path / "runs")
+        configuration = wrapper.generate_experiment([0.5] * 5).configuration
+        key = wrapper.configuration_key(configuration)
+        assert wrapper.configuration_key(configuration) == key
+        # Rebuilding in place does not change the build directory
+        modified = build.stat().st_mtime_ns
+        player.write_bytes(b"rebuilt")
+        assert build.stat().st_mtime_ns == modified
+        assert wrapper.configuration_key(configuration) != key
@@ -0,0 +1,59 @@
+import importlib.util
+import pathlib
+import pickle
+import sys
+
+from csi.situation import EventCombinationsRegistry, TWayCoverage
+
+# Load the experiment wrapper under its own name, tcx_safety has a wrapper too
+_WRAPPER = pathlib.Path(__file__).parents[1] / "experiments" / "tcx_validation"
+_spec = importlib.util.spec_from_file_location(
+    "tcx_validation_wrapper",
+    _WRAPPER / "wrapper" / "__init__.py",
+    submodule_search_locations=[str(_WRAPPER / "wrapper")],
+)
+_module = sys.modules[_spec.name] = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(_module)
+runner = importlib.import_module("tcx_validation_wrapper.runner")
+monitor = importlib.import_module("tcx_validation_wrapper.monitor")
+
+SafetyDigitalTwinRunner = runner.SafetyDigitalTwinRunner
+P, Act, Loc = monitor.SafetyControllerStatus, monitor.Act, monitor.Loc
+
+
+def events(*states):
+    registry = EventCombinationsRegistry()
+    registry.domain.update(SafetyDigitalTwinRunner.events_domain())
+    for state in states:
+        registry.record(state)
+    return registry
+
+
+class TestUseCasesCoverage:
+    def test_mixed_runs(self, tmp_path):
+        use_case = SafetyDigitalTwinRunner.use_cases[0]
+        criteria = use_case.coverage_criterions
+        # Run recorded before t-way coverage, only some atoms were observed
+        legacy = events({P.wact.id: Act.idle, P.oloc.id: Loc.inCell})
+        with (tmp_path / "legacy.pkl").open("wb") as legacy_file:
+            pickle.dump(
+                {use_case.name: [(c, legacy.project(c)) for c in criteria]}, legacy_file
+            )
+        # Current run
+        current = events({P.wact.id: Act.welding, P.rloc.id: Loc.sharedTbl})
+        subsets = SafetyDigitalTwinRunner.coverage_subsets(criteria, current.domain)
+        with (tmp_path / "current.pkl").open("wb") as current_file:
+            pickle.dump(
+                {use_case.name: TWayCoverage.of(current, subsets=subsets)}, current_file
+            )
+
+        coverage = SafetyDigitalTwinRunner.load_use_cases_coverage(
+            tmp_path / "legacy.pkl"
+        )
+        other = SafetyDigitalTwinRunner.load_use_cases_coverage(
+            tmp_path / "current.pkl"
+        )
+        merged = coverage[use_case.name].merge(other[use_case.name])
+        expected = TWayCoverage.of(legacy.merge(current), subsets=subsets)
+        assert merged.report() == expected.report()
+        assert merged.covered([P.wact.id, P.oloc.id]) == 1